@@ -49,12 +49,21 @@ target_metadata = Base.metadata
 # Override sqlalchemy.url with value from settings
 config.set_main_option("sqlalchemy.url", str(settings.SQLALCHEMY_DATABASE_URI))
 
+def include_object(object, name, type_, reflected, compare_to):
+    # The SQLite FTS5 index (virtual table + its shadow tables) is created by DDL events in
+    # app/models/search.py, not by the metadata: keep autogenerate from dropping it
+    if type_ == "table" and name.startswith("search_entries_fts"):
+        return False
+    return True
+
+
 def run_migrations_offline() -> None:
     """Run migrations in 'offline' mode."""
     url = config.get_main_option("sqlalchemy.url")
     context.configure(
         url=url,
         target_metadata=target_metadata,
+        include_object=include_object,
         literal_binds=True,
         dialect_opts={"paramstyle": "named"},
     )
@@ -64,7 +73,7 @@ def run_migrations_offline() -> None:
 
 
 def do_run_migrations(connection: Connection) -> None:
-    context.configure(connection=connection, target_metadata=target_metadata)
+    context.configure(connection=connection, target_metadata=target_metadata, include_object=include_object)
 
     with context.begin_transaction():
         context.run_migrations()
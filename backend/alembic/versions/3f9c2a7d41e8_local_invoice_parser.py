@@ -0,0 +1,30 @@
+"""Local invoice parser (document local path, vendor templates)
+
+Revision ID: 3f9c2a7d41e8
+Revises: 828422e3942c
+Create Date: 2026-10-19 09:12:40.118204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3f9c2a7d41e8'
+down_revision: Union[str, Sequence[str], None] = '828422e3942c'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('documents', sa.Column('local_path', sa.String(), nullable=True))
+    op.add_column('finance_vendors', sa.Column('extraction_template', sa.JSON(), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('finance_vendors', 'extraction_template')
+    op.drop_column('documents', 'local_path')
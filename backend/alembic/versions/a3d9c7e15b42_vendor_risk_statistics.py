@@ -0,0 +1,64 @@
+"""Running vendor risk statistics (finance_vendors counters + trust ranking index)
+
+Revision ID: a3d9c7e15b42
+Revises: f1b8d2e6a357
+Create Date: 2026-10-19 16:20:11.918364
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a3d9c7e15b42'
+down_revision: Union[str, Sequence[str], None] = 'f1b8d2e6a357'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+COUNTERS = ['invoice_count', 'amount_mean', 'amount_m2', 'open_flags_high', 'open_flags_medium', 'open_flags_low']
+
+LIVE_INVOICES = """
+    FROM finance_invoices i JOIN documents d ON d.id = i.document_id
+    WHERE i.vendor_id = finance_vendors.id AND d.deleted_at IS NULL
+"""
+AMOUNTS = LIVE_INVOICES + " AND i.extraction_status = 'completed' AND i.total_amount IS NOT NULL"
+
+
+def _open_flags(severity: str) -> str:
+    return f"""(SELECT COUNT(*) FROM finance_audit_flags f JOIN finance_invoices i ON i.id = f.invoice_id
+        JOIN documents d ON d.id = i.document_id
+        WHERE i.vendor_id = finance_vendors.id AND d.deleted_at IS NULL
+        AND f.is_resolved = false AND f.severity = '{severity}')"""
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    with op.batch_alter_table('finance_vendors') as batch_op:
+        for name in COUNTERS:
+            column_type = sa.Float() if name.startswith('amount') else sa.Integer()
+            batch_op.add_column(sa.Column(name, column_type, server_default='0', nullable=False))
+        batch_op.create_index('ix_finance_vendors_tenant_trust', ['tenant_id', 'trust_score'], unique=False)
+
+    # Backfill from history (afterwards the counters are maintained incrementally)
+    op.execute(f"""
+        UPDATE finance_vendors SET
+            invoice_count = (SELECT COUNT(*) {AMOUNTS}),
+            amount_mean = COALESCE((SELECT AVG(i.total_amount) {AMOUNTS}), 0),
+            amount_m2 = COALESCE((SELECT SUM(i.total_amount * i.total_amount) - SUM(i.total_amount) * AVG(i.total_amount) {AMOUNTS}), 0),
+            open_flags_high = {_open_flags('high')},
+            open_flags_medium = {_open_flags('medium')},
+            open_flags_low = {_open_flags('low')}
+    """)
+    # Same formula as vendor_risk.trust_score_expression
+    penalty = "100.0 * (3.0 * open_flags_high + 1.5 * open_flags_medium + 0.5 * open_flags_low) / (invoice_count + 5)"
+    op.execute(f"UPDATE finance_vendors SET trust_score = CASE WHEN {penalty} >= 100 THEN 0 ELSE CAST(100 - {penalty} AS INTEGER) END")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table('finance_vendors') as batch_op:
+        batch_op.drop_index('ix_finance_vendors_tenant_trust')
+        for name in reversed(COUNTERS):
+            batch_op.drop_column(name)
@@ -0,0 +1,60 @@
+"""Transactional outbox (change feed) and webhook consumers
+
+Revision ID: a6d2e9f4b718
+Revises: f3a7c1d9e254
+Create Date: 2026-10-19 23:27:54.610293
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a6d2e9f4b718'
+down_revision: Union[str, Sequence[str], None] = 'f3a7c1d9e254'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('outbox_events',
+    sa.Column('id', sa.BigInteger().with_variant(sa.Integer(), 'sqlite'), nullable=False),
+    sa.Column('tenant_id', sa.Integer(), nullable=True),
+    sa.Column('topic', sa.String(length=64), nullable=False),
+    sa.Column('entity_id', sa.Integer(), nullable=True),
+    sa.Column('payload', sa.JSON(), nullable=True),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+    sa.Column('position', sa.BigInteger(), nullable=True),
+    sa.ForeignKeyConstraint(['tenant_id'], ['tenants.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ux_outbox_events_position', 'outbox_events', ['position'], unique=True)
+    op.create_index('ix_outbox_events_tenant_position', 'outbox_events', ['tenant_id', 'position'], unique=False)
+    op.create_table('outbox_consumers',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('tenant_id', sa.Integer(), nullable=True),
+    sa.Column('name', sa.String(), nullable=False),
+    sa.Column('url', sa.String(), nullable=False),
+    sa.Column('secret', sa.String(), nullable=True),
+    sa.Column('cursor', sa.BigInteger(), server_default='0', nullable=False),
+    sa.Column('failures', sa.Integer(), server_default='0', nullable=False),
+    sa.Column('last_error', sa.Text(), nullable=True),
+    sa.Column('delivered_at', sa.DateTime(timezone=True), nullable=True),
+    sa.ForeignKeyConstraint(['tenant_id'], ['tenants.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_outbox_consumers_id'), 'outbox_consumers', ['id'], unique=False)
+    op.create_index('ux_outbox_consumers_tenant_name', 'outbox_consumers', ['tenant_id', 'name'], unique=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ux_outbox_consumers_tenant_name', table_name='outbox_consumers')
+    op.drop_index(op.f('ix_outbox_consumers_id'), table_name='outbox_consumers')
+    op.drop_table('outbox_consumers')
+    op.drop_index('ix_outbox_events_tenant_position', table_name='outbox_events')
+    op.drop_index('ux_outbox_events_position', table_name='outbox_events')
+    op.drop_table('outbox_events')
@@ -0,0 +1,32 @@
+"""Invoice page ranges (multi-invoice documents)
+
+Revision ID: a84e1c0b9d27
+Revises: 3f9c2a7d41e8
+Create Date: 2026-10-19 10:02:15.540981
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a84e1c0b9d27'
+down_revision: Union[str, Sequence[str], None] = '3f9c2a7d41e8'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('finance_invoices', sa.Column('page_start', sa.Integer(), nullable=True))
+    op.add_column('finance_invoices', sa.Column('page_end', sa.Integer(), nullable=True))
+    op.create_index(op.f('ix_finance_invoices_document_id'), 'finance_invoices', ['document_id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_finance_invoices_document_id'), table_name='finance_invoices')
+    op.drop_column('finance_invoices', 'page_end')
+    op.drop_column('finance_invoices', 'page_start')
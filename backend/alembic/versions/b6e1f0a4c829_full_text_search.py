@@ -0,0 +1,54 @@
+"""Full-text search entries (Postgres tsvector + GIN / SQLite FTS5)
+
+Revision ID: b6e1f0a4c829
+Revises: a3d9c7e15b42
+Create Date: 2026-10-19 17:05:44.213907
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from app.models.search import POSTGRES_TSV_DDL, SQLITE_FTS_DDL
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b6e1f0a4c829'
+down_revision: Union[str, Sequence[str], None] = 'a3d9c7e15b42'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('search_entries',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('tenant_id', sa.Integer(), nullable=True),
+    sa.Column('document_id', sa.Integer(), nullable=True),
+    sa.Column('invoice_id', sa.Integer(), nullable=True),
+    sa.Column('source', sa.String(), nullable=True),
+    sa.Column('page', sa.Integer(), nullable=True),
+    sa.Column('title', sa.String(), nullable=True),
+    sa.Column('content', sa.Text(), nullable=True),
+    sa.ForeignKeyConstraint(['document_id'], ['documents.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['invoice_id'], ['finance_invoices.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['tenant_id'], ['tenants.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_search_entries_document_source', 'search_entries', ['document_id', 'source'], unique=False)
+    op.create_index('ix_search_entries_invoice_id', 'search_entries', ['invoice_id'], unique=False)
+
+    dialect = op.get_bind().dialect.name
+    for statement in {"postgresql": POSTGRES_TSV_DDL, "sqlite": SQLITE_FTS_DDL}.get(dialect, []):
+        op.execute(statement)
+    # Existing documents are indexed on their next extraction / re-upload
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    if op.get_bind().dialect.name == "sqlite":
+        op.execute("DROP TABLE IF EXISTS search_entries_fts")
+    op.drop_index('ix_search_entries_invoice_id', table_name='search_entries')
+    op.drop_index('ix_search_entries_document_source', table_name='search_entries')
+    op.drop_table('search_entries')
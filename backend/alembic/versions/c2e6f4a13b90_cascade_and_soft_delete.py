@@ -0,0 +1,56 @@
+"""ON DELETE CASCADE on finance tables, soft-deleted documents
+
+Revision ID: c2e6f4a13b90
+Revises: 5b7d19e2c604
+Create Date: 2026-10-19 12:41:57.204316
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c2e6f4a13b90'
+down_revision: Union[str, Sequence[str], None] = '5b7d19e2c604'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# (table, column, referred table)
+CASCADE_FKS = [
+    ('finance_invoices', 'document_id', 'documents'),
+    ('finance_invoice_items', 'invoice_id', 'finance_invoices'),
+    ('finance_audit_flags', 'invoice_id', 'finance_invoices'),
+]
+
+# Lets batch mode (SQLite) address the originally unnamed foreign keys
+SQLITE_NAMING = {"fk": "fk_%(table_name)s_%(column_0_name)s_%(referred_table_name)s"}
+
+
+def _replace_fks(ondelete) -> None:
+    dialect = op.get_bind().dialect.name
+    for table, column, referred in CASCADE_FKS:
+        if dialect == 'sqlite':
+            name = f'fk_{table}_{column}_{referred}'
+            with op.batch_alter_table(table, recreate='always', naming_convention=SQLITE_NAMING) as batch_op:
+                batch_op.drop_constraint(name, type_='foreignkey')
+                batch_op.create_foreign_key(name, referred, [column], ['id'], ondelete=ondelete)
+        else:
+            name = f'{table}_{column}_fkey' # Postgres default naming
+            op.drop_constraint(name, table, type_='foreignkey')
+            op.create_foreign_key(name, table, referred, [column], ['id'], ondelete=ondelete)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('documents', sa.Column('deleted_at', sa.DateTime(timezone=True), nullable=True))
+    op.create_index(op.f('ix_documents_deleted_at'), 'documents', ['deleted_at'], unique=False)
+    _replace_fks('CASCADE')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    _replace_fks(None)
+    op.drop_index(op.f('ix_documents_deleted_at'), table_name='documents')
+    op.drop_column('documents', 'deleted_at')
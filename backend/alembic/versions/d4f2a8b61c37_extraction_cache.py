@@ -0,0 +1,41 @@
+"""Extraction results cached by content hash
+
+Revision ID: d4f2a8b61c37
+Revises: b6e1f0a4c829
+Create Date: 2026-10-19 19:12:08.530417
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd4f2a8b61c37'
+down_revision: Union[str, Sequence[str], None] = 'b6e1f0a4c829'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('finance_extraction_cache',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('tenant_id', sa.Integer(), nullable=True),
+    sa.Column('content_hash', sa.String(length=64), nullable=False),
+    sa.Column('extraction_version', sa.String(length=32), nullable=False),
+    sa.Column('results', sa.JSON(), nullable=False),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+    sa.ForeignKeyConstraint(['tenant_id'], ['tenants.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_finance_extraction_cache_id'), 'finance_extraction_cache', ['id'], unique=False)
+    op.create_index('ux_finance_extraction_cache_key', 'finance_extraction_cache', ['tenant_id', 'content_hash', 'extraction_version'], unique=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ux_finance_extraction_cache_key', table_name='finance_extraction_cache')
+    op.drop_index(op.f('ix_finance_extraction_cache_id'), table_name='finance_extraction_cache')
+    op.drop_table('finance_extraction_cache')
@@ -0,0 +1,36 @@
+"""Content-addressed blob store (documents.content_hash / file_size replace local_path)
+
+Revision ID: e7a3b5c90d14
+Revises: c2e6f4a13b90
+Create Date: 2026-10-19 13:41:06.502117
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e7a3b5c90d14'
+down_revision: Union[str, Sequence[str], None] = 'c2e6f4a13b90'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    with op.batch_alter_table('documents') as batch_op:
+        batch_op.add_column(sa.Column('content_hash', sa.String(length=64), nullable=True))
+        batch_op.add_column(sa.Column('file_size', sa.Integer(), nullable=True))
+        batch_op.create_index(batch_op.f('ix_documents_content_hash'), ['content_hash'], unique=False)
+        batch_op.drop_column('local_path')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table('documents') as batch_op:
+        batch_op.add_column(sa.Column('local_path', sa.String(), nullable=True))
+        batch_op.drop_index(batch_op.f('ix_documents_content_hash'))
+        batch_op.drop_column('file_size')
+        batch_op.drop_column('content_hash')
@@ -0,0 +1,47 @@
+"""Tenant column on line items, optional tenant hash partitioning (Postgres)
+
+Revision ID: e8c5b3d07a19
+Revises: d4f2a8b61c37
+Create Date: 2026-10-19 20:03:41.662190
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from app.core.config import settings
+from app.models.partitioning import partition_items, unpartition_items
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e8c5b3d07a19'
+down_revision: Union[str, Sequence[str], None] = 'd4f2a8b61c37'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    with op.batch_alter_table('finance_invoice_items') as batch_op:
+        batch_op.add_column(sa.Column('tenant_id', sa.Integer(), nullable=True))
+        batch_op.create_foreign_key('finance_invoice_items_tenant_id_fkey', 'tenants', ['tenant_id'], ['id'])
+    op.execute("""
+        UPDATE finance_invoice_items SET tenant_id = (
+            SELECT i.tenant_id FROM finance_invoices i WHERE i.id = finance_invoice_items.invoice_id
+        )
+    """)
+    op.create_index('ix_finance_invoices_tenant_date', 'finance_invoices', ['tenant_id', 'invoice_date'], unique=False)
+
+    # No-op unless Postgres with DB_TENANT_PARTITIONS > 0
+    partition_items(op.get_bind(), settings.DB_TENANT_PARTITIONS)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    unpartition_items(op.get_bind())
+
+    op.drop_index('ix_finance_invoices_tenant_date', table_name='finance_invoices')
+    with op.batch_alter_table('finance_invoice_items') as batch_op:
+        batch_op.drop_constraint('finance_invoice_items_tenant_id_fkey', type_='foreignkey')
+        batch_op.drop_column('tenant_id')
@@ -0,0 +1,30 @@
+"""Indexes for bulk audit (items / flags by invoice)
+
+Revision ID: f1b8d2e6a357
+Revises: e7a3b5c90d14
+Create Date: 2026-10-19 15:02:37.640291
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f1b8d2e6a357'
+down_revision: Union[str, Sequence[str], None] = 'e7a3b5c90d14'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index(op.f('ix_finance_invoice_items_invoice_id'), 'finance_invoice_items', ['invoice_id'], unique=False)
+    op.create_index(op.f('ix_finance_audit_flags_invoice_id'), 'finance_audit_flags', ['invoice_id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_finance_audit_flags_invoice_id'), table_name='finance_audit_flags')
+    op.drop_index(op.f('ix_finance_invoice_items_invoice_id'), table_name='finance_invoice_items')
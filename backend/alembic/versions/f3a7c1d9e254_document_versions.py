@@ -0,0 +1,53 @@
+"""Document versions and page fingerprints
+
+Revision ID: f3a7c1d9e254
+Revises: e8c5b3d07a19
+Create Date: 2026-10-19 22:41:37.206815
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f3a7c1d9e254'
+down_revision: Union[str, Sequence[str], None] = 'e8c5b3d07a19'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    with op.batch_alter_table('documents') as batch_op:
+        batch_op.add_column(sa.Column('version', sa.Integer(), server_default='1', nullable=False))
+        batch_op.add_column(sa.Column('page_fingerprints', sa.JSON(), nullable=True))
+
+    op.create_table('document_versions',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('document_id', sa.Integer(), nullable=True),
+    sa.Column('version', sa.Integer(), nullable=False),
+    sa.Column('filename', sa.String(), nullable=True),
+    sa.Column('content_hash', sa.String(length=64), nullable=True),
+    sa.Column('file_size', sa.Integer(), nullable=True),
+    sa.Column('page_fingerprints', sa.JSON(), nullable=True),
+    sa.Column('invoices', sa.JSON(), nullable=True),
+    sa.Column('created_at', sa.DateTime(timezone=True), nullable=True),
+    sa.Column('superseded_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+    sa.ForeignKeyConstraint(['document_id'], ['documents.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_document_versions_id'), 'document_versions', ['id'], unique=False)
+    op.create_index('ux_document_versions_document_version', 'document_versions', ['document_id', 'version'], unique=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ux_document_versions_document_version', table_name='document_versions')
+    op.drop_index(op.f('ix_document_versions_id'), table_name='document_versions')
+    op.drop_table('document_versions')
+
+    with op.batch_alter_table('documents') as batch_op:
+        batch_op.drop_column('page_fingerprints')
+        batch_op.drop_column('version')
@@ -1,7 +1,11 @@
 from fastapi import APIRouter
-from app.api.endpoints import documents, chat, finance
+from app.api.endpoints import documents, chat, finance, search, events, routing, changes
 
 api_router = APIRouter()
 api_router.include_router(documents.router, prefix="/app", tags=["documents"])
 api_router.include_router(chat.router, prefix="/app", tags=["chat"])
 api_router.include_router(finance.router, prefix="/app/finance", tags=["finance"])
+api_router.include_router(search.router, prefix="/app", tags=["search"])
+api_router.include_router(events.router, prefix="/app", tags=["events"])
+api_router.include_router(routing.router, prefix="/app", tags=["routing"])
+api_router.include_router(changes.router, prefix="/app", tags=["changes"])
@@ -0,0 +1,115 @@
+from typing import List, Optional
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy import select, func
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.api.deps import get_db, get_current_tenant_id
+from app.models.outbox import OutboxEvent, OutboxConsumer
+from app.schemas.outbox import WebhookSubscription
+from app.services.outbox import outbox, outbox_dispatcher, webhook_target_error
+from app.services.tenant_service import tenant_service
+
+router = APIRouter()
+
+WEBHOOK = "webhook"
+
+def _consumer_out(consumer: OutboxConsumer) -> dict:
+    return {
+        "url": consumer.url,
+        "cursor": consumer.cursor,
+        "failures": consumer.failures,
+        "last_error": consumer.last_error,
+        "delivered_at": consumer.delivered_at,
+    }
+
+@router.get("/changes")
+async def read_changes(
+    after: int = 0,
+    limit: int = 100,
+    topic: Optional[List[str]] = Query(None),
+    db: AsyncSession = Depends(get_db),
+    tenant_name: str = Depends(get_current_tenant_id),
+):
+    """
+    Change feed: invoice / document events after the `after` cursor, oldest first.
+    Read again with after=next_cursor; events can repeat after a failure (at-least-once),
+    so apply them idempotently by entity id.
+    """
+    target_name = tenant_name if tenant_name else "Construction Corp"
+    tenant_id = await tenant_service.resolve_id(db, target_name)
+    if not tenant_id:
+        raise HTTPException(status_code=404, detail="Tenant not found")
+
+    return await outbox.read(db, tenant_id, after, limit, topic)
+
+@router.get("/changes/webhook")
+async def get_webhook(
+    db: AsyncSession = Depends(get_db),
+    tenant_name: str = Depends(get_current_tenant_id),
+):
+    target_name = tenant_name if tenant_name else "Construction Corp"
+    tenant_id = await tenant_service.resolve_id(db, target_name)
+    if not tenant_id:
+        raise HTTPException(status_code=404, detail="Tenant not found")
+
+    stmt = select(OutboxConsumer).where(OutboxConsumer.tenant_id == tenant_id, OutboxConsumer.name == WEBHOOK)
+    consumer = (await db.execute(stmt)).scalars().first()
+    if not consumer:
+        raise HTTPException(status_code=404, detail="No webhook configured")
+    return _consumer_out(consumer)
+
+@router.put("/changes/webhook")
+async def put_webhook(
+    subscription: WebhookSubscription,
+    db: AsyncSession = Depends(get_db),
+    tenant_name: str = Depends(get_current_tenant_id),
+):
+    """
+    Creates or updates the tenant's webhook. A new webhook starts at the current end of the
+    feed unless from_cursor is given (0 = replay everything still retained).
+    Only HTTPS URLs of public hosts are accepted.
+    """
+    target_name = tenant_name if tenant_name else "Construction Corp"
+    tenant_id = await tenant_service.resolve_id(db, target_name)
+    if not tenant_id:
+        raise HTTPException(status_code=404, detail="Tenant not found")
+
+    url = str(subscription.url)
+    error = await webhook_target_error(url)
+    if error:
+        raise HTTPException(status_code=400, detail=error)
+
+    stmt = select(OutboxConsumer).where(OutboxConsumer.tenant_id == tenant_id, OutboxConsumer.name == WEBHOOK)
+    consumer = (await db.execute(stmt)).scalars().first()
+    if consumer is None:
+        consumer = OutboxConsumer(tenant_id=tenant_id, name=WEBHOOK, failures=0)
+        db.add(consumer)
+        if subscription.from_cursor is None:
+            stmt = select(func.coalesce(func.max(OutboxEvent.position), 0)).where(OutboxEvent.tenant_id == tenant_id)
+            consumer.cursor = (await db.execute(stmt)).scalar()
+    if subscription.from_cursor is not None:
+        consumer.cursor = subscription.from_cursor
+    consumer.url = url
+    consumer.secret = subscription.secret
+    consumer.failures, consumer.last_error = 0, None
+    await db.commit()
+    await db.refresh(consumer)
+    outbox_dispatcher.wake()
+    return _consumer_out(consumer)
+
+@router.delete("/changes/webhook")
+async def delete_webhook(
+    db: AsyncSession = Depends(get_db),
+    tenant_name: str = Depends(get_current_tenant_id),
+):
+    target_name = tenant_name if tenant_name else "Construction Corp"
+    tenant_id = await tenant_service.resolve_id(db, target_name)
+    if not tenant_id:
+        raise HTTPException(status_code=404, detail="Tenant not found")
+
+    stmt = select(OutboxConsumer).where(OutboxConsumer.tenant_id == tenant_id, OutboxConsumer.name == WEBHOOK)
+    consumer = (await db.execute(stmt)).scalars().first()
+    if not consumer:
+        raise HTTPException(status_code=404, detail="No webhook configured")
+    await db.delete(consumer)
+    await db.commit()
+    return {"deleted": True}
@@ -1,8 +1,11 @@
-from fastapi import APIRouter, Depends, Body, HTTPException
+from typing import Optional
+from fastapi import APIRouter, Depends, Body, HTTPException, BackgroundTasks
 from sqlalchemy.ext.asyncio import AsyncSession
 from app.api.deps import get_db, get_current_tenant_id
 from app.services.rag_service import rag_service
-from app.models.tenant import Tenant, User
+from app.services.chat_session_service import chat_session_service
+from app.services.tenant_service import tenant_service
+from app.models.tenant import User
 from sqlalchemy import select
 from pydantic import BaseModel
 
@@ -11,30 +14,74 @@ router = APIRouter()
 class ChatRequest(BaseModel):
     query: str
     user_email: str = "eng@demo.com" # Default to Engineer for demo
+    session_id: Optional[int] = None # Omit to start a new conversation
 
-@router.post("/chat")
-async def chat_with_docs(
-    request: ChatRequest,
-    db: AsyncSession = Depends(get_db),
-    tenant_name: str = Depends(get_current_tenant_id),
-):
+async def _resolve_tenant_and_user(db: AsyncSession, user_email: str):
     # 1. Resolve Tenant
-    stmt = select(Tenant).where(Tenant.company_name == "Construction Corp")
-    result = await db.execute(stmt)
-    tenant = result.scalars().first()
-    
-    if not tenant:
+    tenant_id = await tenant_service.resolve_id(db, "Construction Corp")
+
+    if not tenant_id:
         raise HTTPException(status_code=404, detail="Tenant not found")
 
     # 2. Resolve User (Simulated Auth)
-    stmt = select(User).where(User.email == request.user_email)
+    stmt = select(User).where(User.email == user_email)
     result = await db.execute(stmt)
     user = result.scalars().first()
-    
+
     if not user:
         # Fallback dump user
         raise HTTPException(status_code=401, detail="User not identified")
-        
-    # 3. Chat with Vertical Context
-    answer = await rag_service.chat_with_tenant(db, tenant.id, user, request.query)
-    return {"answer": answer, "role_used": user.role}
+
+    return tenant_id, user
+
+@router.post("/chat")
+async def chat_with_docs(
+    request: ChatRequest,
+    background_tasks: BackgroundTasks,
+    db: AsyncSession = Depends(get_db),
+    tenant_name: str = Depends(get_current_tenant_id),
+):
+    tenant_id, user = await _resolve_tenant_and_user(db, request.user_email)
+
+    # 3. Load Conversation (summary + recent turns)
+    session = await chat_session_service.get_or_create(db, tenant_id, user.id, request.session_id, title=request.query)
+    history = await chat_session_service.build_history(db, session)
+
+    # 4. Chat with Vertical Context
+    answer = await rag_service.chat_with_tenant(db, tenant_id, user, request.query, history=history)
+
+    # 5. Persist turns; fold old turns into the summary after the response is sent
+    if await chat_session_service.record_exchange(db, session, request.query, answer):
+        background_tasks.add_task(chat_session_service.compact, session.id)
+
+    return {"answer": answer, "role_used": user.role, "session_id": session.id}
+
+@router.get("/chat/sessions")
+async def list_chat_sessions(
+    user_email: str = "eng@demo.com",
+    db: AsyncSession = Depends(get_db),
+    tenant_name: str = Depends(get_current_tenant_id),
+):
+    tenant_id, user = await _resolve_tenant_and_user(db, user_email)
+    sessions = await chat_session_service.list_sessions(db, tenant_id, user.id)
+    return [{"id": s.id, "title": s.title, "updated_at": s.updated_at} for s in sessions]
+
+@router.get("/chat/sessions/{session_id}")
+async def get_chat_session(
+    session_id: int,
+    user_email: str = "eng@demo.com",
+    db: AsyncSession = Depends(get_db),
+    tenant_name: str = Depends(get_current_tenant_id),
+):
+    tenant_id, user = await _resolve_tenant_and_user(db, user_email)
+    session = await chat_session_service.get(db, tenant_id, user.id, session_id)
+    if not session:
+        raise HTTPException(status_code=404, detail="Chat session not found")
+
+    turns = await chat_session_service.recent_turns(db, session)
+    return {
+        "id": session.id,
+        "title": session.title,
+        "summary": session.summary,
+        "turns": [{"role": t.role, "content": t.content, "created_at": t.created_at} for t in turns],
+    }
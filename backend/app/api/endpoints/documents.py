@@ -1,8 +1,12 @@
-from fastapi import APIRouter, Depends, UploadFile, File, HTTPException
+from fastapi import APIRouter, Depends, UploadFile, File, HTTPException, BackgroundTasks
 from sqlalchemy.ext.asyncio import AsyncSession
 from app.api.deps import get_db, get_current_tenant_id
 from app.services.rag_service import rag_service
-from app.models.tenant import Tenant
+from app.services.tenant_service import tenant_service
+from app.services.search_index import search_index
+from app.services.document_versions import document_versions
+from app.services.document_watcher import document_watcher, document_event
+from app.core.events import event_bus
 from app.models.document import Document
 from sqlalchemy import select
 
@@ -10,6 +14,7 @@ router = APIRouter()
 
 @router.post("/document")
 async def upload_document(
+    background_tasks: BackgroundTasks,
     file: UploadFile = File(...),
     force: bool = False,
     db: AsyncSession = Depends(get_db),
@@ -17,28 +22,52 @@ async def upload_document(
 ):
     """
     Upload a document for the current tenant.
+    With force=true an existing file of the same name gets a new version (same document id).
     """
     # 1. Resolve Tenant (Lazy Seed)
     # Use the header value, or fall back to "Construction Corp" if generic
     target_name = tenant_name if tenant_name else "Construction Corp"
     
-    stmt = select(Tenant).where(Tenant.company_name == target_name)
-    result = await db.execute(stmt)
-    tenant = result.scalars().first()
-    
     # Auto-create (Lazy Seeding) if missing - preventing "Tenant not found" in demos
-    if not tenant:
-        tenant = Tenant(
-            company_name=target_name,
-            subscription_status=True,
-            subscribed_modules=["finance", "engineer"]
-        )
-        db.add(tenant)
-        await db.commit()
-        await db.refresh(tenant)
+    tenant_id = await tenant_service.resolve_id(db, target_name, create=True)
 
     # 2. Upload Document
-    document = await rag_service.upload_document(db, file, tenant.id, force=force)
+    document = await rag_service.upload_document(db, file, tenant_id, force=force)
+
+    # 3. Full-text index (page text is read from the local blob, off the request path)
+    background_tasks.add_task(search_index.index_document, document.id)
+
+    await event_bus.publish(tenant_id, document_event(document))
+    document_watcher.wake()
+    return {"id": document.id, "title": document.filename, "status": document.status, "version": document.version}
+
+@router.post("/document/{document_id}/reupload")
+async def reupload_document(
+    document_id: int,
+    background_tasks: BackgroundTasks,
+    db: AsyncSession = Depends(get_db),
+    tenant_name: str = Depends(get_current_tenant_id),
+):
+    """
+    Re-send a stored document to Gemini from the local blob store (no new upload needed).
+    """
+    target_name = tenant_name if tenant_name else "Construction Corp"
+    tenant_id = await tenant_service.resolve_id(db, target_name)
+    stmt = select(Document).where(
+        Document.id == document_id,
+        Document.tenant_id == tenant_id,
+        Document.deleted_at.is_(None),
+    )
+    result = await db.execute(stmt)
+    document = result.scalars().first()
+    if not document:
+        raise HTTPException(status_code=404, detail="Document not found.")
+
+    document = await rag_service.reupload_document(db, document)
+    background_tasks.add_task(search_index.index_document, document.id)
+
+    await event_bus.publish(tenant_id, document_event(document))
+    document_watcher.wake()
     return {"id": document.id, "title": document.filename, "status": document.status}
 
 @router.get("/document")
@@ -50,40 +79,58 @@ async def list_documents(
     List all documents for the current tenant.
     """
     # 1. Resolve Tenant
-    stmt = select(Tenant).where(Tenant.company_name == "Construction Corp")
-    result = await db.execute(stmt)
-    tenant = result.scalars().first()
+    tenant_id = await tenant_service.resolve_id(db, "Construction Corp")
     
-    if not tenant:
+    if not tenant_id:
          raise HTTPException(status_code=404, detail="Tenant not found.")
     
-    # 2. Sync status with Gemini (Optional but good for UX)
-    from app.services.gemini import gemini_service
-    
-    stmt = select(Document).where(Document.tenant_id == tenant.id).order_by(Document.created_at.desc())
+    # Status sync with Gemini happens in the background (document_watcher); changes are
+    # pushed on /events, so this is a plain read however often it is called
+    stmt = select(Document).where(Document.tenant_id == tenant_id, Document.deleted_at.is_(None)).order_by(Document.upload_date.desc())
     result = await db.execute(stmt)
     docs = result.scalars().all()
-    
-    # Check status (Simplified for stability logic, avoiding too much logic in controller)
-    # Ideally should be a background task or separate syncer
-    for d in docs:
-        if d.status == "processing" and d.file_uri:
-            try:
-                # URI format assumption: https://.../files/xxxx
-                if "/files/" in d.file_uri:
-                    file_name = "files/" + d.file_uri.split("/files/")[-1]
-                    
-                    state = await gemini_service.get_file_state(file_name)
-                    if state == "ACTIVE":
-                        d.status = "active"
-                        db.add(d)
-                        await db.commit()
-                    elif state == "FAILED":
-                        d.status = "failed"
-                        db.add(d)
-                        await db.commit()
-            except Exception as e:
-                # Log error but don't break listing
-                pass
-    
+
     return [{"id": d.id, "title": d.filename, "status": d.status, "created_at": d.created_at} for d in docs]
+
+async def _tenant_document(db: AsyncSession, tenant_name: str, document_id: int) -> Document:
+    target_name = tenant_name if tenant_name else "Construction Corp"
+    tenant_id = await tenant_service.resolve_id(db, target_name)
+    if not tenant_id:
+        raise HTTPException(status_code=404, detail="Tenant not found")
+    stmt = select(Document).where(
+        Document.id == document_id,
+        Document.tenant_id == tenant_id,
+        Document.deleted_at.is_(None),
+    )
+    document = (await db.execute(stmt)).scalars().first()
+    if not document:
+        raise HTTPException(status_code=404, detail="Document not found.")
+    return document
+
+@router.get("/document/{document_id}/versions")
+async def list_document_versions(
+    document_id: int,
+    db: AsyncSession = Depends(get_db),
+    tenant_name: str = Depends(get_current_tenant_id),
+):
+    """
+    All versions of a document, oldest first; the last one is the current content.
+    """
+    document = await _tenant_document(db, tenant_name, document_id)
+    return await document_versions.list_versions(db, document)
+
+@router.get("/document/{document_id}/versions/{version}")
+async def get_document_version(
+    version: int,
+    document_id: int,
+    db: AsyncSession = Depends(get_db),
+    tenant_name: str = Depends(get_current_tenant_id),
+):
+    """
+    One version with the invoices (items, audit flags) extracted from it.
+    """
+    document = await _tenant_document(db, tenant_name, document_id)
+    result = await document_versions.get_version(db, document, version)
+    if result is None:
+        raise HTTPException(status_code=404, detail="Version not found.")
+    return result
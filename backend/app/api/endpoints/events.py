@@ -0,0 +1,45 @@
+import json
+import asyncio
+from typing import Optional
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import StreamingResponse
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal
+from app.core.events import event_bus
+from app.services.tenant_service import tenant_service
+
+router = APIRouter()
+
+@router.get("/events")
+async def stream_events(
+    request: Request,
+    tenant: Optional[str] = None,
+):
+    """
+    Server-sent events for the tenant: document status (indexing -> active/failed/deleted),
+    extraction progress and invoice extraction status.
+    EventSource cannot send headers, so the tenant may also be given as ?tenant=.
+    Clients should reload their lists on `ready` (sent on every (re)connect) to catch up.
+    """
+    tenant_name = getattr(request.state, "tenant_id", None) or tenant
+    if not tenant_name:
+        raise HTTPException(status_code=400, detail="X-Tenant-ID header or tenant parameter is required")
+
+    # Short-lived session: nothing is held open for the lifetime of the stream
+    async with AsyncSessionLocal() as db:
+        tenant_id = await tenant_service.resolve_id(db, tenant_name)
+    if not tenant_id:
+        raise HTTPException(status_code=404, detail="Tenant not found")
+
+    async def _stream():
+        async with event_bus.subscribe(tenant_id) as queue:
+            yield "retry: 3000\nevent: ready\ndata: {}\n\n"
+            while True:
+                try:
+                    event = await asyncio.wait_for(queue.get(), timeout=settings.EVENTS_HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                yield f"event: {event['type']}\ndata: {json.dumps(event, ensure_ascii=False, default=str)}\n\n"
+
+    return StreamingResponse(_stream(), media_type="text/event-stream", headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
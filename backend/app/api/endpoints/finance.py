@@ -1,77 +1,311 @@
-from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks
+import os
+import math
+from datetime import datetime
+from typing import List, Optional
+from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks, Query, Request, Response
+from fastapi.responses import StreamingResponse, FileResponse
+from pydantic import TypeAdapter
+from starlette.background import BackgroundTask
 from sqlalchemy.ext.asyncio import AsyncSession
 from app.api.deps import get_db, get_current_tenant_id
 from app.services.finance_extractor import finance_extractor
-from app.models.finance import FinanceInvoice, FinanceInvoiceItem
-from app.models.tenant import Tenant
-from sqlalchemy import select
+from app.services.finance_export import finance_export_service, EXPORT_FORMATS
+from app.services.audit_engine import audit_engine
+from app.services.vendor_risk import vendor_risk
+from app.services.finance_analytics import finance_analytics, SPEND_GROUPS
+from app.services.response_snapshots import response_snapshots, bump_invoices, invoice_list_version, invoice_version
+from app.services.outbox import outbox
+from app.schemas.finance import InvoiceOut
+from app.models.finance import FinanceInvoice, FinanceInvoiceItem, FinanceAuditFlag, FinanceVendor
+from app.models.document import Document
+from app.services.tenant_service import tenant_service
+from sqlalchemy import select, func
 from sqlalchemy.orm import selectinload
 
 router = APIRouter()
 
+INVOICE = TypeAdapter(InvoiceOut)
+INVOICE_LIST = TypeAdapter(List[InvoiceOut])
+
 @router.post("/extract/{document_id}")
 async def trigger_extraction(
     document_id: int,
     background_tasks: BackgroundTasks,
+    refresh: bool = False,
     db: AsyncSession = Depends(get_db),
     tenant_name: str = Depends(get_current_tenant_id),
 ):
     """
     Trigger AI Extraction for a Finance Document.
-    Runs in background to avoid timeout.
+    Runs in background to avoid timeout. Unchanged content reuses its cached extraction
+    unless `refresh` is set.
     """
     # Verify Tenant Ownership (simplified)
     # In real app, check if document belongs to tenant
     
     print(f"--- TRIGGERING EXTRACTION FOR DOC ID: {document_id} ---")
-    background_tasks.add_task(finance_extractor.process_document, document_id)
+    background_tasks.add_task(finance_extractor.process_document, document_id, use_cache=not refresh)
     return {"message": "Extraction started", "status": "processing"}
 
-@router.get("/invoices")
+def _not_modified(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match", "")
+    return any(tag.strip().removeprefix("W/") == etag for tag in header.split(","))
+
+def _snapshot_response(body: bytes, etag: str) -> Response:
+    # no-cache = always revalidate; unchanged data costs a 304 and no database access
+    return Response(content=body, media_type="application/json", headers={"ETag": etag, "Cache-Control": "private, no-cache"})
+
+@router.get("/invoices", response_model=List[InvoiceOut])
 async def list_invoices(
+    request: Request,
     db: AsyncSession = Depends(get_db),
     tenant_name: str = Depends(get_current_tenant_id),
 ):
     """
     Get Data Grid (Tab 3) Data.
+    Served from a serialized snapshot per tenant version; conditional GETs get 304.
     """
     # Resolve Tenant ID
     target_name = tenant_name if tenant_name else "Construction Corp"
-    stmt = select(Tenant).where(Tenant.company_name == target_name)
-    result = await db.execute(stmt)
-    tenant = result.scalars().first()
-    
-    if not tenant:
-        # Lazy Seed if missing (Consistency with Upload)
-        tenant = Tenant(
-            company_name=target_name,
-            subscription_status=True,
-            subscribed_modules=["finance", "engineer"]
+    # Lazy Seed if missing (Consistency with Upload)
+    tenant_id = await tenant_service.resolve_id(db, target_name, create=True)
+
+    version = await invoice_list_version(tenant_id)
+    etag = f'"inv-{tenant_id}-{version}"'
+    if _not_modified(request, etag):
+        return Response(status_code=304, headers={"ETag": etag})
+
+    snapshot_name = f"invoices:{tenant_id}"
+    body = response_snapshots.get(snapshot_name, version)
+    if body is None:
+        # Invoices of overwritten (soft-deleted) documents are hidden until the GC purges them
+        stmt = select(FinanceInvoice).join(Document, Document.id == FinanceInvoice.document_id).where(
+            FinanceInvoice.tenant_id == tenant_id,
+            Document.deleted_at.is_(None),
+        ).options(
+            selectinload(FinanceInvoice.vendor),
+            # Tenant filter on items too: with partitioned items only the tenant's partition is read
+            selectinload(FinanceInvoice.items.and_(FinanceInvoiceItem.tenant_id == tenant_id))
         )
-        db.add(tenant)
-        await db.commit()
-        await db.refresh(tenant)
+        result = await db.execute(stmt)
+        invoices = result.scalars().all()
 
-    stmt = select(FinanceInvoice).where(FinanceInvoice.tenant_id == tenant.id).options(
-        selectinload(FinanceInvoice.vendor),
-        selectinload(FinanceInvoice.items)
-    )
-    result = await db.execute(stmt)
-    invoices = result.scalars().all()
-    
-    return invoices
+        body = INVOICE_LIST.dump_json(INVOICE_LIST.validate_python(invoices, from_attributes=True))
+        response_snapshots.put(snapshot_name, version, body)
+    return _snapshot_response(body, etag)
 
-@router.get("/invoice/{invoice_id}")
+@router.get("/invoice/{invoice_id}", response_model=InvoiceOut)
 async def get_invoice_details(
     invoice_id: int,
+    request: Request,
+    db: AsyncSession = Depends(get_db),
+    tenant_name: str = Depends(get_current_tenant_id),
+):
+    target_name = tenant_name if tenant_name else "Construction Corp"
+    tenant_id = await tenant_service.resolve_id(db, target_name)
+    if not tenant_id:
+        raise HTTPException(status_code=404, detail="Tenant not found")
+
+    version = await invoice_version(tenant_id, invoice_id)
+    etag = f'"inv-{tenant_id}-{invoice_id}-{version}"'
+    if _not_modified(request, etag):
+        return Response(status_code=304, headers={"ETag": etag})
+
+    snapshot_name = f"invoice:{tenant_id}:{invoice_id}"
+    body = response_snapshots.get(snapshot_name, version)
+    if body is None:
+        stmt = select(FinanceInvoice).join(Document, Document.id == FinanceInvoice.document_id).where(
+            FinanceInvoice.id == invoice_id,
+            FinanceInvoice.tenant_id == tenant_id,
+            Document.deleted_at.is_(None),
+        ).options(
+            selectinload(FinanceInvoice.items.and_(FinanceInvoiceItem.tenant_id == tenant_id)),
+            selectinload(FinanceInvoice.vendor),
+        )
+        result = await db.execute(stmt)
+        invoice = result.scalars().first()
+
+        if not invoice:
+            raise HTTPException(status_code=404, detail="Invoice not found")
+
+        body = INVOICE.dump_json(INVOICE.validate_python(invoice, from_attributes=True))
+        response_snapshots.put(snapshot_name, version, body)
+    return _snapshot_response(body, etag)
+
+@router.post("/audit")
+async def run_audit(
+    db: AsyncSession = Depends(get_db),
+    tenant_name: str = Depends(get_current_tenant_id),
+):
+    """
+    Re-runs every audit rule over all of the tenant's invoices (bulk, vectorized).
+    New invoices are audited incrementally after extraction; this is for rule changes / backfills.
+    """
+    target_name = tenant_name if tenant_name else "Construction Corp"
+    tenant_id = await tenant_service.resolve_id(db, target_name)
+    if not tenant_id:
+        raise HTTPException(status_code=404, detail="Tenant not found")
+
+    return await audit_engine.run(tenant_id)
+
+@router.get("/audit/flags")
+async def list_audit_flags(
+    include_resolved: bool = False,
     db: AsyncSession = Depends(get_db),
     tenant_name: str = Depends(get_current_tenant_id),
 ):
-    stmt = select(FinanceInvoice).where(FinanceInvoice.id == invoice_id).options(selectinload(FinanceInvoice.items), selectinload(FinanceInvoice.vendor))
+    target_name = tenant_name if tenant_name else "Construction Corp"
+    tenant_id = await tenant_service.resolve_id(db, target_name)
+    if not tenant_id:
+        raise HTTPException(status_code=404, detail="Tenant not found")
+
+    stmt = select(FinanceAuditFlag).join(FinanceInvoice, FinanceInvoice.id == FinanceAuditFlag.invoice_id).where(
+        FinanceInvoice.tenant_id == tenant_id
+    ).order_by(FinanceAuditFlag.id)
+    if not include_resolved:
+        stmt = stmt.where(FinanceAuditFlag.is_resolved == False)
     result = await db.execute(stmt)
-    invoice = result.scalars().first()
-    
-    if not invoice:
-        raise HTTPException(status_code=404, detail="Invoice not found")
-        
-    return invoice
+    return result.scalars().all()
+
+@router.post("/audit/flags/{flag_id}/resolve")
+async def resolve_audit_flag(
+    flag_id: int,
+    db: AsyncSession = Depends(get_db),
+    tenant_name: str = Depends(get_current_tenant_id),
+):
+    """
+    Marks a flag as reviewed. It is not raised again by later audits, and it stops
+    counting against the vendor's trust score.
+    """
+    target_name = tenant_name if tenant_name else "Construction Corp"
+    tenant_id = await tenant_service.resolve_id(db, target_name)
+    if not tenant_id:
+        raise HTTPException(status_code=404, detail="Tenant not found")
+
+    stmt = select(FinanceAuditFlag, FinanceInvoice, Document.deleted_at).join(
+        FinanceInvoice, FinanceInvoice.id == FinanceAuditFlag.invoice_id
+    ).join(Document, Document.id == FinanceInvoice.document_id).where(
+        FinanceAuditFlag.id == flag_id,
+        FinanceInvoice.tenant_id == tenant_id,
+    )
+    row = (await db.execute(stmt)).first()
+    if not row:
+        raise HTTPException(status_code=404, detail="Flag not found")
+    flag, invoice, deleted_at = row
+
+    if not flag.is_resolved:
+        flag.is_resolved = True
+        if deleted_at is None:
+            await vendor_risk.apply_flag_deltas(db, {(invoice.vendor_id, flag.severity): -1})
+        await db.flush()
+        open_flags = (await db.execute(select(func.count(FinanceAuditFlag.id)).where(
+            FinanceAuditFlag.invoice_id == invoice.id, FinanceAuditFlag.is_resolved == False
+        ))).scalar()
+        invoice.audit_status = "flagged" if open_flags else "clean"
+        await outbox.record(db, tenant_id, "invoice.audited", invoice.id, {
+            "document_id": invoice.document_id, "audit_status": invoice.audit_status, "open_flags": open_flags,
+        })
+        await db.commit()
+        await bump_invoices(tenant_id, [invoice.id])
+    return {"id": flag.id, "invoice_id": invoice.id, "is_resolved": True, "audit_status": invoice.audit_status}
+
+@router.get("/vendors/risky")
+async def list_risky_vendors(
+    limit: int = 20,
+    db: AsyncSession = Depends(get_db),
+    tenant_name: str = Depends(get_current_tenant_id),
+):
+    """
+    Vendors ranked by trust score (lowest first), read from the maintained counters
+    (index on tenant_id, trust_score) - no invoice history is scanned.
+    """
+    target_name = tenant_name if tenant_name else "Construction Corp"
+    tenant_id = await tenant_service.resolve_id(db, target_name)
+    if not tenant_id:
+        raise HTTPException(status_code=404, detail="Tenant not found")
+
+    stmt = select(FinanceVendor).where(
+        FinanceVendor.tenant_id == tenant_id,
+        FinanceVendor.trust_score < 100,
+    ).order_by(FinanceVendor.trust_score, FinanceVendor.id).limit(max(1, min(limit, 500)))
+    vendors = (await db.execute(stmt)).scalars().all()
+    return [
+        {
+            "id": v.id,
+            "name": v.name,
+            "tax_id": v.tax_id,
+            "trust_score": v.trust_score,
+            "invoice_count": v.invoice_count,
+            "amount_mean": round(v.amount_mean, 2),
+            "amount_stddev": round(math.sqrt(v.amount_m2 / v.invoice_count), 2) if v.invoice_count else 0.0,
+            "open_flags": {"high": v.open_flags_high, "medium": v.open_flags_medium, "low": v.open_flags_low},
+        }
+        for v in vendors
+    ]
+
+@router.get("/analytics/spend")
+async def analytics_spend(
+    group_by: str = "month",
+    by_year: bool = False,
+    year_from: Optional[int] = None,
+    year_to: Optional[int] = None,
+    db: AsyncSession = Depends(get_db),
+    tenant_name: str = Depends(get_current_tenant_id),
+):
+    """
+    Spend per year / month / vendor / category (`by_year` adds a year column for
+    year-over-year comparison). Served from the columnar sidecar, not the invoice tables.
+    """
+    if group_by not in SPEND_GROUPS:
+        raise HTTPException(status_code=400, detail=f"Unsupported group_by. Use one of: {', '.join(SPEND_GROUPS)}")
+
+    target_name = tenant_name if tenant_name else "Construction Corp"
+    tenant_id = await tenant_service.resolve_id(db, target_name)
+    if not tenant_id:
+        raise HTTPException(status_code=404, detail="Tenant not found")
+
+    return await finance_analytics.spend(tenant_id, group_by, by_year=by_year, year_from=year_from, year_to=year_to)
+
+@router.get("/export")
+async def export_invoices(
+    format: str = "csv",
+    year: Optional[int] = Query(None, ge=1, le=9998), # datetime range of the year must fit in 1..9999
+    db: AsyncSession = Depends(get_db),
+    tenant_name: str = Depends(get_current_tenant_id),
+):
+    """
+    Full export of invoices + line items (one row per item) for auditors.
+    CSV is streamed as it is read; XLSX/Parquet are written batch by batch to a temp file.
+    """
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unsupported format. Use one of: {', '.join(EXPORT_FORMATS)}")
+
+    target_name = tenant_name if tenant_name else "Construction Corp"
+    tenant_id = await tenant_service.resolve_id(db, target_name)
+
+    if not tenant_id:
+        raise HTTPException(status_code=404, detail="Tenant not found")
+
+    date_from = datetime(year, 1, 1) if year else None
+    date_to = datetime(year + 1, 1, 1) if year else None
+    filename = f"invoices_{year or 'all'}.{format}"
+    headers = {"Content-Disposition": f'attachment; filename="{filename}"'}
+
+    if format == "csv":
+        return StreamingResponse(
+            finance_export_service.stream_csv(tenant_id, date_from, date_to),
+            media_type=EXPORT_FORMATS[format],
+            headers=headers,
+        )
+
+    if format == "xlsx":
+        path = await finance_export_service.write_xlsx(tenant_id, date_from, date_to)
+    else:
+        path = await finance_export_service.write_parquet(tenant_id, date_from, date_to)
+
+    return FileResponse(
+        path,
+        media_type=EXPORT_FORMATS[format],
+        filename=filename,
+        background=BackgroundTask(os.remove, path),
+    )
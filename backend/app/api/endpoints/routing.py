@@ -0,0 +1,53 @@
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.api.deps import get_db, get_current_tenant_id
+from app.models.tenant import Tenant
+from app.schemas.routing import ModelRoutingPolicy
+from app.services.model_router import model_router
+from app.services.single_flight import single_flight
+from app.services.tenant_service import tenant_service
+
+router = APIRouter()
+
+@router.get("/routing/stats")
+async def routing_stats():
+    """
+    Calls, failures, tokens, estimated cost and latency per route (task/tier/model), and
+    upstream calls vs coalesced duplicates per Gemini request kind, since this worker started.
+    """
+    return {"routes": model_router.stats(), "coalescing": single_flight.stats()}
+
+@router.get("/routing/policy")
+async def get_routing_policy(
+    db: AsyncSession = Depends(get_db),
+    tenant_name: str = Depends(get_current_tenant_id),
+):
+    target_name = tenant_name if tenant_name else "Construction Corp"
+    tenant_id = await tenant_service.resolve_id(db, target_name)
+    if not tenant_id:
+        raise HTTPException(status_code=404, detail="Tenant not found")
+
+    return await model_router.policy(tenant_id)
+
+@router.put("/routing/policy")
+async def update_routing_policy(
+    policy: ModelRoutingPolicy,
+    db: AsyncSession = Depends(get_db),
+    tenant_name: str = Depends(get_current_tenant_id),
+):
+    """
+    Replaces the tenant's routing overrides. Other workers pick the change up within
+    MODEL_ROUTING_POLICY_TTL_SECONDS.
+    """
+    target_name = tenant_name if tenant_name else "Construction Corp"
+    tenant_id = await tenant_service.resolve_id(db, target_name)
+    if not tenant_id:
+        raise HTTPException(status_code=404, detail="Tenant not found")
+
+    tenant = (await db.execute(select(Tenant).where(Tenant.id == tenant_id))).scalar_one()
+    # Reassign (not mutate) so the JSON column is written
+    tenant.ai_config = {**(tenant.ai_config or {}), "model_routing": policy.model_dump(exclude_defaults=True)}
+    await db.commit()
+    model_router.invalidate(tenant_id)
+    return policy
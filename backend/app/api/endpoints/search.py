@@ -0,0 +1,26 @@
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.api.deps import get_db, get_current_tenant_id
+from app.services.search_index import search_index
+from app.services.tenant_service import tenant_service
+
+router = APIRouter()
+
+@router.get("/search")
+async def search(
+    q: str,
+    limit: int = 20,
+    offset: int = 0,
+    db: AsyncSession = Depends(get_db),
+    tenant_name: str = Depends(get_current_tenant_id),
+):
+    """
+    Full-text search over the tenant's documents (filenames, page text) and extracted
+    invoices (numbers, vendors, item descriptions). No model call involved.
+    """
+    target_name = tenant_name if tenant_name else "Construction Corp"
+    tenant_id = await tenant_service.resolve_id(db, target_name)
+    if not tenant_id:
+        raise HTTPException(status_code=404, detail="Tenant not found")
+
+    return await search_index.search(db, tenant_id, q, limit=limit, offset=offset)
@@ -0,0 +1,28 @@
+import re
+import unicodedata
+
+# Arabic-Indic and Persian digits + Arabic decimal/thousands separators
+DIGITS = str.maketrans("٠١٢٣٤٥٦٧٨٩۰۱۲۳۴۵۶۷۸۹٫٬", "01234567890123456789.,")
+
+_DIACRITICS_RE = re.compile("[\u0610-\u061a\u064b-\u065f\u0670\u06d6-\u06ed]")
+_LETTERS = str.maketrans({
+    "أ": "ا", "إ": "ا", "آ": "ا", "ٱ": "ا",
+    "ى": "ي", "ئ": "ي", "ؤ": "و", "ة": "ه",
+    "ـ": None, # Tatweel (kashida) is purely visual
+})
+_PUNCTUATION_RE = re.compile(r"[^\w\s]")
+_SPACES_RE = re.compile(r"\s+")
+
+
+def normalize_arabic(text: str) -> str:
+    """
+    Canonical form for matching Arabic (and mixed Arabic/Latin) text:
+    NFKC (folds presentation forms), no diacritics or tatweel, unified alef/yaa/taa marbuta
+    spellings, ASCII digits, lowercase Latin, punctuation removed, single spaces.
+    """
+    if not text:
+        return ""
+    text = unicodedata.normalize("NFKC", text).translate(DIGITS)
+    text = _DIACRITICS_RE.sub("", text).translate(_LETTERS).lower()
+    text = _PUNCTUATION_RE.sub(" ", text)
+    return _SPACES_RE.sub(" ", text).strip()
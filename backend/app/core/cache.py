@@ -0,0 +1,287 @@
+import os
+import json
+import time
+import uuid
+import asyncio
+import logging
+import sqlite3
+import threading
+import weakref
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Optional
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class CacheBackend:
+    """
+    Cache + lock interface shared by all backends.
+    - Values must be JSON-serializable; every backend stores the encoded form, so callers
+      get a fresh copy back and behave the same whichever backend is configured.
+    - `ttl` is in seconds (None = no expiry).
+    - `lock()` is a lease: it expires after `timeout` seconds even if the holder dies.
+    Backends are lazy: nothing connects until the first call (keeps imports cheap).
+    """
+
+    async def get(self, key: str) -> Optional[Any]:
+        raise NotImplementedError
+
+    async def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        raise NotImplementedError
+
+    async def delete(self, key: str):
+        raise NotImplementedError
+
+    async def incr(self, key: str, amount: int = 1) -> int:
+        """
+        Atomically adds `amount` to an integer counter (missing = 0) and returns the new value.
+        """
+        raise NotImplementedError
+
+    def lock(self, name: str, timeout: float = 30.0, blocking: bool = True, wait: float = 10.0):
+        """
+        Async context manager yielding True if the lock was acquired.
+        Non-blocking callers get False immediately when another holder has it;
+        blocking callers give up (False) after `wait` seconds.
+        """
+        raise NotImplementedError
+
+    async def close(self):
+        pass
+
+
+class MemoryCache(CacheBackend):
+    """
+    In-process backend (single worker / tests). Bounded LRU of `max_entries`.
+    """
+
+    def __init__(self, max_entries: int = 10000):
+        self.max_entries = max_entries
+        self._data: OrderedDict = OrderedDict() # key -> (encoded value, expires_at)
+        self._locks = weakref.WeakValueDictionary() # Holders / waiters keep their lock alive; idle names are dropped
+
+    def _live(self, key: str):
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        if entry[1] is not None and entry[1] <= time.monotonic():
+            del self._data[key]
+            return None
+        self._data.move_to_end(key)
+        return entry
+
+    async def get(self, key: str) -> Optional[Any]:
+        entry = self._live(key)
+        return json.loads(entry[0]) if entry else None
+
+    async def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        expires_at = time.monotonic() + ttl if ttl else None
+        self._data[key] = (json.dumps(value), expires_at)
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_entries:
+            self._data.popitem(last=False)
+
+    async def delete(self, key: str):
+        self._data.pop(key, None)
+
+    async def incr(self, key: str, amount: int = 1) -> int:
+        entry = self._live(key)
+        value = (int(json.loads(entry[0])) if entry else 0) + amount
+        self._data[key] = (json.dumps(value), entry[1] if entry else None)
+        return value
+
+    @asynccontextmanager
+    async def lock(self, name: str, timeout: float = 30.0, blocking: bool = True, wait: float = 10.0) -> AsyncIterator[bool]:
+        lock = self._locks.setdefault(name, asyncio.Lock())
+        if not blocking and lock.locked():
+            yield False
+            return
+        try:
+            await asyncio.wait_for(lock.acquire(), timeout=wait)
+        except asyncio.TimeoutError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            lock.release()
+
+
+class SQLiteCache(CacheBackend):
+    """
+    Shared local backend: one SQLite file (WAL) used by every worker on the host.
+    Good for multi-worker single-machine deployments without extra infrastructure.
+    """
+
+    PURGE_EVERY = 1000 # Expired rows are swept every N writes
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        self._writes = 0
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            directory = os.path.dirname(os.path.abspath(self.path))
+            os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("CREATE TABLE IF NOT EXISTS cache_entries (key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL)")
+            conn.execute("CREATE TABLE IF NOT EXISTS cache_locks (name TEXT PRIMARY KEY, token TEXT NOT NULL, expires_at REAL NOT NULL)")
+            self._local.conn = conn
+        return conn
+
+    async def _run(self, fn, *args):
+        return await asyncio.to_thread(fn, *args)
+
+    # Wall clock (not monotonic): expiries are compared across processes
+    def _get(self, key: str):
+        row = self._conn().execute(
+            "SELECT value FROM cache_entries WHERE key = ? AND (expires_at IS NULL OR expires_at > ?)",
+            (key, time.time()),
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def _set(self, key: str, value: Any, ttl: Optional[float]):
+        conn = self._conn()
+        expires_at = time.time() + ttl if ttl else None
+        conn.execute("INSERT OR REPLACE INTO cache_entries (key, value, expires_at) VALUES (?, ?, ?)", (key, json.dumps(value), expires_at))
+        self._writes += 1
+        if self._writes % self.PURGE_EVERY == 0:
+            conn.execute("DELETE FROM cache_entries WHERE expires_at IS NOT NULL AND expires_at <= ?", (time.time(),))
+
+    def _delete(self, key: str):
+        self._conn().execute("DELETE FROM cache_entries WHERE key = ?", (key,))
+
+    def _incr(self, key: str, amount: int) -> int:
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT value FROM cache_entries WHERE key = ? AND (expires_at IS NULL OR expires_at > ?)",
+                (key, time.time()),
+            ).fetchone()
+            value = (int(json.loads(row[0])) if row else 0) + amount
+            conn.execute("INSERT OR REPLACE INTO cache_entries (key, value, expires_at) VALUES (?, ?, NULL)", (key, json.dumps(value)))
+            conn.execute("COMMIT")
+            return value
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def _try_acquire(self, name: str, token: str, timeout: float) -> bool:
+        conn = self._conn()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute("DELETE FROM cache_locks WHERE name = ? AND expires_at <= ?", (name, now))
+            cursor = conn.execute("INSERT OR IGNORE INTO cache_locks (name, token, expires_at) VALUES (?, ?, ?)", (name, token, now + timeout))
+            conn.execute("COMMIT")
+            return cursor.rowcount == 1
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def _release(self, name: str, token: str):
+        self._conn().execute("DELETE FROM cache_locks WHERE name = ? AND token = ?", (name, token))
+
+    async def get(self, key: str) -> Optional[Any]:
+        return await self._run(self._get, key)
+
+    async def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        await self._run(self._set, key, value, ttl)
+
+    async def delete(self, key: str):
+        await self._run(self._delete, key)
+
+    async def incr(self, key: str, amount: int = 1) -> int:
+        return await self._run(self._incr, key, amount)
+
+    @asynccontextmanager
+    async def lock(self, name: str, timeout: float = 30.0, blocking: bool = True, wait: float = 10.0) -> AsyncIterator[bool]:
+        token = uuid.uuid4().hex
+        deadline = time.monotonic() + wait
+        acquired = await self._run(self._try_acquire, name, token, timeout)
+        while not acquired and blocking and time.monotonic() < deadline:
+            await asyncio.sleep(0.05)
+            acquired = await self._run(self._try_acquire, name, token, timeout)
+        if not acquired:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            await self._run(self._release, name, token)
+
+
+class RedisCache(CacheBackend):
+    """
+    Redis-protocol backend (Redis, Valkey, KeyDB, ...) for multi-host deployments.
+    """
+
+    def __init__(self, url: str, prefix: str = ""):
+        self.url = url
+        self.prefix = prefix
+        self._client = None
+
+    @property
+    def client(self):
+        if self._client is None:
+            import redis.asyncio as redis
+            self._client = redis.from_url(self.url, decode_responses=True)
+        return self._client
+
+    async def get(self, key: str) -> Optional[Any]:
+        value = await self.client.get(self.prefix + key)
+        return json.loads(value) if value is not None else None
+
+    async def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        await self.client.set(self.prefix + key, json.dumps(value), px=int(ttl * 1000) if ttl else None)
+
+    async def delete(self, key: str):
+        await self.client.delete(self.prefix + key)
+
+    async def incr(self, key: str, amount: int = 1) -> int:
+        return await self.client.incrby(self.prefix + key, amount)
+
+    @asynccontextmanager
+    async def lock(self, name: str, timeout: float = 30.0, blocking: bool = True, wait: float = 10.0) -> AsyncIterator[bool]:
+        from redis.exceptions import LockError
+
+        lock = self.client.lock(self.prefix + "lock:" + name, timeout=timeout, blocking=blocking, blocking_timeout=wait)
+        if not await lock.acquire():
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            try:
+                await lock.release()
+            except LockError:
+                # Lease expired while held; another worker may own it now
+                logger.warning(f"Cache lock {name} expired before release")
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+DEFAULT_REDIS_URL = "redis://localhost:6379/0"
+
+
+def create_cache(backend: str, url: Optional[str] = None) -> CacheBackend:
+    if backend == "memory":
+        return MemoryCache(settings.CACHE_MEMORY_MAX_ENTRIES)
+    if backend == "sqlite":
+        return SQLiteCache(url or "backend/cache.db")
+    if backend == "redis":
+        return RedisCache(url or DEFAULT_REDIS_URL, prefix=settings.CACHE_KEY_PREFIX)
+    raise ValueError(f"Unknown CACHE_BACKEND: {backend}")
+
+cache = create_cache(settings.CACHE_BACKEND, settings.CACHE_URL)
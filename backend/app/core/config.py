@@ -1,7 +1,7 @@
 import os
 from pydantic_settings import BaseSettings
 from pydantic import PostgresDsn, validator, computed_field
-from typing import Any, Optional
+from typing import Any, Dict, List, Optional, Tuple
 
 class Settings(BaseSettings):
     PROJECT_NAME: str = "CorporateMemory"
@@ -31,7 +31,135 @@ class Settings(BaseSettings):
         # 2. Fallback to SQLite (Local/Default)
         return "sqlite+aiosqlite:///./corporate_memory.db"
 
+    # Schema management: False = trust Alembic (`alembic upgrade head` at deploy) and skip
+    # Base.metadata.create_all on boot, which saves a round trip per table on every cold start
+    DB_AUTO_CREATE_SCHEMA: bool = True
+    # Postgres only, applied by `alembic upgrade`: hash-partition finance_invoice_items by tenant
+    # into this many partitions (0 = plain table). See app/models/partitioning.py; to change it on an
+    # existing database re-run that migration (alembic downgrade d4f2a8b61c37 && alembic upgrade head)
+    DB_TENANT_PARTITIONS: int = 0
+
     GOOGLE_API_KEY: str = os.getenv("GOOGLE_API_KEY", "")
+    GEMINI_CLIENT_IDLE_SECONDS: int = 900 # Per-key clients (BYOK) unused this long are dropped
+    GEMINI_CLIENT_POOL_MAX: int = 200
+    TENANT_KEY_CACHE_TTL_SECONDS: int = 60 # In-process only: keys are never written to the shared cache
+
+    # Gemini Timeouts / Hedging (per worker, from a sliding window of observed latencies)
+    GEMINI_LATENCY_WINDOW: int = 200 # Recent calls kept per route (task/tier/model)
+    GEMINI_LATENCY_MIN_SAMPLES: int = 20 # Below this the default timeout applies and nothing is hedged
+    GEMINI_TIMEOUT_DEFAULT_SECONDS: float = 90.0
+    GEMINI_TIMEOUT_MIN_SECONDS: float = 15.0
+    GEMINI_TIMEOUT_MAX_SECONDS: float = 180.0
+    GEMINI_TIMEOUT_P99_MULTIPLIER: float = 2.0
+    GEMINI_HEDGING_ENABLED: bool = False
+    GEMINI_HEDGE_PERCENTILE: float = 0.95 # A duplicate call starts once the primary is slower than this
+    GEMINI_HEDGE_BUDGET_RATIO: float = 0.05 # Hedges at most this fraction of calls...
+    GEMINI_HEDGE_BUDGET_BURST: float = 5.0 # ...with this much saved up for bursts
+    GEMINI_SINGLE_FLIGHT_ENABLED: bool = True # Concurrent identical reads/generations share one upstream call
+
+    # Model Routing (tier per call from task, prompt size, attachment size and role; tenants can override)
+    GEMINI_ROUTING_ENABLED: bool = True # False = every call uses the standard tier unless a tenant pins one
+    GEMINI_FAST_MODEL: str = "gemini-2.0-flash-lite"
+    GEMINI_STANDARD_MODEL: str = "gemini-2.0-flash"
+    GEMINI_DEEP_MODEL: str = "gemini-2.5-pro"
+    GEMINI_ROUTE_FAST_MAX_PROMPT_CHARS: int = 2000 # Chat without attachments up to this size goes to the fast tier
+    GEMINI_ROUTE_DEEP_MIN_PROMPT_CHARS: int = 100000
+    GEMINI_ROUTE_DEEP_MIN_ATTACHMENT_BYTES: int = 20 * 1024**2
+    GEMINI_ROUTE_DEEP_ROLES: List[str] = ["lawyer"] # Their multi-document questions go to the deep tier
+    GEMINI_MODEL_PRICES: Dict[str, Tuple[float, float]] = { # USD per 1M tokens (input, output), for cost reports
+        "gemini-2.0-flash-lite": (0.075, 0.30),
+        "gemini-2.0-flash": (0.10, 0.40),
+        "gemini-2.5-pro": (1.25, 10.00),
+    }
+    MODEL_ROUTING_POLICY_TTL_SECONDS: int = 60 # Tenant overrides are cached in-process this long
+
+    # Shared Cache / Locks (memory = per worker; sqlite = shared by workers on one host; redis = shared by all hosts)
+    CACHE_BACKEND: str = "memory"
+    CACHE_URL: Optional[str] = None # sqlite: file path (default backend/cache.db); redis: redis://host:6379/0
+    CACHE_KEY_PREFIX: str = "cm:"
+    CACHE_MEMORY_MAX_ENTRIES: int = 10000
+    TENANT_CACHE_TTL_SECONDS: int = 300
+    FILE_CACHE_TTL_SECONDS: int = 3600 # Gemini file handles (remote files live 48h)
+    ANSWER_CACHE_TTL_SECONDS: int = 600
+
+    # Local Blob Store (content-addressed copies of uploads)
+    BLOB_STORE_DIR: str = "backend/blob_store"
+    BLOB_STORE_MAX_BYTES: int = 5 * 1024**3 # LRU eviction above this (shared by the workers of a host via file locks)
+
+    # Chat Sessions
+    CHAT_HISTORY_MAX_TURNS: int = 12 # Unsummarized turns allowed before compaction
+    CHAT_HISTORY_KEEP_TURNS: int = 6 # Most recent turns kept verbatim after compaction
+    CHAT_TURN_MAX_CHARS: int = 2000 # Per-turn cap when rendering history into the prompt
+    CHAT_SUMMARY_MAX_CHARS: int = 2000
+
+    # Finance Extraction
+    LOCAL_EXTRACTION_ENABLED: bool = True
+    LOCAL_EXTRACTION_MIN_CONFIDENCE: float = 0.85 # Below this the document is sent to Gemini
+    EXTRACTION_SEGMENT_MAX_PAGES: int = 5 # Long documents are split into windows of this size
+    EXTRACTION_MAX_PARALLEL_SEGMENTS: int = 4
+    EXTRACTION_SEGMENT_RETRIES: int = 2
+    EXTRACTION_BATCH_ENABLED: bool = True # Small single-invoice documents share one model call
+    EXTRACTION_BATCH_WINDOW_SECONDS: float = 1.5 # How long the first document waits for others
+    EXTRACTION_BATCH_MAX_DOCUMENTS: int = 8
+    EXTRACTION_BATCH_MAX_FILE_BYTES: int = 1024**2 # Larger (or unknown size) documents are extracted alone
+    ITEM_CATEGORY_REFRESH_SECONDS: int = 3600 # Learned description -> category maps are reloaded from the DB after this
+    ITEM_CATEGORY_MAX_TENANTS: int = 500 # Tenants whose maps are kept in memory (LRU)
+    ITEM_CATEGORY_BATCH_MAX: int = 200 # Unknown descriptions per classification call
+
+    # Remote Garbage Collection (soft-deleted documents -> Gemini file deletion)
+    REMOTE_GC_ENABLED: bool = True
+    REMOTE_GC_INTERVAL_SECONDS: int = 60
+    REMOTE_GC_BATCH_SIZE: int = 50
+    REMOTE_GC_CONCURRENCY: int = 8
+    REMOTE_GC_RECONCILE_EVERY: int = 30 # Reconcile with the remote listing every N GC passes
+    REMOTE_GC_ORPHAN_GRACE_SECONDS: int = 3600 # Unreferenced remote files younger than this are left alone (in-flight uploads)
+
+    # Audit Rules
+    AUDIT_BATCH_SIZE: int = 10000 # Rows per fetch / per bulk flag insert
+    AUDIT_AMOUNT_TOLERANCE: float = 1.0 # Absolute slack when comparing totals (rounding)
+    AUDIT_OUTLIER_Z: float = 3.0
+    AUDIT_OUTLIER_MIN_INVOICES: int = 5 # Vendor history needed before outliers are flagged
+    AUDIT_ROUND_AMOUNT_MIN: float = 1000.0
+    AUDIT_ROUND_AMOUNT_UNIT: float = 1000.0
+    AUDIT_WEEKEND_DAYS: List[int] = [4, 5] # Monday=0: Friday and Saturday
+
+    # Full-text Search
+    SEARCH_TS_CONFIG: str = "arabic" # Postgres text search configuration (fixed when the index is created)
+    SEARCH_MAX_RESULTS: int = 50 # Page size cap for /search
+    SEARCH_SNIPPET_WORDS: int = 16
+
+    # Live Events (SSE) / Document State Watcher
+    EVENTS_QUEUE_SIZE: int = 100 # Pending events per browser tab before the oldest are dropped
+    EVENTS_HEARTBEAT_SECONDS: int = 15 # Keeps proxies from closing idle streams
+    DOCUMENT_WATCH_ENABLED: bool = True
+    DOCUMENT_WATCH_INTERVAL_SECONDS: int = 5 # Only documents still indexing are checked
+    DOCUMENT_WATCH_BATCH_SIZE: int = 100
+    DOCUMENT_WATCH_CONCURRENCY: int = 8
+
+    # Response Snapshots (serialized grid / detail responses, ETag revalidation)
+    SNAPSHOT_CACHE_MAX_BYTES: int = 64 * 1024**2 # Rendered bodies kept per worker
+
+    # Analytics Sidecar (per-tenant, per-month Parquet files queried with DuckDB, off the OLTP database)
+    ANALYTICS_ENABLED: bool = True # Extraction appends touched invoices to the sidecar
+    ANALYTICS_DIR: str = "backend/analytics" # Local disk, like the blob store (use a shared volume for several hosts)
+    ANALYTICS_BATCH_ROWS: int = 100000 # Rows per file while backfilling
+    ANALYTICS_COMPACT_ENABLED: bool = True
+    ANALYTICS_COMPACT_INTERVAL_SECONDS: int = 600
+    ANALYTICS_COMPACT_MIN_FILES: int = 16 # Tenants with more files than this are rewritten to one file per month
+    ANALYTICS_DUCKDB_THREADS: int = 2
+
+    # Exports
+    EXPORT_BATCH_SIZE: int = 2000 # Rows fetched per server-side cursor round trip
+
+    # Change Feed (transactional outbox: events are written with the change, sequenced after commit)
+    OUTBOX_ENABLED: bool = True # Sequencer / webhook dispatcher loop
+    OUTBOX_INTERVAL_SECONDS: float = 1.0 # Feed lag is about this long
+    OUTBOX_SEQUENCE_BATCH: int = 5000 # Events given a feed position per statement
+    OUTBOX_FEED_MAX_EVENTS: int = 1000 # Page size cap for /changes
+    OUTBOX_DELIVERY_BATCH: int = 500 # Events per webhook POST
+    OUTBOX_DELIVERY_TIMEOUT_SECONDS: float = 10.0
+    OUTBOX_RETRY_MAX_SECONDS: int = 300 # Backoff cap for failing webhooks
+    OUTBOX_RETENTION_DAYS: int = 14 # Sequenced events older than this are pruned (consumers must keep up)
 
     class Config:
         case_sensitive = True
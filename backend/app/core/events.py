@@ -0,0 +1,104 @@
+import json
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, Optional, Set
+
+from app.core.cache import DEFAULT_REDIS_URL
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class EventBus:
+    """
+    Per-tenant pub/sub behind the /events stream.
+    - Every subscriber (browser tab) gets a bounded queue; a stalled tab loses its oldest
+      events instead of growing memory (clients re-sync on reconnect).
+    - With a Redis URL, publishes go through Redis and each worker keeps ONE pattern
+      subscription that fans out to its local subscribers, so events reach tabs connected to
+      any worker and N idle tabs cost nothing upstream. Without Redis delivery is in-process.
+    """
+
+    def __init__(self, redis_url: Optional[str] = None, prefix: str = "cm:", queue_size: int = 100):
+        self.redis_url = redis_url
+        self.prefix = prefix
+        self.queue_size = queue_size
+        self._subscribers: Dict[int, Set[asyncio.Queue]] = {}
+        self._client = None
+        self._reader: Optional[asyncio.Task] = None
+
+    @property
+    def client(self):
+        if self._client is None:
+            import redis.asyncio as redis
+
+            self._client = redis.from_url(self.redis_url, decode_responses=True)
+        return self._client
+
+    async def publish(self, tenant_id: int, event: dict):
+        """
+        Fire-and-forget: a failed publish is logged, never raised into the caller's work.
+        """
+        if self.redis_url:
+            try:
+                payload = json.dumps(event, ensure_ascii=False, default=str)
+                await self.client.publish(f"{self.prefix}events:{tenant_id}", payload)
+                return
+            except Exception as e:
+                logger.error(f"Event publish to Redis failed, delivering locally: {e}")
+        self._deliver(tenant_id, event)
+
+    @asynccontextmanager
+    async def subscribe(self, tenant_id: int) -> AsyncIterator[asyncio.Queue]:
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+        self._subscribers.setdefault(tenant_id, set()).add(queue)
+        if self.redis_url and (self._reader is None or self._reader.done()):
+            self._reader = asyncio.create_task(self._read_redis())
+        try:
+            yield queue
+        finally:
+            subscribers = self._subscribers.get(tenant_id)
+            if subscribers is not None:
+                subscribers.discard(queue)
+                if not subscribers:
+                    del self._subscribers[tenant_id]
+
+    def subscriber_count(self) -> int:
+        return sum(len(s) for s in self._subscribers.values())
+
+    def _deliver(self, tenant_id: int, event: dict):
+        for queue in self._subscribers.get(tenant_id, ()):
+            if queue.full():
+                queue.get_nowait()
+            queue.put_nowait(event)
+
+    async def _read_redis(self):
+        while True:
+            try:
+                pubsub = self.client.pubsub()
+                await pubsub.psubscribe(f"{self.prefix}events:*")
+                async for message in pubsub.listen():
+                    if message.get("type") != "pmessage":
+                        continue
+                    tenant_id = int(message["channel"].rsplit(":", 1)[-1])
+                    if tenant_id in self._subscribers:
+                        self._deliver(tenant_id, json.loads(message["data"]))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Event subscription lost, reconnecting: {e}")
+                await asyncio.sleep(1.0)
+
+    async def close(self):
+        if self._reader is not None:
+            self._reader.cancel()
+        if self._client is not None:
+            await self._client.aclose()
+
+
+event_bus = EventBus(
+    (settings.CACHE_URL or DEFAULT_REDIS_URL) if settings.CACHE_BACKEND == "redis" else None, # Same Redis as the cache
+    settings.CACHE_KEY_PREFIX,
+    settings.EVENTS_QUEUE_SIZE,
+)
@@ -1,5 +1,8 @@
 from app.models.tenant import Tenant, User, UserRole
 from app.models.document import Document
 from app.models.tenant import Tenant, User, UserRole
-from app.models.document import Document
-from app.models.finance import FinanceVendor, FinanceInvoice, FinanceInvoiceItem, FinanceAuditFlag
+from app.models.document import Document, DocumentVersion
+from app.models.finance import FinanceVendor, FinanceInvoice, FinanceInvoiceItem, FinanceAuditFlag, FinanceExtractionCache
+from app.models.chat import ChatSession, ChatTurn
+from app.models.search import SearchEntry
+from app.models.outbox import OutboxEvent, OutboxConsumer
@@ -0,0 +1,43 @@
+from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, Text, Index
+from sqlalchemy.orm import relationship
+from sqlalchemy.sql import func
+from app.core.database import Base
+
+class ChatSession(Base):
+    """
+    A server-side conversation. Older turns are folded into `summary`
+    so the prompt size stays bounded however long the conversation runs.
+    """
+    __tablename__ = "chat_sessions"
+
+    id = Column(Integer, primary_key=True, index=True)
+    tenant_id = Column(Integer, ForeignKey("tenants.id"))
+    user_id = Column(Integer, ForeignKey("users.id"))
+
+    title = Column(String, nullable=True)
+    summary = Column(Text, nullable=True) # Rolling summary of compacted turns
+    summarized_until = Column(Integer, default=0) # Last ChatTurn.id folded into the summary
+
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+    turns = relationship("ChatTurn", back_populates="session", cascade="all, delete-orphan", order_by="ChatTurn.id")
+
+    __table_args__ = (
+        Index("ix_chat_sessions_tenant_user", "tenant_id", "user_id", "updated_at"),
+    )
+
+class ChatTurn(Base):
+    __tablename__ = "chat_turns"
+
+    id = Column(Integer, primary_key=True, index=True)
+    session_id = Column(Integer, ForeignKey("chat_sessions.id"))
+    role = Column(String) # "user" | "assistant"
+    content = Column(Text)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    session = relationship("ChatSession", back_populates="turns")
+
+    __table_args__ = (
+        Index("ix_chat_turns_session_id_id", "session_id", "id"),
+    )
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, DateTime
+from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, JSON, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from app.core.database import Base
@@ -14,6 +14,8 @@ class Document(Base):
     
     filename = Column(String)
     file_uri = Column(String) # Google Gemini File URI
+    content_hash = Column(String(64), nullable=True, index=True) # SHA-256, key into the local BlobStore
+    file_size = Column(Integer, nullable=True)
     
     # Security: Which vertical can see this file?
     # e.g., "engineer" (only engineers see this), or "general" (everyone sees it)
@@ -21,9 +23,16 @@ class Document(Base):
     
     upload_date = Column(DateTime(timezone=True), server_default=func.now())
     status = Column(String, default="indexing")
+    deleted_at = Column(DateTime(timezone=True), nullable=True, index=True) # Soft delete; remote file removed by RemoteGarbageCollector
+
+    # Versioning: a forced re-upload replaces the content of this row (the lineage, stable id) and
+    # keeps the previous content as a DocumentVersion
+    version = Column(Integer, default=1, server_default="1", nullable=False)
+    page_fingerprints = Column(JSON, nullable=True) # SHA-256 per page (document_splitter.page_fingerprints)
     
     tenant = relationship("Tenant", back_populates="documents")
-    invoices = relationship("FinanceInvoice", back_populates="document", cascade="all, delete-orphan")
+    invoices = relationship("FinanceInvoice", back_populates="document", cascade="all, delete-orphan", passive_deletes=True)
+    versions = relationship("DocumentVersion", back_populates="document", cascade="all, delete-orphan", passive_deletes=True, order_by="DocumentVersion.version")
 
     @property
     def title(self):
@@ -36,3 +45,29 @@ class Document(Base):
     @property
     def gemini_file_uri(self):
         return self.file_uri
+
+class DocumentVersion(Base):
+    """
+    A superseded version of a Document: its content and a snapshot of the invoices (items, flags)
+    extracted from it, as they were when the next version replaced it.
+    """
+    __tablename__ = "document_versions"
+
+    id = Column(Integer, primary_key=True, index=True)
+    document_id = Column(Integer, ForeignKey("documents.id", ondelete="CASCADE")) # Lineage
+    version = Column(Integer, nullable=False)
+
+    filename = Column(String)
+    content_hash = Column(String(64), nullable=True) # Blob kept while any version references it
+    file_size = Column(Integer, nullable=True)
+    page_fingerprints = Column(JSON, nullable=True)
+    invoices = Column(JSON, nullable=True) # Snapshot, see DocumentVersionService.snapshot
+
+    created_at = Column(DateTime(timezone=True)) # Upload time of this version
+    superseded_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    document = relationship("Document", back_populates="versions")
+
+    __table_args__ = (
+        Index("ux_document_versions_document_version", "document_id", "version", unique=True),
+    )
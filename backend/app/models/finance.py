@@ -1,4 +1,5 @@
-from sqlalchemy import Column, Integer, String, Float, ForeignKey, DateTime, Text, Boolean
+from sqlalchemy import Column, Integer, String, Float, ForeignKey, DateTime, Text, Boolean, JSON, Index
+from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
 from app.core.database import Base
 
@@ -9,7 +10,20 @@ class FinanceVendor(Base):
     name = Column(String, index=True)
     tax_id = Column(String, nullable=True)
     contact_info = Column(Text, nullable=True)
-    trust_score = Column(Integer, default=100) # AI logic will lower this if fraud detected
+    trust_score = Column(Integer, default=100) # Derived from the running statistics below (vendor_risk)
+    extraction_template = Column(JSON, nullable=True) # Learned layout anchors for the local parser
+
+    # Running statistics, updated in place on every extraction / flag change
+    invoice_count = Column(Integer, default=0, server_default="0", nullable=False)
+    amount_mean = Column(Float, default=0.0, server_default="0", nullable=False)
+    amount_m2 = Column(Float, default=0.0, server_default="0", nullable=False) # Welford: variance = m2 / count
+    open_flags_high = Column(Integer, default=0, server_default="0", nullable=False)
+    open_flags_medium = Column(Integer, default=0, server_default="0", nullable=False)
+    open_flags_low = Column(Integer, default=0, server_default="0", nullable=False)
+
+    __table_args__ = (
+        Index("ix_finance_vendors_tenant_trust", "tenant_id", "trust_score"),
+    )
     
     tenant = relationship("Tenant")
     invoices = relationship("FinanceInvoice", back_populates="vendor")
@@ -18,7 +32,9 @@ class FinanceInvoice(Base):
     __tablename__ = "finance_invoices"
     id = Column(Integer, primary_key=True, index=True)
     tenant_id = Column(Integer, ForeignKey("tenants.id"))
-    document_id = Column(Integer, ForeignKey("documents.id")) # Link to the physical file
+    document_id = Column(Integer, ForeignKey("documents.id", ondelete="CASCADE"), index=True) # Link to the physical file
+    page_start = Column(Integer, nullable=True) # Page range inside the document (multi-invoice batches)
+    page_end = Column(Integer, nullable=True)
     vendor_id = Column(Integer, ForeignKey("finance_vendors.id"), nullable=True)
     
     invoice_number = Column(String, index=True)
@@ -36,13 +52,18 @@ class FinanceInvoice(Base):
     tenant = relationship("Tenant")
     document = relationship("Document", back_populates="invoices")
     vendor = relationship("FinanceVendor", back_populates="invoices")
-    items = relationship("FinanceInvoiceItem", back_populates="invoice", cascade="all, delete-orphan")
-    audit_logs = relationship("FinanceAuditFlag", back_populates="invoice", cascade="all, delete-orphan")
+    items = relationship("FinanceInvoiceItem", back_populates="invoice", cascade="all, delete-orphan", passive_deletes=True)
+    audit_logs = relationship("FinanceAuditFlag", back_populates="invoice", cascade="all, delete-orphan", passive_deletes=True)
+
+    __table_args__ = (
+        Index("ix_finance_invoices_tenant_date", "tenant_id", "invoice_date"), # Date-range reads / exports per tenant
+    )
 
 class FinanceInvoiceItem(Base):
     __tablename__ = "finance_invoice_items"
     id = Column(Integer, primary_key=True, index=True)
-    invoice_id = Column(Integer, ForeignKey("finance_invoices.id"))
+    invoice_id = Column(Integer, ForeignKey("finance_invoices.id", ondelete="CASCADE"), index=True)
+    tenant_id = Column(Integer, ForeignKey("tenants.id"), nullable=True) # Copied from the invoice: hash partition key (see models/partitioning)
     
     description = Column(String)
     quantity = Column(Float)
@@ -55,7 +76,7 @@ class FinanceInvoiceItem(Base):
 class FinanceAuditFlag(Base):
     __tablename__ = "finance_audit_flags"
     id = Column(Integer, primary_key=True, index=True)
-    invoice_id = Column(Integer, ForeignKey("finance_invoices.id"))
+    invoice_id = Column(Integer, ForeignKey("finance_invoices.id", ondelete="CASCADE"), index=True)
     
     issue_type = Column(String) # "duplicate", "missing_tax_id"
     severity = Column(String) # "high", "medium", "low"
@@ -64,3 +85,21 @@ class FinanceAuditFlag(Base):
     is_resolved = Column(Boolean, default=False)
     
     invoice = relationship("FinanceInvoice", back_populates="audit_logs")
+
+class FinanceExtractionCache(Base):
+    """
+    Validated extraction results (ExtractedSegment list) of one file content, so identical
+    bytes (re-uploads, re-triggered extractions) skip the model. Entries of an older
+    extraction version are ignored and replaced.
+    """
+    __tablename__ = "finance_extraction_cache"
+    id = Column(Integer, primary_key=True, index=True)
+    tenant_id = Column(Integer, ForeignKey("tenants.id", ondelete="CASCADE")) # Local parses depend on the tenant's vendor templates
+    content_hash = Column(String(64), nullable=False)
+    extraction_version = Column(String(32), nullable=False)
+    results = Column(JSON, nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    __table_args__ = (
+        Index("ux_finance_extraction_cache_key", "tenant_id", "content_hash", "extraction_version", unique=True),
+    )
@@ -0,0 +1,45 @@
+from sqlalchemy import Column, Integer, BigInteger, String, ForeignKey, DateTime, Text, JSON, Index
+from sqlalchemy.sql import func
+from app.core.database import Base
+
+class OutboxEvent(Base):
+    """
+    A change (invoice extracted / audited / deleted, document uploaded ...) written in the same
+    transaction as the change itself. `position` is the change-feed cursor: it is assigned after
+    commit, in commit-visible order, by the outbox sequencer (see OutboxDispatcher), so a
+    consumer reading `position > cursor` never skips an event that committed late.
+    """
+    __tablename__ = "outbox_events"
+
+    id = Column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True)
+    tenant_id = Column(Integer, ForeignKey("tenants.id", ondelete="CASCADE"))
+    topic = Column(String(64), nullable=False) # e.g. "invoice.upserted", "invoice.audited", "document.uploaded"
+    entity_id = Column(Integer, nullable=True)
+    payload = Column(JSON, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    position = Column(BigInteger, nullable=True) # NULL until sequenced
+
+    __table_args__ = (
+        Index("ux_outbox_events_position", "position", unique=True),
+        Index("ix_outbox_events_tenant_position", "tenant_id", "position"),
+    )
+
+class OutboxConsumer(Base):
+    """
+    A push subscriber of a tenant's change feed (webhook) and how far it has acknowledged.
+    """
+    __tablename__ = "outbox_consumers"
+
+    id = Column(Integer, primary_key=True, index=True)
+    tenant_id = Column(Integer, ForeignKey("tenants.id", ondelete="CASCADE"))
+    name = Column(String, nullable=False)
+    url = Column(String, nullable=False)
+    secret = Column(String, nullable=True) # HMAC-SHA256 key for the X-Outbox-Signature header
+    cursor = Column(BigInteger, default=0, server_default="0", nullable=False) # Last delivered position
+    failures = Column(Integer, default=0, server_default="0", nullable=False) # Consecutive failed deliveries
+    last_error = Column(Text, nullable=True)
+    delivered_at = Column(DateTime(timezone=True), nullable=True)
+
+    __table_args__ = (
+        Index("ux_outbox_consumers_tenant_name", "tenant_id", "name", unique=True),
+    )
@@ -0,0 +1,101 @@
+"""
+Optional Postgres hash partitioning of finance_invoice_items by tenant (DB_TENANT_PARTITIONS).
+
+Line items are the largest table by far (tens of items per invoice) and nothing references
+them, so they can be partitioned without touching other tables' foreign keys. Each tenant's
+items then live in one of N partitions. That means smaller per-partition indexes, vacuum
+per partition, and tenant-filtered queries (`finance_invoice_items.tenant_id = :t`) scan
+one partition only.
+
+finance_invoices / documents stay unpartitioned: they are referenced by single-column
+foreign keys (items, flags, search entries), and Postgres requires unique keys of a
+partitioned table to include the partition key.
+
+Both functions take a sync Connection (Alembic's op.get_bind(), or AsyncConnection.run_sync)
+and are no-ops on other dialects or when the table is already in the requested layout.
+"""
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+
+ITEMS = "finance_invoice_items"
+ITEMS_SEQUENCE = "finance_invoice_items_id_seq"
+
+
+def is_partitioned(conn: Connection, table: str = ITEMS) -> bool:
+    if conn.dialect.name != "postgresql":
+        return False
+    stmt = text("SELECT relkind = 'p' FROM pg_class WHERE oid = to_regclass(:table)")
+    return bool(conn.execute(stmt, {"table": table}).scalar())
+
+
+def _constraints_and_indexes(table: str):
+    # Same names as the unpartitioned table (models / earlier migrations)
+    return [
+        f"ALTER TABLE {table} ADD CONSTRAINT {ITEMS}_invoice_id_fkey FOREIGN KEY (invoice_id) REFERENCES finance_invoices (id) ON DELETE CASCADE",
+        f"ALTER TABLE {table} ADD CONSTRAINT {ITEMS}_tenant_id_fkey FOREIGN KEY (tenant_id) REFERENCES tenants (id)",
+        f"CREATE INDEX ix_{ITEMS}_id ON {table} (id)",
+        f"CREATE INDEX ix_{ITEMS}_invoice_id ON {table} (invoice_id)",
+    ]
+
+
+def _detach(conn: Connection, old: str):
+    """
+    Renames the current table out of the way and frees the names (primary key, indexes,
+    id sequence) that the new table takes over.
+    """
+    for statement in [
+        f"ALTER TABLE {ITEMS} RENAME TO {old}",
+        f"ALTER TABLE {old} DROP CONSTRAINT IF EXISTS {ITEMS}_pkey",
+        f"DROP INDEX IF EXISTS ix_{ITEMS}_id",
+        f"DROP INDEX IF EXISTS ix_{ITEMS}_invoice_id",
+        f"ALTER SEQUENCE {ITEMS_SEQUENCE} OWNED BY NONE",
+    ]:
+        conn.execute(text(statement))
+
+
+def _attach(conn: Connection, old: str):
+    for statement in [
+        f"INSERT INTO {ITEMS} SELECT * FROM {old}",
+        f"DROP TABLE {old}",
+        f"ALTER SEQUENCE {ITEMS_SEQUENCE} OWNED BY {ITEMS}.id",
+        f"ANALYZE {ITEMS}",
+    ]:
+        conn.execute(text(statement))
+
+
+def partition_items(conn: Connection, partitions: int):
+    """
+    Rebuilds finance_invoice_items as PARTITION BY HASH (tenant_id) with `partitions`
+    partitions (copying the rows). Items without a tenant (orphans) are dropped.
+    """
+    if conn.dialect.name != "postgresql" or partitions <= 0 or is_partitioned(conn):
+        return
+    old = f"{ITEMS}_unpartitioned"
+    conn.execute(text(f"DELETE FROM {ITEMS} WHERE tenant_id IS NULL"))
+    _detach(conn, old)
+    conn.execute(text(f"CREATE TABLE {ITEMS} (LIKE {old} INCLUDING DEFAULTS) PARTITION BY HASH (tenant_id)"))
+    conn.execute(text(f"ALTER TABLE {ITEMS} ALTER COLUMN tenant_id SET NOT NULL"))
+    conn.execute(text(f"ALTER TABLE {ITEMS} ADD CONSTRAINT {ITEMS}_pkey PRIMARY KEY (tenant_id, id)"))
+    for remainder in range(partitions):
+        conn.execute(text(
+            f"CREATE TABLE {ITEMS}_p{remainder} PARTITION OF {ITEMS} FOR VALUES WITH (MODULUS {partitions}, REMAINDER {remainder})"
+        ))
+    for statement in _constraints_and_indexes(ITEMS):
+        conn.execute(text(statement))
+    _attach(conn, old)
+
+
+def unpartition_items(conn: Connection):
+    """
+    Rebuilds finance_invoice_items as a plain table (copying the rows).
+    """
+    if not is_partitioned(conn):
+        return
+    old = f"{ITEMS}_partitioned"
+    _detach(conn, old)
+    conn.execute(text(f"CREATE TABLE {ITEMS} (LIKE {old} INCLUDING DEFAULTS)"))
+    conn.execute(text(f"ALTER TABLE {ITEMS} ALTER COLUMN tenant_id DROP NOT NULL"))
+    conn.execute(text(f"ALTER TABLE {ITEMS} ADD CONSTRAINT {ITEMS}_pkey PRIMARY KEY (id)"))
+    for statement in _constraints_and_indexes(ITEMS):
+        conn.execute(text(statement))
+    _attach(conn, old) # Dropping the partitioned table drops its partitions
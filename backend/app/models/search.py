@@ -0,0 +1,55 @@
+from sqlalchemy import Column, Integer, String, ForeignKey, Text, Index, DDL, event
+from app.core.config import settings
+from app.core.database import Base
+
+class SearchEntry(Base):
+    """
+    One searchable unit: a document (filename), a page of its text layer, or an extracted invoice
+    (number, vendor, item descriptions). `content` is normalize_arabic() text; the native full-text
+    index over it is created per dialect below (Postgres tsvector + GIN, SQLite FTS5).
+    """
+    __tablename__ = "search_entries"
+
+    id = Column(Integer, primary_key=True)
+    tenant_id = Column(Integer, ForeignKey("tenants.id"))
+    document_id = Column(Integer, ForeignKey("documents.id", ondelete="CASCADE"))
+    invoice_id = Column(Integer, ForeignKey("finance_invoices.id", ondelete="CASCADE"), nullable=True)
+
+    source = Column(String) # "document" | "page" | "invoice"
+    page = Column(Integer, nullable=True)
+    title = Column(String) # Display label (filename, invoice number / vendor)
+    content = Column(Text)
+
+    __table_args__ = (
+        Index("ix_search_entries_document_source", "document_id", "source"),
+        Index("ix_search_entries_invoice_id", "invoice_id"),
+    )
+
+# Postgres: generated tsvector column (kept in sync by the database) + GIN index.
+# The text search configuration must exist on the server ("arabic" ships with PostgreSQL 12+).
+POSTGRES_TSV_DDL = [
+    "ALTER TABLE search_entries ADD COLUMN content_tsv tsvector "
+    f"GENERATED ALWAYS AS (to_tsvector('{settings.SEARCH_TS_CONFIG}', coalesce(content, ''))) STORED",
+    "CREATE INDEX ix_search_entries_content_tsv ON search_entries USING gin (content_tsv)",
+]
+for statement in POSTGRES_TSV_DDL:
+    event.listen(SearchEntry.__table__, "after_create", DDL(statement).execute_if(dialect="postgresql"))
+
+# SQLite: external-content FTS5 table over search_entries.content, kept in sync by triggers
+# (which also fire for ON DELETE CASCADE from documents / invoices). The trigram tokenizer
+# (SQLite 3.34+) matches substrings, so "رخام" finds "الرخام" / "بالرخام" without an Arabic stemmer.
+SQLITE_FTS_DDL = [
+    "CREATE VIRTUAL TABLE search_entries_fts USING fts5(content, content='search_entries', content_rowid='id', tokenize='trigram')",
+    """CREATE TRIGGER search_entries_ai AFTER INSERT ON search_entries BEGIN
+        INSERT INTO search_entries_fts(rowid, content) VALUES (new.id, new.content);
+    END""",
+    """CREATE TRIGGER search_entries_ad AFTER DELETE ON search_entries BEGIN
+        INSERT INTO search_entries_fts(search_entries_fts, rowid, content) VALUES ('delete', old.id, old.content);
+    END""",
+    """CREATE TRIGGER search_entries_au AFTER UPDATE ON search_entries BEGIN
+        INSERT INTO search_entries_fts(search_entries_fts, rowid, content) VALUES ('delete', old.id, old.content);
+        INSERT INTO search_entries_fts(rowid, content) VALUES (new.id, new.content);
+    END""",
+]
+for statement in SQLITE_FTS_DDL:
+    event.listen(SearchEntry.__table__, "after_create", DDL(statement).execute_if(dialect="sqlite"))
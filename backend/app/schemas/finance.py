@@ -1,6 +1,6 @@
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, ConfigDict, Field
 from typing import List, Optional
-from datetime import date
+from datetime import date, datetime
 
 class InvoiceItemExtract(BaseModel):
     description: str = Field(..., description="Description of the line item")
@@ -17,3 +17,68 @@ class InvoiceExtract(BaseModel):
     total_amount: float = Field(..., description="Total amount of the invoice")
     currency: str = Field("SAR", description="Currency code (e.g., SAR, USD)")
     items: List[InvoiceItemExtract] = Field(default_factory=list, description="List of line items")
+    confidence: Optional[float] = Field(None, description="Local parser confidence (0-1). None for model extractions")
+
+class ExtractedSegment(BaseModel):
+    """
+    Extraction result for one page range of a document (one invoice).
+    """
+    page_start: Optional[int] = None
+    page_end: Optional[int] = None
+    extract: Optional[InvoiceExtract] = None
+    from_model: bool = False
+    error: Optional[str] = None
+
+# --- API responses (rendered straight from ORM rows) ---
+
+class VendorOut(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    id: int
+    name: Optional[str] = None
+    tax_id: Optional[str] = None
+
+class InvoiceItemOut(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    id: int
+    description: Optional[str] = None
+    quantity: Optional[float] = None
+    unit_price: Optional[float] = None
+    total_price: Optional[float] = None
+    category: Optional[str] = None
+
+class InvoiceOut(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    id: int
+    tenant_id: Optional[int] = None
+    document_id: Optional[int] = None
+    page_start: Optional[int] = None
+    page_end: Optional[int] = None
+    vendor_id: Optional[int] = None
+    invoice_number: Optional[str] = None
+    invoice_date: Optional[datetime] = None
+    due_date: Optional[datetime] = None
+    total_amount: Optional[float] = None
+    currency: Optional[str] = None
+    payment_status: Optional[str] = None
+    extraction_status: Optional[str] = None
+    audit_status: Optional[str] = None
+    vendor: Optional[VendorOut] = None
+    items: List[InvoiceItemOut] = Field(default_factory=list)
+
+class AuditFlagOut(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    id: int
+    issue_type: Optional[str] = None
+    severity: Optional[str] = None
+    description: Optional[str] = None
+    is_resolved: Optional[bool] = None
+
+class InvoiceSnapshot(InvoiceOut):
+    """
+    An invoice as it was extracted from a superseded document version (DocumentVersion.invoices).
+    """
+    audit_logs: List[AuditFlagOut] = Field(default_factory=list)
@@ -0,0 +1,30 @@
+import ipaddress
+from pydantic import BaseModel, Field, HttpUrl, field_validator
+from typing import Optional
+
+class WebhookSubscription(BaseModel):
+    """
+    Push delivery of the tenant's change feed (one webhook per tenant).
+    Batches are POSTed as {"tenant_id", "events", "next_cursor", "has_more"}; with a secret, the
+    X-Outbox-Signature header carries "sha256=" + HMAC-SHA256 of the raw body.
+    """
+    url: HttpUrl = Field(..., description="HTTPS endpoint receiving event batches (public hosts only)")
+    secret: Optional[str] = Field(None, description="HMAC key for X-Outbox-Signature")
+    from_cursor: Optional[int] = Field(None, description="Deliver events after this position (default: keep the current cursor, or start from now)")
+
+    @field_validator("url")
+    @classmethod
+    def public_https(cls, url: HttpUrl) -> HttpUrl:
+        # Literal checks only; hostnames are resolved and checked before saving (webhook_target_error)
+        if url.scheme != "https":
+            raise ValueError("must be an https:// URL")
+        host = (url.host or "").strip("[]").lower()
+        if host == "localhost" or host.endswith(".localhost"):
+            raise ValueError("must not point to localhost")
+        try:
+            address = ipaddress.ip_address(host)
+        except ValueError:
+            return url
+        if not (getattr(address, "ipv4_mapped", None) or address).is_global:
+            raise ValueError("must not point to a private, loopback or link-local address")
+        return url
@@ -0,0 +1,15 @@
+from pydantic import BaseModel, Field
+from typing import Dict, List, Literal, Optional
+
+Tier = Literal["fast", "standard", "deep"]
+Task = Literal["chat", "extraction", "categorize", "summary"]
+
+class ModelRoutingPolicy(BaseModel):
+    """
+    Per-tenant routing overrides, stored in Tenant.ai_config["model_routing"].
+    Anything left out falls back to the GEMINI_* / GEMINI_ROUTE_* settings.
+    """
+    models: Dict[Tier, str] = Field(default_factory=dict, description="Model name per tier, e.g. {'deep': 'gemini-2.5-pro'}")
+    tasks: Dict[Task, Tier] = Field(default_factory=dict, description="Pins a task to a tier, e.g. {'extraction': 'deep'}")
+    max_tier: Optional[Tier] = Field(None, description="Cost ceiling: no request is routed above this tier")
+    deep_roles: Optional[List[str]] = Field(None, description="Roles whose multi-document questions go to the deep tier")
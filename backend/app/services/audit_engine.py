@@ -0,0 +1,318 @@
+import time
+import logging
+from collections import Counter
+from typing import Dict, List, Optional, TYPE_CHECKING
+
+from sqlalchemy import select, delete, insert, update, exists, case, func
+
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal
+from app.models.document import Document
+from app.models.finance import FinanceInvoice, FinanceInvoiceItem, FinanceVendor, FinanceAuditFlag
+from app.services.vendor_risk import vendor_risk
+from app.services.response_snapshots import bump_invoices
+from app.services.outbox import outbox
+
+if TYPE_CHECKING:
+    import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# issue_type -> severity. Flags of these types are owned (rewritten) by the engine.
+AUDIT_RULES = {
+    "total_mismatch": "high",
+    "duplicate": "high",
+    "line_mismatch": "medium",
+    "missing_tax_id": "medium",
+    "amount_outlier": "medium",
+    "round_amount": "low",
+    "weekend_date": "low",
+}
+
+VAT_RATE = 0.15
+
+
+def _close(a: "np.ndarray", b: "np.ndarray") -> "np.ndarray":
+    import numpy as np
+
+    return np.abs(a - b) <= np.maximum(settings.AUDIT_AMOUNT_TOLERANCE, np.abs(b) * 0.005)
+
+
+class AuditEngine:
+    """
+    Batch audit rules over a tenant's invoices, evaluated on NumPy columns instead of row by row.
+    - Full run: every completed invoice of the tenant.
+    - Incremental run: the given invoices, evaluated against their vendors' history.
+    Flags are rewritten in bulk; flags a user already resolved are not raised again.
+    Vendor risk counters follow the flag changes (deltas when incremental, rebuilt on full runs).
+    """
+
+    # --- Loading (columnar) ---
+
+    def _invoice_scope(self, tenant_id: int, vendor_ids: Optional[List[int]] = None, invoice_ids: Optional[List[int]] = None):
+        stmt = (
+            select(FinanceInvoice.id)
+            .join(Document, Document.id == FinanceInvoice.document_id)
+            .where(
+                FinanceInvoice.tenant_id == tenant_id,
+                FinanceInvoice.extraction_status == "completed",
+                Document.deleted_at.is_(None),
+            )
+        )
+        if vendor_ids is not None:
+            by_vendor = FinanceInvoice.vendor_id.in_(vendor_ids)
+            stmt = stmt.where(by_vendor | FinanceInvoice.id.in_(invoice_ids) if invoice_ids else by_vendor)
+        return stmt
+
+    async def _load(self, db, tenant_id: int, scope) -> Dict[str, "np.ndarray"]:
+        """
+        One row per invoice, as NumPy columns. Line items are reduced per invoice inside the
+        database (count, sum, lines where quantity x unit price != line total), so a million
+        items never cross the wire as rows.
+        """
+        import numpy as np
+
+        q, price, line_total = FinanceInvoiceItem.quantity, FinanceInvoiceItem.unit_price, FinanceInvoiceItem.total_price
+        line_tolerance = case(
+            (func.abs(line_total) * 0.005 > settings.AUDIT_AMOUNT_TOLERANCE, func.abs(line_total) * 0.005),
+            else_=settings.AUDIT_AMOUNT_TOLERANCE,
+        )
+        bad_line = case((func.abs(q * price - line_total) > line_tolerance, 1), else_=0)
+        item_totals = (
+            select(
+                FinanceInvoiceItem.invoice_id.label("invoice_id"),
+                func.count(FinanceInvoiceItem.id).label("item_count"),
+                func.coalesce(func.sum(line_total), 0.0).label("item_sum"),
+                func.sum(bad_line).label("bad_lines"),
+            )
+            .where(FinanceInvoiceItem.tenant_id == tenant_id, FinanceInvoiceItem.invoice_id.in_(scope)) # tenant_id: partition pruning
+            .group_by(FinanceInvoiceItem.invoice_id)
+            .subquery()
+        )
+
+        stmt = (
+            select(
+                FinanceInvoice.id, FinanceInvoice.vendor_id, FinanceInvoice.invoice_number,
+                FinanceInvoice.invoice_date, FinanceInvoice.total_amount, FinanceVendor.tax_id,
+                item_totals.c.item_count, item_totals.c.item_sum, item_totals.c.bad_lines,
+            )
+            .outerjoin(FinanceVendor, FinanceVendor.id == FinanceInvoice.vendor_id)
+            .outerjoin(item_totals, item_totals.c.invoice_id == FinanceInvoice.id)
+            .where(FinanceInvoice.id.in_(scope))
+            .order_by(FinanceInvoice.id)
+            .execution_options(yield_per=settings.AUDIT_BATCH_SIZE)
+        )
+        columns = [[] for _ in range(9)]
+        result = await db.stream(stmt)
+        async for partition in result.partitions():
+            for column, values in zip(columns, zip(*partition)):
+                column.extend(values)
+        ids, vendor_ids, numbers, dates, totals, tax_ids, item_counts, item_sums, bad_lines = columns
+
+        return {
+            "id": np.array(ids, dtype=np.int64),
+            "vendor_id": np.array([v if v is not None else -1 for v in vendor_ids], dtype=np.int64),
+            "invoice_number": np.array([n or "" for n in numbers], dtype=object),
+            "invoice_date": np.array(dates, dtype="datetime64[D]"),
+            "total": np.array(totals, dtype=np.float64), # None -> nan
+            "has_tax_id": np.array([bool(t and t.strip()) for t in tax_ids], dtype=bool),
+            "item_count": np.array([c or 0 for c in item_counts], dtype=np.int64),
+            "item_sum": np.array([s or 0.0 for s in item_sums], dtype=np.float64),
+            "bad_lines": np.array([b or 0 for b in bad_lines], dtype=np.int64),
+        }
+
+    # --- Rules (vectorized) ---
+
+    def evaluate(self, frame: Dict[str, "np.ndarray"]) -> Dict[str, "np.ndarray"]:
+        """
+        Returns issue_type -> boolean mask over the frame's invoices.
+        """
+        import numpy as np
+
+        total, item_sum, vendor = frame["total"], frame["item_sum"], frame["vendor_id"]
+        has_total = ~np.isnan(total)
+        masks = {}
+
+        # Total must equal the items, with or without VAT on top
+        has_items = frame["item_count"] > 0
+        masks["total_mismatch"] = has_items & has_total & ~_close(item_sum, total) & ~_close(item_sum * (1 + VAT_RATE), total)
+        masks["line_mismatch"] = frame["bad_lines"] > 0
+        masks["missing_tax_id"] = (vendor >= 0) & ~frame["has_tax_id"]
+
+        # Per-vendor z-score of the amount (vendors with enough history only)
+        vendor_codes, vendor_index = np.unique(vendor, return_inverse=True)
+        amounts = np.where(has_total, total, 0.0)
+        n = np.bincount(vendor_index, weights=has_total, minlength=len(vendor_codes))
+        s = np.bincount(vendor_index, weights=amounts, minlength=len(vendor_codes))
+        sq = np.bincount(vendor_index, weights=amounts ** 2, minlength=len(vendor_codes))
+        with np.errstate(invalid="ignore", divide="ignore"):
+            mean = s / n
+            std = np.sqrt(np.maximum(sq / n - mean ** 2, 0.0))
+            z = (amounts - mean[vendor_index]) / std[vendor_index]
+        enough = (n[vendor_index] >= settings.AUDIT_OUTLIER_MIN_INVOICES) & (vendor >= 0) & (std[vendor_index] > 0)
+        masks["amount_outlier"] = has_total & enough & (np.abs(z) > settings.AUDIT_OUTLIER_Z)
+
+        unit = settings.AUDIT_ROUND_AMOUNT_UNIT
+        masks["round_amount"] = has_total & (total >= settings.AUDIT_ROUND_AMOUNT_MIN) & (np.mod(total, unit) == 0)
+
+        # 1970-01-01 was a Thursday: (days + 3) % 7 gives Monday=0 ... Sunday=6
+        dates = frame["invoice_date"]
+        weekday = (dates.astype(np.int64) + 3) % 7
+        masks["weekend_date"] = ~np.isnat(dates) & np.isin(weekday, settings.AUDIT_WEEKEND_DAYS)
+
+        # Same vendor + invoice number more than once
+        numbers = frame["invoice_number"]
+        _, number_codes = np.unique(numbers.astype(str), return_inverse=True)
+        pair = vendor_index.astype(np.int64) * (number_codes.max(initial=0) + 1) + number_codes
+        _, pair_index, pair_counts = np.unique(pair, return_inverse=True, return_counts=True)
+        masks["duplicate"] = (numbers != "") & (pair_counts[pair_index] > 1)
+
+        return masks
+
+    def _describe(self, issue_type: str, frame: Dict[str, "np.ndarray"], i: int) -> str:
+        total = frame["total"][i]
+        if issue_type == "total_mismatch":
+            return f"Invoice total {total:.2f} does not match the sum of its items {frame['item_sum'][i]:.2f}."
+        if issue_type == "line_mismatch":
+            return f"{frame['bad_lines'][i]} line item(s) where quantity x unit price differs from the line total."
+        if issue_type == "missing_tax_id":
+            return "Vendor has no tax ID (VAT registration number)."
+        if issue_type == "amount_outlier":
+            return f"Amount {total:.2f} is unusual for this vendor."
+        if issue_type == "round_amount":
+            return f"Suspiciously round amount {total:.2f}."
+        if issue_type == "weekend_date":
+            return f"Invoice dated on a weekend ({frame['invoice_date'][i]})."
+        if issue_type == "duplicate":
+            return f"Invoice number {frame['invoice_number'][i]} appears more than once for this vendor."
+        return issue_type
+
+    # --- Write back (bulk) ---
+
+    async def _write_flags(self, db, tenant_id: int, frame, masks, target: "np.ndarray", target_ids: Optional[List[int]]) -> Dict[str, int]:
+        import numpy as np
+
+        # Only invoices the frame can describe (completed, live document): failed extractions keep
+        # their status and soft-deleted documents keep their flags until the GC purges them
+        invoice_ids = self._invoice_scope(tenant_id)
+        if target_ids is not None:
+            invoice_ids = invoice_ids.where(FinanceInvoice.id.in_(target_ids))
+        flagged_scope = FinanceInvoice.id.in_(invoice_ids)
+
+        stmt = select(FinanceAuditFlag.invoice_id, FinanceAuditFlag.issue_type).where(
+            FinanceAuditFlag.invoice_id.in_(invoice_ids),
+            FinanceAuditFlag.is_resolved == True,
+        )
+        resolved = set((await db.execute(stmt)).all())
+        stmt = select(FinanceAuditFlag.invoice_id, FinanceAuditFlag.issue_type).where(
+            FinanceAuditFlag.invoice_id.in_(invoice_ids),
+            FinanceAuditFlag.issue_type.in_(list(AUDIT_RULES)),
+            FinanceAuditFlag.is_resolved == False,
+        )
+        open_before = set((await db.execute(stmt)).all())
+        if target_ids is not None:
+            before = await vendor_risk.open_flag_counts(db, invoice_ids, AUDIT_RULES)
+
+        await db.execute(delete(FinanceAuditFlag).where(
+            FinanceAuditFlag.invoice_id.in_(invoice_ids),
+            FinanceAuditFlag.issue_type.in_(list(AUDIT_RULES)),
+            FinanceAuditFlag.is_resolved == False,
+        ).execution_options(synchronize_session=False))
+
+        rows, counts = [], {}
+        for issue_type, mask in masks.items():
+            hits = np.flatnonzero(mask & target)
+            counts[issue_type] = len(hits)
+            for i in hits:
+                invoice_id = int(frame["id"][i])
+                if (invoice_id, issue_type) in resolved:
+                    continue
+                rows.append({
+                    "invoice_id": invoice_id,
+                    "issue_type": issue_type,
+                    "severity": AUDIT_RULES[issue_type],
+                    "description": self._describe(issue_type, frame, i),
+                    "is_resolved": False,
+                })
+        for start in range(0, len(rows), settings.AUDIT_BATCH_SIZE):
+            await db.execute(insert(FinanceAuditFlag), rows[start:start + settings.AUDIT_BATCH_SIZE])
+
+        # Vendor counters move by the difference (full runs rebuild them instead)
+        if target_ids is not None:
+            vendor_of = {i: (v if v >= 0 else None) for i, v in zip(frame["id"].tolist(), frame["vendor_id"].tolist())}
+            after = Counter((vendor_of[row["invoice_id"]], row["severity"]) for row in rows)
+            await vendor_risk.apply_flag_deltas(db, {key: after[key] - before[key] for key in set(after) | set(before)})
+
+        # Invoices whose audit result changes: different open flags, or a different status
+        # (first audit, flags resolved or raised outside the rules)
+        open_flag = exists().where(FinanceAuditFlag.invoice_id == FinanceInvoice.id, FinanceAuditFlag.is_resolved == False)
+        status = case((open_flag, "flagged"), else_="clean")
+        stmt = select(FinanceInvoice.id).where(flagged_scope, FinanceInvoice.audit_status.is_(None) | (FinanceInvoice.audit_status != status))
+        changed = set((await db.execute(stmt)).scalars().all())
+        changed.update(invoice_id for invoice_id, _ in open_before ^ {(row["invoice_id"], row["issue_type"]) for row in rows})
+
+        # One statement for every status instead of one UPDATE per invoice
+        await db.execute(
+            update(FinanceInvoice)
+            .where(flagged_scope)
+            .values(audit_status=status)
+            .execution_options(synchronize_session=False)
+        )
+        await self._record_changes(db, tenant_id, sorted(changed))
+        return counts
+
+    async def _record_changes(self, db, tenant_id: int, invoice_ids: List[int]):
+        """
+        invoice.audited change events (status and open flags after the run), in the audit's transaction.
+        """
+        for start in range(0, len(invoice_ids), settings.AUDIT_BATCH_SIZE):
+            batch = invoice_ids[start:start + settings.AUDIT_BATCH_SIZE]
+            stmt = (
+                select(FinanceInvoice.id, FinanceInvoice.document_id, FinanceInvoice.audit_status, func.count(FinanceAuditFlag.id))
+                .outerjoin(FinanceAuditFlag, (FinanceAuditFlag.invoice_id == FinanceInvoice.id) & (FinanceAuditFlag.is_resolved == False))
+                .where(FinanceInvoice.id.in_(batch))
+                .group_by(FinanceInvoice.id, FinanceInvoice.document_id, FinanceInvoice.audit_status)
+            )
+            await outbox.record_many(db, tenant_id, [
+                ("invoice.audited", invoice_id, {"document_id": document_id, "audit_status": audit_status, "open_flags": open_flags})
+                for invoice_id, document_id, audit_status, open_flags in (await db.execute(stmt)).all()
+            ])
+
+    # --- Entry points ---
+
+    async def run(self, tenant_id: int, invoice_ids: Optional[List[int]] = None) -> dict:
+        """
+        Full audit of the tenant, or incremental (only `invoice_ids` are re-flagged, but rules
+        that need context - outliers, duplicates - still see the whole history of their vendors).
+        Uses its own session; safe to call from background tasks.
+        """
+        import numpy as np
+
+        started = time.perf_counter()
+        async with AsyncSessionLocal() as db:
+            try:
+                if invoice_ids is not None:
+                    stmt = select(FinanceInvoice.vendor_id).where(FinanceInvoice.id.in_(invoice_ids)).distinct()
+                    vendor_ids = [v for v in (await db.execute(stmt)).scalars().all() if v is not None]
+                    scope = self._invoice_scope(tenant_id, vendor_ids, invoice_ids)
+                else:
+                    scope = self._invoice_scope(tenant_id)
+
+                frame = await self._load(db, tenant_id, scope)
+                masks = self.evaluate(frame)
+                target = np.isin(frame["id"], invoice_ids) if invoice_ids is not None else np.ones(len(frame["id"]), dtype=bool)
+                counts = await self._write_flags(db, tenant_id, frame, masks, target, invoice_ids)
+                if invoice_ids is None:
+                    await vendor_risk.rebuild(db, tenant_id)
+                await db.commit()
+            except Exception as e:
+                logger.error(f"Audit failed for tenant {tenant_id}: {e}")
+                await db.rollback()
+                raise
+
+        await bump_invoices(tenant_id, invoice_ids or (), bulk=invoice_ids is None)
+        elapsed = time.perf_counter() - started
+        logger.info(f"Audit tenant {tenant_id}: {int(target.sum())} invoices in {elapsed:.2f}s, flags {counts}")
+        return {"invoices": int(target.sum()), "flags": counts, "seconds": round(elapsed, 3)}
+
+audit_engine = AuditEngine()
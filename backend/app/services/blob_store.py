@@ -0,0 +1,230 @@
+import io
+import os
+import mmap
+import uuid
+import hashlib
+import logging
+from contextlib import contextmanager
+from typing import BinaryIO, Iterator, List, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError: # Windows: no file locks, the budget and pins only hold within one process
+    fcntl = None
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 1024 * 1024
+
+
+class BlobStore:
+    """
+    Local content-addressed store for uploaded files.
+    - Blobs are keyed by SHA-256, so identical uploads are stored once.
+    - Total size is bounded by `max_bytes`; least recently used blobs are evicted
+      (blobs pinned by an in-progress reader/upload are never evicted).
+    - Readers get read-only memory maps instead of copies.
+    The state lives on disk, so every worker on the host shares the budget: recency is the
+    file mtime, a reader pins a blob with a shared flock on it, and eviction rescans the
+    store under an exclusive lock on <root>/.lock and skips blobs it cannot lock exclusively.
+    Layout: <root>/<digest[:2]>/<digest>
+    """
+
+    def __init__(self, root: str, max_bytes: int):
+        self.root = root
+        self.max_bytes = max_bytes
+        self._ready = False
+
+    def _ensure_root(self):
+        if not self._ready:
+            os.makedirs(os.path.join(self.root, "tmp"), exist_ok=True)
+            self._ready = True
+
+    def _scan(self) -> List[Tuple[float, str, int]]:
+        """
+        (mtime, digest, size) of every stored blob, least recently used first.
+        """
+        self._ensure_root()
+        entries = []
+        for prefix in os.listdir(self.root):
+            folder = os.path.join(self.root, prefix)
+            if prefix == "tmp" or len(prefix) != 2 or not os.path.isdir(folder):
+                continue
+            for entry in os.scandir(folder):
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError: # Removed by another worker meanwhile
+                    continue
+                entries.append((stat.st_mtime, entry.name, stat.st_size))
+        entries.sort()
+        return entries
+
+    def _touch(self, digest: str):
+        try:
+            os.utime(self.path(digest)) # mtime is the shared recency
+        except OSError:
+            pass
+
+    # --- Public API ---
+
+    def path(self, digest: str) -> str:
+        return os.path.join(self.root, digest[:2], digest)
+
+    def exists(self, digest: Optional[str]) -> bool:
+        """
+        Advisory: another worker may evict the blob right after. Readers use pinned()/open_mmap(),
+        which yield None when it is gone.
+        """
+        return bool(digest) and os.path.isfile(self.path(digest))
+
+    def put(self, fileobj: BinaryIO) -> Tuple[str, int]:
+        """
+        Streams `fileobj` into the store (hashing as it goes) and returns (digest, size).
+        Blocking - run in a thread from async code.
+        """
+        self._ensure_root()
+        tmp_path = os.path.join(self.root, "tmp", uuid.uuid4().hex)
+        hasher = hashlib.sha256()
+        size = 0
+        with open(tmp_path, "wb") as out:
+            while True:
+                chunk = fileobj.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                hasher.update(chunk)
+                out.write(chunk)
+                size += len(chunk)
+        digest = hasher.hexdigest()
+
+        if os.path.isfile(self.path(digest)):
+            # Duplicate content: keep the existing blob (and its readers' pins)
+            os.remove(tmp_path)
+        else:
+            os.makedirs(os.path.dirname(self.path(digest)), exist_ok=True)
+            os.replace(tmp_path, self.path(digest))
+        with self._pin(digest) as f: # Protect the new blob from its own eviction pass
+            if f is not None:
+                self._evict()
+        return digest, size
+
+    def remove(self, digest: str):
+        with self._exclusive(digest) as locked:
+            if locked:
+                self._unlink(digest)
+
+    @contextmanager
+    def pinned(self, digest: str) -> Iterator[Optional[str]]:
+        """
+        Yields the blob path (or None if absent/evicted) and keeps it from being evicted meanwhile.
+        """
+        with self._pin(digest) as f:
+            yield None if f is None else self.path(digest)
+
+    @contextmanager
+    def open_mmap(self, digest: str) -> Iterator[Optional[mmap.mmap]]:
+        """
+        Zero-copy, read-only view of the blob. The map is file-like (read/seek/tell)
+        and supports slicing/memoryview. Yields None if the blob is not stored.
+        """
+        with self._pin(digest) as f:
+            if f is None:
+                yield None
+                return
+            if os.fstat(f.fileno()).st_size == 0:
+                yield io.BytesIO() # mmap cannot map empty files
+                return
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            try:
+                yield mapped
+            finally:
+                mapped.close()
+
+    def usage(self) -> dict:
+        entries = self._scan()
+        return {"blobs": len(entries), "bytes": sum(size for _, _, size in entries), "max_bytes": self.max_bytes}
+
+    # --- Pins / Eviction ---
+
+    @contextmanager
+    def _pin(self, digest: Optional[str]) -> Iterator[Optional[BinaryIO]]:
+        """
+        Opens the blob under a shared lock (None if it is not stored). An evictor that unlinked
+        it between our open and our lock is detected by the path no longer naming our file.
+        """
+        if not digest:
+            yield None
+            return
+        path = self.path(digest)
+        try:
+            f = open(path, "rb")
+        except FileNotFoundError:
+            yield None
+            return
+        try:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_SH)
+            try:
+                current = os.stat(path)
+            except FileNotFoundError:
+                current = None
+            if current is None or current.st_ino != os.fstat(f.fileno()).st_ino:
+                yield None
+                return
+            self._touch(digest)
+            yield f
+        finally:
+            f.close() # Releases the lock
+
+    @contextmanager
+    def _exclusive(self, digest: str) -> Iterator[bool]:
+        """
+        True if nobody (in any worker) has the blob pinned; it stays that way until exit.
+        """
+        try:
+            f = open(self.path(digest), "rb")
+        except FileNotFoundError:
+            yield False
+            return
+        try:
+            if fcntl is not None:
+                try:
+                    fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    yield False
+                    return
+            yield True
+        finally:
+            f.close()
+
+    def _unlink(self, digest: str):
+        try:
+            os.remove(self.path(digest))
+        except OSError:
+            pass
+
+    @contextmanager
+    def _store_lock(self):
+        self._ensure_root()
+        with open(os.path.join(self.root, ".lock"), "a") as f:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            yield
+
+    def _evict(self):
+        # One evictor at a time across workers; the rescan sees every worker's blobs
+        with self._store_lock():
+            entries = self._scan()
+            total = sum(size for _, _, size in entries)
+            for _, digest, size in entries:
+                if total <= self.max_bytes:
+                    break
+                with self._exclusive(digest) as locked:
+                    if not locked:
+                        continue # Pinned
+                    logger.info(f"Blob store: evicting {digest} (LRU)")
+                    self._unlink(digest)
+                    total -= size
+
+blob_store = BlobStore(settings.BLOB_STORE_DIR, settings.BLOB_STORE_MAX_BYTES)
@@ -0,0 +1,155 @@
+import logging
+from typing import List, Optional
+from fastapi import HTTPException
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, func
+
+from app.core.cache import cache
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal
+from app.models.chat import ChatSession, ChatTurn
+from app.services.gemini import gemini_service, FALLBACK_ANSWER
+from app.services.tenant_service import tenant_service
+
+logger = logging.getLogger(__name__)
+
+SUMMARY_INSTRUCTION = (
+    "You maintain the running memory of a conversation between an employee and a corporate assistant. "
+    "Merge the previous summary and the new turns into one concise summary. Keep facts, numbers, "
+    "document names, decisions and open questions. Write in the language of the conversation. "
+    "Output ONLY the summary."
+)
+
+
+class ChatSessionService:
+    async def get_or_create(self, db: AsyncSession, tenant_id: int, user_id: int, session_id: Optional[int] = None, title: Optional[str] = None) -> ChatSession:
+        if session_id is not None:
+            session = await self.get(db, tenant_id, user_id, session_id)
+            if not session:
+                raise HTTPException(status_code=404, detail="Chat session not found")
+            return session
+
+        session = ChatSession(tenant_id=tenant_id, user_id=user_id, title=(title or "")[:80], summarized_until=0)
+        db.add(session)
+        await db.commit()
+        await db.refresh(session)
+        return session
+
+    async def get(self, db: AsyncSession, tenant_id: int, user_id: int, session_id: int) -> Optional[ChatSession]:
+        # Scoped by tenant + user: a session id alone never grants access
+        stmt = select(ChatSession).where(
+            ChatSession.id == session_id,
+            ChatSession.tenant_id == tenant_id,
+            ChatSession.user_id == user_id,
+        )
+        result = await db.execute(stmt)
+        return result.scalars().first()
+
+    async def list_sessions(self, db: AsyncSession, tenant_id: int, user_id: int, limit: int = 50) -> List[ChatSession]:
+        stmt = select(ChatSession).where(
+            ChatSession.tenant_id == tenant_id,
+            ChatSession.user_id == user_id,
+        ).order_by(ChatSession.updated_at.desc()).limit(limit)
+        result = await db.execute(stmt)
+        return result.scalars().all()
+
+    async def recent_turns(self, db: AsyncSession, session: ChatSession) -> List[ChatTurn]:
+        """
+        Newest turns not yet folded into the summary (an index range scan on session_id, id).
+        """
+        stmt = select(ChatTurn).where(
+            ChatTurn.session_id == session.id,
+            ChatTurn.id > (session.summarized_until or 0),
+        ).order_by(ChatTurn.id.desc()).limit(settings.CHAT_HISTORY_MAX_TURNS)
+        result = await db.execute(stmt)
+        return list(reversed(result.scalars().all()))
+
+    def render_history(self, summary: Optional[str], turns: List[ChatTurn]) -> Optional[str]:
+        """
+        Summary + verbatim recent turns, each capped, so the history block has a hard size bound.
+        """
+        lines = []
+        if summary:
+            lines.append(f"Summary of earlier conversation:\n{summary[:settings.CHAT_SUMMARY_MAX_CHARS]}")
+        for turn in turns:
+            speaker = "User" if turn.role == "user" else "Assistant"
+            lines.append(f"{speaker}: {(turn.content or '')[:settings.CHAT_TURN_MAX_CHARS]}")
+        return "\n".join(lines) if lines else None
+
+    async def build_history(self, db: AsyncSession, session: ChatSession) -> Optional[str]:
+        turns = await self.recent_turns(db, session)
+        return self.render_history(session.summary, turns)
+
+    async def record_exchange(self, db: AsyncSession, session: ChatSession, query: str, answer: str) -> bool:
+        """
+        Appends the user/assistant turns. Returns True when the session needs compaction.
+        """
+        db.add(ChatTurn(session_id=session.id, role="user", content=query))
+        db.add(ChatTurn(session_id=session.id, role="assistant", content=answer))
+        session.updated_at = func.now()
+        await db.commit()
+
+        stmt = select(func.count(ChatTurn.id)).where(
+            ChatTurn.session_id == session.id,
+            ChatTurn.id > (session.summarized_until or 0),
+        )
+        pending = (await db.execute(stmt)).scalar() or 0
+        return pending > settings.CHAT_HISTORY_MAX_TURNS
+
+    async def compact(self, session_id: int):
+        """
+        Folds the oldest unsummarized turns into the rolling summary.
+        Runs as a background task (own DB session) so it never delays the answer.
+        """
+        async with cache.lock(f"chat:compact:{session_id}", timeout=120, blocking=False) as acquired:
+            if not acquired:
+                # Another worker is already folding this session
+                return
+            await self._compact(session_id)
+
+    async def _compact(self, session_id: int):
+        async with AsyncSessionLocal() as db:
+            try:
+                session = await db.get(ChatSession, session_id)
+                if not session:
+                    return
+
+                batch_size = settings.CHAT_HISTORY_MAX_TURNS * 4
+                stmt = select(ChatTurn).where(
+                    ChatTurn.session_id == session.id,
+                    ChatTurn.id > (session.summarized_until or 0),
+                ).order_by(ChatTurn.id).limit(batch_size)
+                turns = (await db.execute(stmt)).scalars().all()
+
+                # Oldest first; the newest KEEP turns stay verbatim
+                to_fold = turns if len(turns) == batch_size else turns[:-settings.CHAT_HISTORY_KEEP_TURNS]
+                if not to_fold:
+                    return
+
+                transcript = self.render_history(None, to_fold)
+                prompt = (
+                    f"Previous summary:\n{session.summary or '(none)'}\n\n"
+                    f"New turns:\n{transcript}\n\n"
+                    f"Write the updated summary in at most {settings.CHAT_SUMMARY_MAX_CHARS} characters."
+                )
+                summary = await gemini_service.generate_answer(
+                    query=prompt,
+                    file_uris=[],
+                    system_instruction=SUMMARY_INSTRUCTION,
+                    api_key=await tenant_service.get_api_key(db, session.tenant_id),
+                    task="summary",
+                    tenant_id=session.tenant_id
+                )
+                if summary == FALLBACK_ANSWER:
+                    # Keep the turns; compaction will be retried after the next exchange
+                    return
+
+                session.summary = summary.strip()[:settings.CHAT_SUMMARY_MAX_CHARS]
+                session.summarized_until = to_fold[-1].id
+                await db.commit()
+                logger.info(f"Compacted chat session {session_id}: folded {len(to_fold)} turns")
+            except Exception as e:
+                logger.error(f"Chat compaction failed for session {session_id}: {e}")
+                await db.rollback()
+
+chat_session_service = ChatSessionService()
@@ -0,0 +1,138 @@
+import os
+import hashlib
+import logging
+from typing import Dict, List, Optional, Tuple
+
+from app.core.config import settings
+from app.services.invoice_parser import invoice_parser
+
+logger = logging.getLogger(__name__)
+
+PageRange = Tuple[int, int] # 1-based, inclusive
+
+
+class DocumentSplitter:
+    """
+    Splits multi-invoice batches and very long invoices into page ranges
+    that can be extracted independently (and in parallel).
+    """
+
+    def page_count(self, source) -> int:
+        from pypdf import PdfReader
+
+        try:
+            return len(PdfReader(source).pages)
+        except Exception as e:
+            logger.warning(f"Could not read page count: {e}")
+            return 0
+
+    def page_fingerprints(self, source) -> List[str]:
+        """
+        SHA-256 of every page's drawing instructions and embedded images (fonts and document
+        metadata are ignored), so an unchanged page of a re-saved PDF keeps its fingerprint.
+        [] if the PDF cannot be read. Blocking - run in a thread from async code.
+        """
+        from pypdf import PdfReader
+
+        try:
+            reader = PdfReader(source)
+            fingerprints = []
+            for page in reader.pages:
+                digest = hashlib.sha256()
+                contents = page.get_contents()
+                if contents is not None:
+                    digest.update(contents.get_data())
+                resources = page.get("/Resources")
+                xobjects = resources.get_object().get("/XObject") if resources is not None else None
+                if xobjects is not None:
+                    xobjects = xobjects.get_object()
+                    for name in sorted(xobjects):
+                        digest.update(name.encode("utf-8"))
+                        digest.update(xobjects[name].get_object().get_data())
+                fingerprints.append(digest.hexdigest())
+            return fingerprints
+        except Exception as e:
+            logger.warning(f"Could not fingerprint pages: {e}")
+            return []
+
+    def page_map(self, previous: Optional[List[str]], current: Optional[List[str]]) -> Dict[int, int]:
+        """
+        Maps unchanged pages of the current version to their page in the previous one
+        (1-based, current -> previous). A page matches when its fingerprint is equal, preferably
+        at the same position; moved pages (inserted / removed pages before them) match too.
+        """
+        if not previous or not current:
+            return {}
+        unused: Dict[str, List[int]] = {}
+        for number, fingerprint in enumerate(previous, start=1):
+            unused.setdefault(fingerprint, []).append(number)
+
+        mapping = {}
+        for number, fingerprint in enumerate(current, start=1):
+            if number <= len(previous) and previous[number - 1] == fingerprint and number in unused[fingerprint]:
+                mapping[number] = number
+                unused[fingerprint].remove(number)
+        for number, fingerprint in enumerate(current, start=1):
+            if number not in mapping and unused.get(fingerprint):
+                mapping[number] = unused[fingerprint].pop(0)
+        return mapping
+
+    def unchanged_range(self, mapping: Dict[int, int], page_range: PageRange) -> Optional[PageRange]:
+        """
+        The previous version's page range that `page_range` reproduces page for page, or None.
+        """
+        start, end = page_range
+        first = mapping.get(start)
+        if first is None:
+            return None
+        if any(mapping.get(page) != first + page - start for page in range(start, end + 1)):
+            return None
+        return first, first + end - start
+
+    def plan_segments(self, page_count: int, pages: Optional[List[str]] = None, max_pages: Optional[int] = None) -> List[PageRange]:
+        """
+        Returns the page ranges to extract.
+        - With a text layer: a new segment starts on every page that prints a different invoice number.
+        - Without one (scans): fixed windows; the model reports continuations.
+        Any segment longer than max_pages is cut into windows so long item tables are not truncated.
+        """
+        max_pages = max_pages or settings.EXTRACTION_SEGMENT_MAX_PAGES
+        if page_count <= 0:
+            return []
+
+        boundaries = [1]
+        if pages and len(pages) == page_count:
+            current = invoice_parser.invoice_number_on_page(pages[0])
+            for index, page in enumerate(pages[1:], start=2):
+                number = invoice_parser.invoice_number_on_page(page)
+                if number and number != current:
+                    boundaries.append(index)
+                    current = number
+
+        segments = []
+        for i, start in enumerate(boundaries):
+            end = boundaries[i + 1] - 1 if i + 1 < len(boundaries) else page_count
+            for window_start in range(start, end + 1, max_pages):
+                segments.append((window_start, min(window_start + max_pages - 1, end)))
+
+        return segments
+
+    def write_segment(self, source, page_range: PageRange, dest_dir: str, base: str = "segment") -> str:
+        """
+        Writes the page range of `source` (path or file-like, e.g. a blob mmap) to a standalone PDF
+        and returns its path. Blocking - run in a thread from async code.
+        """
+        from pypdf import PdfReader, PdfWriter
+
+        start, end = page_range
+        reader = PdfReader(source)
+        writer = PdfWriter()
+        for index in range(start - 1, end):
+            writer.add_page(reader.pages[index])
+
+        path = os.path.join(dest_dir, f"{base}_p{start}-{end}.pdf")
+        with open(path, "wb") as f:
+            writer.write(f)
+        return path
+
+document_splitter = DocumentSplitter()
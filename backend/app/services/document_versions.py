@@ -0,0 +1,107 @@
+import logging
+from datetime import datetime, timezone
+from typing import List, Optional
+
+from pydantic import TypeAdapter
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
+
+from app.models.document import Document, DocumentVersion
+from app.models.finance import FinanceInvoice, FinanceInvoiceItem
+from app.schemas.finance import InvoiceSnapshot
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOTS = TypeAdapter(List[InvoiceSnapshot])
+
+
+class DocumentVersionService:
+    """
+    Forced re-uploads create a new version of the same Document instead of replacing it:
+    the row (id, invoices, flags, search entries) is the lineage and takes the new content,
+    the previous content and a snapshot of what was extracted from it go to document_versions.
+    Extraction and indexing then only redo the pages whose fingerprint changed
+    (see FinanceExtractorService, SearchIndex.index_document).
+    Callers own the transaction (nothing is committed here).
+    """
+
+    async def snapshot(self, db: AsyncSession, document: Document) -> list:
+        stmt = select(FinanceInvoice).where(FinanceInvoice.document_id == document.id).options(
+            selectinload(FinanceInvoice.vendor),
+            selectinload(FinanceInvoice.items.and_(FinanceInvoiceItem.tenant_id == document.tenant_id)),
+            selectinload(FinanceInvoice.audit_logs),
+        ).order_by(FinanceInvoice.page_start, FinanceInvoice.id)
+        invoices = (await db.execute(stmt)).scalars().all()
+        return SNAPSHOTS.dump_python(SNAPSHOTS.validate_python(invoices, from_attributes=True), mode="json")
+
+    async def new_version(self, db: AsyncSession, document: Document, filename: str, file_uri: str, content_hash: str, file_size: int, page_fingerprints: Optional[List[str]]) -> Document:
+        """
+        Archives the document's current content and replaces it with the uploaded one.
+        """
+        db.add(DocumentVersion(
+            document_id=document.id,
+            version=document.version,
+            filename=document.filename,
+            content_hash=document.content_hash,
+            file_size=document.file_size,
+            page_fingerprints=document.page_fingerprints,
+            invoices=await self.snapshot(db, document),
+            created_at=document.upload_date,
+        ))
+        document.version += 1
+        document.filename = filename
+        document.file_uri = file_uri
+        document.content_hash = content_hash
+        document.file_size = file_size
+        document.page_fingerprints = page_fingerprints
+        document.upload_date = datetime.now(timezone.utc)
+        document.status = "indexing"
+        return document
+
+    async def previous_fingerprints(self, db: AsyncSession, document: Document) -> Optional[List[str]]:
+        """
+        Page fingerprints of the version this one replaced (None for a first version).
+        """
+        if document.version <= 1:
+            return None
+        stmt = select(DocumentVersion.page_fingerprints).where(
+            DocumentVersion.document_id == document.id,
+            DocumentVersion.version == document.version - 1,
+        )
+        return (await db.execute(stmt)).scalar()
+
+    async def list_versions(self, db: AsyncSession, document: Document) -> List[dict]:
+        stmt = select(DocumentVersion).where(DocumentVersion.document_id == document.id).order_by(DocumentVersion.version)
+        versions = [
+            {
+                "version": v.version, "filename": v.filename, "content_hash": v.content_hash, "file_size": v.file_size,
+                "pages": len(v.page_fingerprints or []), "invoices": len(v.invoices or []),
+                "created_at": v.created_at, "superseded_at": v.superseded_at, "current": False,
+            }
+            for v in (await db.execute(stmt)).scalars().all()
+        ]
+        versions.append({
+            "version": document.version, "filename": document.filename, "content_hash": document.content_hash,
+            "file_size": document.file_size, "pages": len(document.page_fingerprints or []),
+            "invoices": None, "created_at": document.upload_date, "superseded_at": None, "current": True,
+        })
+        return versions
+
+    async def get_version(self, db: AsyncSession, document: Document, version: int) -> Optional[dict]:
+        """
+        A version with its invoices: the archived snapshot, or the live rows for the current version.
+        """
+        if version == document.version:
+            return {"version": version, "filename": document.filename, "current": True, "invoices": await self.snapshot(db, document)}
+        stmt = select(DocumentVersion).where(DocumentVersion.document_id == document.id, DocumentVersion.version == version)
+        archived = (await db.execute(stmt)).scalars().first()
+        if archived is None:
+            return None
+        return {
+            "version": archived.version, "filename": archived.filename, "current": False,
+            "created_at": archived.created_at, "superseded_at": archived.superseded_at, "invoices": archived.invoices or [],
+        }
+
+
+document_versions = DocumentVersionService()
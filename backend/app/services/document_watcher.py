@@ -0,0 +1,98 @@
+import asyncio
+import logging
+from typing import Optional
+
+from sqlalchemy import select
+
+from app.core.cache import cache
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal
+from app.core.events import event_bus
+from app.models.document import Document
+from app.services.gemini import gemini_service
+from app.services.remote_gc import remote_file_name
+from app.services.tenant_service import tenant_service
+
+logger = logging.getLogger(__name__)
+
+# Documents whose remote file Gemini may still be processing
+PENDING_STATUSES = ("indexing", "processing")
+
+
+def document_event(document: Document) -> dict:
+    return {"type": "document", "id": document.id, "title": document.filename, "status": document.status, "version": document.version}
+
+
+class DocumentStateWatcher:
+    """
+    Moves documents from indexing to active / failed by checking their Gemini file state in
+    the background (concurrently, only while some are pending) and pushes each change to the
+    tenant's event stream. Browsers no longer drive the upstream checks by polling.
+    """
+
+    def __init__(self):
+        self._wakeup = asyncio.Event()
+
+    def wake(self):
+        self._wakeup.set()
+
+    async def run_forever(self):
+        while True:
+            try:
+                # One watcher per pass across workers
+                async with cache.lock("document_watcher", timeout=settings.DOCUMENT_WATCH_INTERVAL_SECONDS * 10, blocking=False) as acquired:
+                    if acquired:
+                        await self.check_pending()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Document watcher pass failed: {e}")
+
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=settings.DOCUMENT_WATCH_INTERVAL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+    async def check_pending(self) -> int:
+        """
+        Checks one batch of pending documents. Returns how many changed status.
+        """
+        async with AsyncSessionLocal() as db:
+            stmt = select(Document).where(
+                Document.status.in_(PENDING_STATUSES),
+                Document.deleted_at.is_(None),
+                Document.file_uri.isnot(None),
+            ).order_by(Document.id).limit(settings.DOCUMENT_WATCH_BATCH_SIZE)
+            docs = (await db.execute(stmt)).scalars().all()
+            if not docs:
+                return 0
+
+            api_keys = await tenant_service.get_api_keys(db)
+            semaphore = asyncio.Semaphore(settings.DOCUMENT_WATCH_CONCURRENCY)
+
+            async def _state(document: Document) -> Optional[str]:
+                async with semaphore:
+                    try:
+                        return await gemini_service.get_file_state(remote_file_name(document.file_uri), api_key=api_keys.get(document.tenant_id))
+                    except Exception as e:
+                        logger.warning(f"Document watcher: state check failed for document {document.id}: {e}")
+                        return None
+
+            states = await asyncio.gather(*[_state(d) for d in docs])
+            changed = []
+            for document, state in zip(docs, states):
+                status = {"ACTIVE": "active", "FAILED": "failed"}.get(state)
+                if status:
+                    document.status = status
+                    changed.append(document)
+            if not changed:
+                return 0
+            await db.commit()
+
+        for document in changed:
+            await event_bus.publish(document.tenant_id, document_event(document))
+        logger.info(f"Document watcher: {len(changed)} of {len(docs)} pending documents changed status")
+        return len(changed)
+
+document_watcher = DocumentStateWatcher()
@@ -0,0 +1,110 @@
+import asyncio
+import logging
+from typing import Awaitable, Callable, Dict, List, Optional, Sequence, Tuple
+
+from app.models.document import Document
+from app.schemas.finance import InvoiceExtract
+
+logger = logging.getLogger(__name__)
+
+# (documents, api_key) -> {document_id: extract} for the members that came back valid
+BatchExtract = Callable[[Sequence[Document], Optional[str]], Awaitable[Dict[int, InvoiceExtract]]]
+# (document, api_key) -> extract, raises on failure
+SingleExtract = Callable[[Document, Optional[str]], Awaitable[InvoiceExtract]]
+
+
+class _Batch:
+    def __init__(self):
+        self.members: List[Tuple[Document, asyncio.Future]] = []
+        self.flushed = False
+
+
+class ExtractionBatcher:
+    """
+    Collects small single-invoice documents for a short window and extracts them with one
+    multi-file model call, so the long instruction prompt and per-call overhead are paid once
+    per batch instead of once per receipt.
+
+    Batches are per (tenant, API key): files live under the uploading key. A batch is sent when
+    it is full or when its window elapses. Members whose result is missing or fails validation
+    are retried as a smaller batch; when no member of a batch comes back (bad JSON, call error)
+    it is split in halves. A batch of one uses the single-document extraction.
+    Batching is per process; documents extracted on different workers are not combined.
+    """
+
+    def __init__(self, extract_batch: BatchExtract, extract_one: SingleExtract, window: float, max_documents: int):
+        self._extract_batch = extract_batch
+        self._extract_one = extract_one
+        self.window = window
+        self.max_documents = max_documents
+        self._pending: Dict[Tuple[int, Optional[str]], _Batch] = {}
+        self._tasks = set() # Strong references to running flushes
+
+    async def extract(self, document: Document, api_key: Optional[str] = None) -> InvoiceExtract:
+        key = (document.tenant_id, api_key)
+        batch = self._pending.get(key)
+        if batch is None:
+            batch = self._pending[key] = _Batch()
+            self._spawn(self._flush_later(key, batch, api_key))
+
+        future = asyncio.get_running_loop().create_future()
+        batch.members.append((document, future))
+        if len(batch.members) >= self.max_documents:
+            self._spawn(self._flush(key, batch, api_key))
+        return await future
+
+    def _spawn(self, coro):
+        task = asyncio.create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _flush_later(self, key, batch: _Batch, api_key: Optional[str]):
+        await asyncio.sleep(self.window)
+        await self._flush(key, batch, api_key)
+
+    async def _flush(self, key, batch: _Batch, api_key: Optional[str]):
+        if batch.flushed:
+            return
+        batch.flushed = True
+        if self._pending.get(key) is batch:
+            del self._pending[key]
+        members = [(document, future) for document, future in batch.members if not future.done()] # Skip cancelled callers
+        if members:
+            await self._resolve(members, api_key)
+
+    async def _resolve(self, members: List[Tuple[Document, asyncio.Future]], api_key: Optional[str]):
+        if len(members) == 1:
+            document, future = members[0]
+            try:
+                result = await self._extract_one(document, api_key)
+            except Exception as e:
+                if not future.done():
+                    future.set_exception(e)
+                return
+            if not future.done():
+                future.set_result(result)
+            return
+
+        try:
+            results = await self._extract_batch([document for document, _ in members], api_key)
+        except Exception as e:
+            logger.warning(f"Batched extraction of {len(members)} documents failed: {e}")
+            results = {}
+
+        failed = []
+        for document, future in members:
+            extract = results.get(document.id)
+            if extract is None:
+                failed.append((document, future))
+            elif not future.done():
+                future.set_result(extract)
+        if not failed:
+            logger.info(f"Batched extraction: {len(members)} documents in one call")
+            return
+
+        logger.info(f"Batched extraction: {len(failed)}/{len(members)} documents failed, splitting")
+        if len(failed) < len(members):
+            await self._resolve(failed, api_key)
+        else:
+            middle = len(failed) // 2
+            await asyncio.gather(self._resolve(failed[:middle], api_key), self._resolve(failed[middle:], api_key))
@@ -0,0 +1,62 @@
+import logging
+from typing import List, Optional
+
+from sqlalchemy import select, delete
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.finance import FinanceExtractionCache
+from app.schemas.finance import ExtractedSegment
+
+logger = logging.getLogger(__name__)
+
+
+class ExtractionCache:
+    """
+    Extraction results keyed by (tenant, content hash, extraction version).
+    Only complete results are stored (every segment extracted), so a partly failed
+    extraction is retried against the model next time instead of being frozen.
+    """
+
+    async def get(self, db: AsyncSession, tenant_id: int, content_hash: Optional[str], version: str) -> Optional[List[ExtractedSegment]]:
+        if not content_hash:
+            return None
+        stmt = select(FinanceExtractionCache.results).where(
+            FinanceExtractionCache.tenant_id == tenant_id,
+            FinanceExtractionCache.content_hash == content_hash,
+            FinanceExtractionCache.extraction_version == version,
+        )
+        results = (await db.execute(stmt)).scalar()
+        if results is None:
+            return None
+        try:
+            return [ExtractedSegment.model_validate(r) for r in results]
+        except Exception as e:
+            # Written by a schema this code no longer reads: treat as a miss, put() replaces it
+            logger.warning(f"Extraction cache entry for {content_hash} is unreadable: {e}")
+            return None
+
+    async def put(self, db: AsyncSession, tenant_id: int, content_hash: Optional[str], version: str, results: List[ExtractedSegment]):
+        """
+        Adds the entry to the caller's transaction (written with its commit) and drops
+        entries of other versions for the same content.
+        """
+        if not content_hash or not results or not all(r.extract and not r.error for r in results):
+            return
+        await db.execute(delete(FinanceExtractionCache).where(
+            FinanceExtractionCache.tenant_id == tenant_id,
+            FinanceExtractionCache.content_hash == content_hash,
+        ))
+        try:
+            # Savepoint: a concurrent extraction of the same bytes may have stored it first
+            async with db.begin_nested():
+                db.add(FinanceExtractionCache(
+                    tenant_id=tenant_id,
+                    content_hash=content_hash,
+                    extraction_version=version,
+                    results=[r.model_dump(mode="json") for r in results],
+                ))
+        except IntegrityError:
+            logger.info(f"Extraction cache entry for {content_hash} already stored")
+
+extraction_cache = ExtractionCache()
@@ -0,0 +1,354 @@
+import os
+import time
+import uuid
+import shutil
+import asyncio
+import logging
+from typing import Dict, Iterable, List, Optional
+
+from sqlalchemy import select
+
+from app.core.cache import cache
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal
+from app.models.document import Document
+from app.models.finance import FinanceInvoice, FinanceInvoiceItem, FinanceVendor
+
+logger = logging.getLogger(__name__)
+
+NO_MONTH = "0000-00" # Undated invoices and tombstones
+BACKFILL_MARKER = "_backfilled"
+STALE_SUFFIX = ".stale" # Sibling file of a tenant directory that missed a delta
+
+# (column, arrow type name); one row per line item, line_no 0 also carries the invoice total once
+COLUMNS = [
+    ("invoice_id", "int64"),
+    ("version", "int64"), # Export time (ns): the newest version of an invoice wins
+    ("deleted", "bool_"), # Tombstone: the invoice left the dataset
+    ("line_no", "int32"),
+    ("invoice_date", "date32"),
+    ("vendor_id", "int64"),
+    ("vendor_name", "string"),
+    ("currency", "string"),
+    ("invoice_total", "float64"),
+    ("item_id", "int64"),
+    ("description", "string"),
+    ("category", "string"),
+    ("quantity", "float64"),
+    ("unit_price", "float64"),
+    ("total_price", "float64"),
+]
+
+SPEND_GROUPS = {
+    "year": "strftime(invoice_date, '%Y')",
+    "month": "strftime(invoice_date, '%Y-%m')",
+    "vendor": "vendor_name",
+    "category": "category",
+}
+
+# Rows of `files` that are the live (newest, not deleted) version of their invoice, where
+# newest is decided over ALL of the tenant's files, so a stale copy in a pruned month never counts
+LIVE_ROWS = """
+    SELECT r.* FROM read_parquet($files, hive_partitioning = false) r
+    JOIN (SELECT invoice_id, max(version) AS version FROM read_parquet($all_files, hive_partitioning = false) GROUP BY invoice_id) latest
+      ON latest.invoice_id = r.invoice_id AND latest.version = r.version
+    WHERE NOT r.deleted
+"""
+
+
+def _schema():
+    import pyarrow as pa
+
+    return pa.schema([(name, getattr(pa, kind)()) for name, kind in COLUMNS])
+
+
+def _new_columns() -> Dict[str, list]:
+    return {name: [] for name, _ in COLUMNS}
+
+
+class FinanceAnalytics:
+    """
+    Columnar sidecar of completed invoices for analytics (spend by period / vendor / category).
+    - Layout: <root>/tenant=<id>/month=<YYYY-MM>/<file>.parquet, invoice and items denormalized.
+    - Writes are append-only: the extraction path exports the invoices it touched as new
+      versioned rows (tombstones for invoices that are gone); readers keep the newest version.
+    - The compactor rewrites a tenant's files into one live file per month in the background.
+    - Queries run on DuckDB over the files, off the OLTP database.
+    A tenant's first query backfills its history from the database.
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+
+    # --- Layout ---
+
+    def _tenant_dir(self, tenant_id: int) -> str:
+        return os.path.join(self.root, f"tenant={tenant_id}")
+
+    def _needs_rebuild(self, tenant_dir: str) -> bool:
+        # Never backfilled, or a delta could not be written (<tenant_dir>.stale)
+        return not os.path.exists(os.path.join(tenant_dir, BACKFILL_MARKER)) or os.path.exists(tenant_dir + STALE_SUFFIX)
+
+    def _files(self, tenant_dir: str, years: Optional[range] = None) -> List[str]:
+        files = []
+        if not os.path.isdir(tenant_dir):
+            return files
+        for month_dir in sorted(os.listdir(tenant_dir)):
+            if not month_dir.startswith("month="):
+                continue
+            month = month_dir.split("=", 1)[1]
+            if years is not None and (month == NO_MONTH or int(month[:4]) not in years):
+                continue
+            folder = os.path.join(tenant_dir, month_dir)
+            files.extend(os.path.join(folder, name) for name in sorted(os.listdir(folder)) if name.endswith(".parquet"))
+        return files
+
+    def _write(self, tenant_dir: str, months: Dict[str, Dict[str, list]], prefix: str = "delta"):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        schema = _schema()
+        for month, columns in months.items():
+            if not columns["invoice_id"]:
+                continue
+            folder = os.path.join(tenant_dir, f"month={month}")
+            os.makedirs(folder, exist_ok=True)
+            name = f"{prefix}-{time.time_ns()}-{uuid.uuid4().hex[:8]}"
+            tmp_path = os.path.join(folder, f".{name}.tmp")
+            pq.write_table(pa.Table.from_pydict(columns, schema=schema), tmp_path)
+            os.replace(tmp_path, os.path.join(folder, f"{name}.parquet")) # Readers never see partial files
+
+    # --- Export from the database ---
+
+    def _rows_query(self, tenant_id: int, invoice_ids: Optional[Iterable[int]] = None):
+        stmt = (
+            select(
+                FinanceInvoice.id, FinanceInvoice.invoice_date, FinanceInvoice.vendor_id, FinanceVendor.name.label("vendor_name"),
+                FinanceInvoice.currency, FinanceInvoice.total_amount, FinanceInvoiceItem.id.label("item_id"),
+                FinanceInvoiceItem.description, FinanceInvoiceItem.category, FinanceInvoiceItem.quantity,
+                FinanceInvoiceItem.unit_price, FinanceInvoiceItem.total_price,
+            )
+            .join(Document, Document.id == FinanceInvoice.document_id)
+            .outerjoin(FinanceVendor, FinanceVendor.id == FinanceInvoice.vendor_id)
+            .outerjoin(FinanceInvoiceItem, (FinanceInvoiceItem.invoice_id == FinanceInvoice.id) & (FinanceInvoiceItem.tenant_id == tenant_id))
+            .where(
+                FinanceInvoice.tenant_id == tenant_id,
+                FinanceInvoice.extraction_status == "completed",
+                Document.deleted_at.is_(None),
+            )
+            .order_by(FinanceInvoice.id, FinanceInvoiceItem.id)
+        )
+        if invoice_ids is not None:
+            stmt = stmt.where(FinanceInvoice.id.in_(list(invoice_ids)))
+        return stmt
+
+    def _add_rows(self, months: Dict[str, Dict[str, list]], rows, version: int, state: dict):
+        """
+        Appends DB rows (sorted by invoice) to per-month columns. `state` carries the line
+        counter across batches of one streamed result.
+        """
+        for row in rows:
+            if row.id != state.get("invoice_id"):
+                state["invoice_id"], state["line_no"] = row.id, 0
+            else:
+                state["line_no"] += 1
+            month = row.invoice_date.strftime("%Y-%m") if row.invoice_date else NO_MONTH
+            columns = months.setdefault(month, _new_columns())
+            for name, value in (
+                ("invoice_id", row.id), ("version", version), ("deleted", False), ("line_no", state["line_no"]),
+                ("invoice_date", row.invoice_date.date() if row.invoice_date else None), ("vendor_id", row.vendor_id),
+                ("vendor_name", row.vendor_name), ("currency", row.currency), ("invoice_total", row.total_amount),
+                ("item_id", row.item_id), ("description", row.description), ("category", row.category),
+                ("quantity", row.quantity), ("unit_price", row.unit_price), ("total_price", row.total_price),
+            ):
+                columns[name].append(value)
+
+    async def export_invoices(self, tenant_id: int, invoice_ids: Iterable[int]):
+        """
+        Appends the current state of these invoices (called after the writer's commit).
+        Invoices no longer live (deleted, overwritten, failed) get a tombstone.
+        """
+        invoice_ids = set(invoice_ids)
+        if not settings.ANALYTICS_ENABLED or not invoice_ids:
+            return
+        version = time.time_ns()
+        async with AsyncSessionLocal() as db:
+            rows = (await db.execute(self._rows_query(tenant_id, invoice_ids))).all()
+
+        months: Dict[str, Dict[str, list]] = {}
+        self._add_rows(months, rows, version, {})
+        tombstones = months.setdefault(NO_MONTH, _new_columns())
+        for invoice_id in invoice_ids - {row.id for row in rows}:
+            for name, _ in COLUMNS:
+                tombstones[name].append({"invoice_id": invoice_id, "version": version, "deleted": True, "line_no": 0}.get(name))
+
+        tenant_dir = self._tenant_dir(tenant_id)
+        async with cache.lock(f"analytics:{tenant_id}", timeout=600, wait=60) as acquired:
+            if not acquired:
+                # A rebuild may be swapping the directory: a delta written now could be lost with
+                # the old one. Mark the tenant instead; its next query rebuilds from the database.
+                os.makedirs(self.root, exist_ok=True)
+                open(tenant_dir + STALE_SUFFIX, "w").close()
+                logger.warning(f"Analytics export for tenant {tenant_id} skipped (tenant busy), marked for rebuild")
+                return
+            await asyncio.to_thread(self._write, tenant_dir, months)
+
+    async def rebuild(self, tenant_id: int, only_if_missing: bool = False):
+        """
+        Backfills the tenant's dataset from the database (streamed), replacing what is on disk.
+        With `only_if_missing`, a tenant that was backfilled meanwhile (and not marked stale) is left alone.
+        """
+        tenant_dir = self._tenant_dir(tenant_id)
+        tmp_dir = f"{tenant_dir}.rebuild-{uuid.uuid4().hex[:8]}"
+        version = time.time_ns()
+        started = time.perf_counter()
+        rows_written = 0
+
+        async with cache.lock(f"analytics:{tenant_id}", timeout=3600, wait=600) as acquired:
+            if not acquired:
+                raise RuntimeError(f"Analytics rebuild for tenant {tenant_id} is already running")
+            if only_if_missing and not self._needs_rebuild(tenant_dir):
+                return
+            # Cleared before reading: a delta skipped from here on marks the tenant again
+            if os.path.exists(tenant_dir + STALE_SUFFIX):
+                os.remove(tenant_dir + STALE_SUFFIX)
+            try:
+                stmt = self._rows_query(tenant_id).execution_options(yield_per=settings.ANALYTICS_BATCH_ROWS)
+                state = {}
+                async with AsyncSessionLocal() as db:
+                    result = await db.stream(stmt)
+                    async for partition in result.partitions():
+                        months: Dict[str, Dict[str, list]] = {}
+                        self._add_rows(months, partition, version, state)
+                        await asyncio.to_thread(self._write, tmp_dir, months, "part")
+                        rows_written += len(partition)
+
+                os.makedirs(tmp_dir, exist_ok=True)
+                await asyncio.to_thread(self._compact_dir, tmp_dir)
+                open(os.path.join(tmp_dir, BACKFILL_MARKER), "w").close()
+
+                old_dir = f"{tenant_dir}.old-{uuid.uuid4().hex[:8]}"
+                if os.path.isdir(tenant_dir):
+                    os.rename(tenant_dir, old_dir)
+                os.rename(tmp_dir, tenant_dir)
+                shutil.rmtree(old_dir, ignore_errors=True)
+            finally:
+                shutil.rmtree(tmp_dir, ignore_errors=True)
+        logger.info(f"Analytics: rebuilt tenant {tenant_id} ({rows_written} rows) in {time.perf_counter() - started:.1f}s")
+
+    # --- Compaction ---
+
+    def _connect(self):
+        import duckdb
+
+        con = duckdb.connect()
+        con.execute(f"SET threads = {settings.ANALYTICS_DUCKDB_THREADS}")
+        return con
+
+    def _compact_dir(self, tenant_dir: str) -> int:
+        """
+        Rewrites the live rows into one file per month and removes the inputs (superseded
+        versions and tombstones disappear). Files written meanwhile are not touched.
+        Returns the number of files removed.
+        """
+        files = self._files(tenant_dir)
+        if len(files) < 2:
+            return 0
+        con = self._connect()
+        try:
+            table = con.execute(
+                f"SELECT *, coalesce(strftime(invoice_date, '%Y-%m'), '{NO_MONTH}') AS month FROM ({LIVE_ROWS}) ORDER BY invoice_id, line_no",
+                {"files": files, "all_files": files},
+            ).fetch_arrow_table()
+        finally:
+            con.close()
+
+        import pyarrow.compute as pc
+
+        months = {}
+        for month in pc.unique(table["month"]).to_pylist():
+            months[month] = table.filter(pc.equal(table["month"], month)).drop_columns(["month"]).to_pydict()
+        self._write(tenant_dir, months, "part")
+        for path in files:
+            os.remove(path)
+        for name in os.listdir(tenant_dir):
+            folder = os.path.join(tenant_dir, name)
+            if name.startswith("month=") and not os.listdir(folder):
+                os.rmdir(folder)
+        return len(files)
+
+    async def compact(self) -> int:
+        """
+        Compacts every tenant with at least ANALYTICS_COMPACT_MIN_FILES files. Returns files removed.
+        """
+        if not os.path.isdir(self.root):
+            return 0
+        removed = 0
+        for name in sorted(os.listdir(self.root)):
+            tenant_dir = os.path.join(self.root, name)
+            if not name.startswith("tenant=") or "." in name or not os.path.isdir(tenant_dir):
+                continue
+            if len(self._files(tenant_dir)) < settings.ANALYTICS_COMPACT_MIN_FILES:
+                continue
+            tenant_id = int(name.split("=", 1)[1])
+            async with cache.lock(f"analytics:{tenant_id}", timeout=600, blocking=False) as acquired:
+                if acquired:
+                    removed += await asyncio.to_thread(self._compact_dir, tenant_dir)
+        if removed:
+            logger.info(f"Analytics compaction: merged {removed} files")
+        return removed
+
+    async def run_forever(self):
+        while True:
+            try:
+                async with cache.lock("analytics_compactor", timeout=settings.ANALYTICS_COMPACT_INTERVAL_SECONDS * 5, blocking=False) as acquired:
+                    if acquired:
+                        await self.compact()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Analytics compaction pass failed: {e}")
+            await asyncio.sleep(settings.ANALYTICS_COMPACT_INTERVAL_SECONDS)
+
+    # --- Queries ---
+
+    def _spend(self, tenant_dir: str, group_by: str, by_year: bool, years: Optional[range]) -> List[dict]:
+        files = self._files(tenant_dir, years)
+        if not files:
+            return []
+        keys = [f"{SPEND_GROUPS[group_by]} AS key", "currency"]
+        if by_year:
+            keys.insert(1, "year(invoice_date) AS year")
+        # A category splits an invoice, so category spend sums lines; the rest sum invoice totals once
+        spend = "sum(total_price)" if group_by == "category" else "sum(CASE WHEN line_no = 0 THEN invoice_total END)"
+        group_columns = ", ".join(str(i + 1) for i in range(len(keys)))
+        sql = f"""
+            SELECT {', '.join(keys)}, count(DISTINCT invoice_id) AS invoices, {spend} AS spend
+            FROM ({LIVE_ROWS})
+            GROUP BY {group_columns} ORDER BY {group_columns}
+        """
+        con = self._connect()
+        try:
+            cursor = con.execute(sql, {"files": files, "all_files": self._files(tenant_dir)})
+            names = [d[0] for d in cursor.description]
+            return [dict(zip(names, row)) for row in cursor.fetchall()]
+        finally:
+            con.close()
+
+    async def spend(self, tenant_id: int, group_by: str = "month", by_year: bool = False, year_from: Optional[int] = None, year_to: Optional[int] = None) -> dict:
+        """
+        Spend per `group_by` (year / month / vendor / category), optionally split by year for
+        year-over-year comparison. year_from / year_to are inclusive and prune month files.
+        """
+        tenant_dir = self._tenant_dir(tenant_id)
+        if self._needs_rebuild(tenant_dir):
+            await self.rebuild(tenant_id, only_if_missing=True)
+
+        years = None
+        if year_from is not None or year_to is not None:
+            years = range(year_from or 1, (year_to or 9998) + 1)
+        started = time.perf_counter()
+        rows = await asyncio.to_thread(self._spend, tenant_dir, group_by, by_year, years)
+        return {"group_by": group_by, "rows": rows, "took_ms": round((time.perf_counter() - started) * 1000, 1)}
+
+finance_analytics = FinanceAnalytics(settings.ANALYTICS_DIR)
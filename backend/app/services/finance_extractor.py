@@ -1,180 +1,670 @@
 import json
+import shutil
+import hashlib
+import asyncio
 import logging
+import tempfile
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, delete
 from sqlalchemy.orm import selectinload
 
+from app.core.cache import cache
+from app.core.events import event_bus
+from app.core.config import settings
 from app.core.database import AsyncSessionLocal
 from app.models.document import Document
-from app.models.finance import FinanceInvoice, FinanceInvoiceItem, FinanceVendor
+from app.models.finance import FinanceInvoice, FinanceInvoiceItem, FinanceVendor, FinanceAuditFlag
 from app.services.gemini import gemini_service
-from app.schemas.finance import InvoiceExtract
+from app.services.blob_store import blob_store
+from app.services.tenant_service import tenant_service
+from app.services.invoice_parser import invoice_parser
+from app.services.item_categorizer import item_categorizer
+from app.services.audit_engine import audit_engine
+from app.services.vendor_risk import vendor_risk
+from app.services.search_index import search_index
+from app.services.response_snapshots import bump_invoices
+from app.services.extraction_cache import extraction_cache
+from app.services.extraction_batcher import ExtractionBatcher
+from app.services.finance_analytics import finance_analytics
+from app.services.document_splitter import document_splitter, PageRange
+from app.services.document_versions import document_versions
+from app.services.outbox import outbox, outbox_dispatcher, invoice_event
+from app.schemas.finance import InvoiceExtract, InvoiceItemExtract, ExtractedSegment
 
 logger = logging.getLogger(__name__)
 
+EXTRACTION_PROMPT = """
+أنت محاسب خبير ومدخل بيانات دقيق.
+المهمة: استخرج البيانات من صورة/ملف الفاتورة المرفق بدقة 100%.
+
+ركز بشكل خاص على "جدول البنود" (Line Items Table). يجب استخراج **جميع الصفوف** الموجودة في الجدول.
+انتبه: الجدول قد يكون باللغة العربية (من اليمين لليسار). الأعمدة عادة تشمل: الصنف/البيان، الكمية، السعر الافرادي، الإجمالي.
+
+المطلوب منك إخراج البيانات بصيغة JSON فقط تتبع هذا الهيكل:
+{
+    "vendor_name": "string",
+    "vendor_tax_id": "string",
+    "invoice_number": "string",
+    "invoice_date": "YYYY-MM-DD",
+    "total_amount": float,
+    "currency": "SAR",
+    "items": [
+        {
+            "description": "string",
+            "quantity": float,
+            "unit_price": float,
+            "total_price": float
+        }
+    ]
+}
+
+ملاحظات هامة:
+- إذا كان التاريخ هجرياً حوله لميلادي.
+- تأكد من دقة الأرقام في البنود.
+- لا تترك قائمة "items" فارغة إذا كان هناك جدول في الصورة.
+"""
+
+# Marker the model uses for pages that continue an invoice started in a previous segment
+CONTINUATION_MARKER = "CONTINUATION"
+
+SEGMENT_EXTRACTION_NOTE = """
+هذا الملف جزء (الصفحات {start} إلى {end}) من مستند قد يحتوي على عدة فواتير.
+- أخرج مصفوفة JSON من الفواتير بالهيكل أعلاه، عنصر لكل فاتورة، بترتيب ظهورها.
+- إذا كانت الصفحات الأولى تكملة لفاتورة بدأت قبل هذا الجزء (بدون ترويسة)، ضع "invoice_number": "CONTINUATION" لهذا العنصر.
+"""
+
+BATCH_EXTRACTION_NOTE = """
+الملفات المرفقة ({count}) هي مستندات منفصلة، كل ملف فاتورة واحدة، بهذا الترتيب:
+{documents}
+- أخرج مصفوفة JSON بعنصر واحد لكل ملف بنفس الترتيب، بالهيكل أعلاه مع حقل إضافي "document_id" (رقم المستند المذكور أعلاه).
+- لا تخلط بنود أو بيانات ملف مع ملف آخر.
+"""
+
+EXTRACTION_SYSTEM_INSTRUCTION = "You are a JSON-only extraction engine. Output ONLY raw JSON."
+
+# Bump when the extraction logic (segment merging, local parser) changes its output. Prompt,
+# schema and segmentation changes are picked up by the digest. Cached results of any other
+# version are ignored (see ExtractionCache).
+EXTRACTION_PROMPT_VERSION = 1
+EXTRACTION_VERSION = f"v{EXTRACTION_PROMPT_VERSION}-" + hashlib.sha256(json.dumps([
+    EXTRACTION_PROMPT,
+    SEGMENT_EXTRACTION_NOTE,
+    BATCH_EXTRACTION_NOTE,
+    EXTRACTION_SYSTEM_INSTRUCTION,
+    InvoiceExtract.model_json_schema(),
+    settings.EXTRACTION_SEGMENT_MAX_PAGES,
+], ensure_ascii=False, sort_keys=True).encode("utf-8")).hexdigest()[:12]
+
+
+def parse_invoice_date(value: Optional[str]) -> Optional[datetime]:
+    if not value:
+        return None
+    try:
+        return datetime.strptime(value, "%Y-%m-%d")
+    except ValueError:
+        return None
+
+
 class FinanceExtractorService:
-    async def process_document(self, document_id: int):
+    def __init__(self):
+        self.batcher = ExtractionBatcher(
+            self._extract_batch_with_model,
+            self._extract_with_model,
+            window=settings.EXTRACTION_BATCH_WINDOW_SECONDS,
+            max_documents=settings.EXTRACTION_BATCH_MAX_DOCUMENTS,
+        )
+
+    async def process_document(self, document_id: int, use_cache: bool = True):
         """
         Orchestrates the extraction process:
         1. Get Document URI.
-        2. Call AI for JSON extraction (Arabic Context).
-        3. Parse & Save to DB.
+        2. Reuse the cached result of identical content (same extraction version), if any. Otherwise:
+        3. Split batches / long documents into page ranges. For a new document version, invoices
+           whose pages are all unchanged are kept as they are and only the other ranges are extracted.
+        4. Try the local text-layer parser (digital PDFs, known vendors).
+        5. Fall back to AI JSON extraction (Arabic Context) when confidence is low.
+        6. Parse & Save to DB (one FinanceInvoice per invoice found).
         """
+        # Double clicks / retries can land on different workers; only one extracts a document at a time
+        async with cache.lock(f"finance:extract:{document_id}", timeout=900, blocking=False) as acquired:
+            if not acquired:
+                logger.info(f"Extraction of document {document_id} already running, skipping")
+                return None
+            return await self._process_document(document_id, use_cache)
+
+    async def _process_document(self, document_id: int, use_cache: bool = True):
+        document = None
         async with AsyncSessionLocal() as db:
             try:
                 # 1. Fetch Document
-                stmt = select(Document).where(Document.id == document_id)
+                stmt = select(Document).where(Document.id == document_id, Document.deleted_at.is_(None))
                 result = await db.execute(stmt)
                 document = result.scalars().first()
-                
+
                 if not document or not document.file_uri:
                     raise ValueError("Document not found or not indexed in Gemini.")
+                await event_bus.publish(document.tenant_id, {"type": "extraction", "document_id": document.id, "status": "processing"})
 
-                # 2. Call AI (Arabic Prompt)
-                prompt = """
-                أنت محاسب خبير ومدخل بيانات دقيق. 
-                المهمة: استخرج البيانات من صورة/ملف الفاتورة المرفق بدقة 100%.
-                
-                ركز بشكل خاص على "جدول البنود" (Line Items Table). يجب استخراج **جميع الصفوف** الموجودة في الجدول.
-                انتبه: الجدول قد يكون باللغة العربية (من اليمين لليسار). الأعمدة عادة تشمل: الصنف/البيان، الكمية، السعر الافرادي، الإجمالي.
-                
-                المطلوب منك إخراج البيانات بصيغة JSON فقط تتبع هذا الهيكل:
-                {
-                    "vendor_name": "string",
-                    "vendor_tax_id": "string",
-                    "invoice_number": "string",
-                    "invoice_date": "YYYY-MM-DD",
-                    "total_amount": float,
-                    "currency": "SAR",
-                    "items": [
-                        {
-                            "description": "string",
-                            "quantity": float,
-                            "unit_price": float,
-                            "total_price": float,
-                            "category": "string (مهم: حاول تصنيف البند، مثال: 'صيانة', 'أثاث', 'تسويق', 'زهور')"
-                        }
-                    ]
-                }
-                
-                ملاحظات هامة:
-                - إذا كان التاريخ هجرياً حوله لميلادي.
-                - تأكد من دقة الأرقام في البنود.
-                - لا تترك قائمة "items" فارغة إذا كان هناك جدول في الصورة.
-                """
-                
-                response_text = await gemini_service.generate_answer(
-                    query=prompt,
-                    file_uris=[document.file_uri],
-                    role="accountant",
-                    company="Unknown",
-                    system_instruction="You are a JSON-only extraction engine. Output ONLY raw JSON."
-                )
-                
-                # 3. Clean & Parse JSON
-                cleaned_text = response_text.replace("```json", "").replace("```", "").strip()
-                # Handle potential leading/trailing garbage (e.g. "Here is the JSON: { ... }")
-                if "{" in cleaned_text:
-                    cleaned_text = cleaned_text[cleaned_text.find("{"):cleaned_text.rfind("}")+1]
-                
-                try:
-                    data_dict = json.loads(cleaned_text)
-                    logger.info(f"AI Extraction Success. Items count: {len(data_dict.get('items', []))}")
-                    print(f"DEBUG: Extracted {len(data_dict.get('items', []))} items: {data_dict.get('items')}")
-                except json.JSONDecodeError:
-                    logger.error(f"JSON Parsing Failed. Raw: {response_text}")
-                    # Fallback failure - requires prompt tuning if frequent
-                    raise ValueError("AI response was not valid JSON")
-
-                # Use Pydantic for validation
-                extracted_data = InvoiceExtract(**data_dict)
-
-                # 4. Save to DB (Relational)
-                
-                # A. Vendor (Upsert)
-                stmt = select(FinanceVendor).where(FinanceVendor.name == extracted_data.vendor_name, FinanceVendor.tenant_id == document.tenant_id)
-                result = await db.execute(stmt)
-                vendor = result.scalars().first()
-                
-                if not vendor:
-                    vendor = FinanceVendor(
-                        name=extracted_data.vendor_name,
-                        tax_id=extracted_data.vendor_tax_id,
-                        tenant_id=document.tenant_id
-                    )
-                    db.add(vendor)
-                    await db.flush()
-                    await db.refresh(vendor)
-                    
-
+                api_key = await tenant_service.get_api_key(db, document.tenant_id) # Files live under the uploading key
 
-                # B. Invoice Header
-                # We don't need selectinload if we are just updating header and deleting items manually
-                stmt = select(FinanceInvoice).where(FinanceInvoice.document_id == document_id)
-                result = await db.execute(stmt)
-                existing_invoice = result.scalars().first()
-                
-                invoice_id = None
-                
-                if existing_invoice:
-                     # Update existing
-                     existing_invoice.total_amount = extracted_data.total_amount
-                     existing_invoice.invoice_number = extracted_data.invoice_number
-                     existing_invoice.invoice_date = extracted_data.invoice_date
-                     existing_invoice.currency = extracted_data.currency
-                     existing_invoice.vendor_id = vendor.id
-                     existing_invoice.extraction_status = "completed"
-                     
-                     # Explicitly delete old items
-                     await db.execute(delete(FinanceInvoiceItem).where(FinanceInvoiceItem.invoice_id == existing_invoice.id))
-                     
-                     invoice_id = existing_invoice.id
-                     invoice = existing_invoice
+                # 2. Same bytes already extracted (re-upload, re-triggered extraction)
+                results, kept = None, []
+                if use_cache:
+                    results = await extraction_cache.get(db, document.tenant_id, document.content_hash, EXTRACTION_VERSION)
+                if results is not None:
+                    logger.info(f"Extraction cache hit for document {document.id} ({len(results)} invoices)")
+                    pages = [] # Vendor templates were learned when the entry was stored
                 else:
-                    from datetime import datetime
-                    # Parse Date if possible
-                    inv_date = None
-                    if extracted_data.invoice_date:
-                        try:
-                            inv_date = datetime.strptime(extracted_data.invoice_date, "%Y-%m-%d")
-                        except:
-                            pass
-
-                    invoice = FinanceInvoice(
-                        tenant_id=document.tenant_id,
-                        document_id=document.id,
-                        vendor_id=vendor.id,
-                        invoice_number=extracted_data.invoice_number,
-                        invoice_date=inv_date,
-                        total_amount=extracted_data.total_amount,
-                        currency=extracted_data.currency,
-                        extraction_status="completed"
-                    )
-                    db.add(invoice)
-                    await db.flush() # Identify ID
-                    invoice_id = invoice.id
-                
-                # C. Line Items
-                for item in extracted_data.items:
-                    # Explicit addition
-                    db_item = FinanceInvoiceItem(
-                        invoice_id=invoice_id,
-                        description=item.description,
-                        quantity=item.quantity,
-                        unit_price=item.unit_price,
-                        total_price=item.total_price,
-                        category=item.category
-                    )
-                    db.add(db_item)
-                    
+                    vendors = await self._load_vendor_templates(db, document.tenant_id)
+                    pages = await self._read_text_layer(document)
+
+                    # 3. Plan Page Ranges
+                    segments = await self._plan_segments(document, pages)
+                    kept = await self._unchanged_invoices(db, document, segments) if use_cache else []
+
+                    if kept:
+                        changed = [s for s in segments if s not in {page_range for _, page_range in kept}]
+                        logger.info(f"Document {document.id} v{document.version}: {len(kept)} invoices unchanged, extracting {len(changed)} segments")
+                        results = await self._extract_segments(document, pages, changed, vendors, api_key) if changed else []
+                    elif len(segments) > 1:
+                        results = await self._extract_segments(document, pages, segments, vendors, api_key)
+                    else:
+                        # Single invoice: whole document, already uploaded
+                        extracted_data = self._extract_locally(document, pages, vendors)
+                        from_model = extracted_data is None
+                        if from_model and self._batchable(document):
+                            extracted_data = await self.batcher.extract(document, api_key)
+                        elif from_model:
+                            extracted_data = await self._extract_with_model(document, api_key)
+                        page_range = segments[0] if segments else (None, None)
+                        results = [ExtractedSegment(
+                            page_start=page_range[0],
+                            page_end=page_range[1],
+                            extract=extracted_data,
+                            from_model=from_model
+                        )]
+
+                    if not kept and not any(r.extract for r in results):
+                        raise ValueError("No segment could be extracted.")
+                    # Stored before categorization fills in item categories (those follow the tenant's map).
+                    # Partial results (kept invoices) are not cached: the entry must describe the whole content.
+                    if not kept:
+                        await extraction_cache.put(db, document.tenant_id, document.content_hash, EXTRACTION_VERSION, results)
+
+                # 6. Save to DB (Relational)
+                stmt = select(FinanceInvoice.id).where(FinanceInvoice.document_id == document.id)
+                previous_ids = (await db.execute(stmt)).scalars().all()
+                invoices = await self._save_extracts(db, document, results, pages, api_key, kept=kept)
+
+                # Change events, committed with the rows they describe
+                await db.flush()
+                current_ids = {i.id for i in invoices}
+                await outbox.record_many(db, document.tenant_id, [
+                    *(invoice_event("invoice.upserted", i) for i in invoices),
+                    *(("invoice.deleted", i, {"document_id": document.id}) for i in previous_ids if i not in current_ids),
+                    ("document.extracted", document.id, {"version": document.version, "invoices": sorted(current_ids)}),
+                ])
+
                 await db.commit()
-                return invoice
-                
             except Exception as e:
                 logger.error(f"Extraction Failed: {e}")
                 import traceback
                 traceback.print_exc()
                 await db.rollback()
+                if document:
+                    await event_bus.publish(document.tenant_id, {"type": "extraction", "document_id": document.id, "status": "failed"})
                 return None
 
+        outbox_dispatcher.wake()
+        # Cached grid / detail responses of this document's invoices are now stale
+        await bump_invoices(document.tenant_id, [*previous_ids, *(i.id for i in invoices)])
+        try:
+            await finance_analytics.export_invoices(document.tenant_id, [*previous_ids, *(i.id for i in invoices)])
+        except Exception as e:
+            logger.error(f"Analytics export failed for document {document_id}: {e}")
+
+        # 7. Incremental audit of the new invoices (against their vendors' history)
+        completed_ids = [i.id for i in invoices if i.extraction_status == "completed"]
+        if completed_ids:
+            try:
+                await audit_engine.run(document.tenant_id, completed_ids)
+            except Exception as e:
+                logger.error(f"Audit after extraction failed for document {document_id}: {e}")
+
+        # Progress events (after the audit, so a refreshed grid already shows audit results)
+        for invoice in invoices:
+            await event_bus.publish(document.tenant_id, {
+                "type": "invoice", "id": invoice.id, "document_id": document.id, "extraction_status": invoice.extraction_status,
+            })
+        await event_bus.publish(document.tenant_id, {
+            "type": "extraction", "document_id": document.id, "status": "completed", "invoices": len(invoices),
+        })
+        return invoices
+
+    async def _load_vendor_templates(self, db: AsyncSession, tenant_id: int) -> List[FinanceVendor]:
+        stmt = select(FinanceVendor).where(
+            FinanceVendor.tenant_id == tenant_id,
+            FinanceVendor.extraction_template.isnot(None),
+        )
+        result = await db.execute(stmt)
+        return result.scalars().all()
+
+    async def _unchanged_invoices(self, db: AsyncSession, document: Document, segments: List[PageRange]) -> List[Tuple[FinanceInvoice, PageRange]]:
+        """
+        Invoices of the previous version whose page range reappears unchanged (same page
+        fingerprints, possibly moved) as one of the planned segments, with that new range.
+        """
+        if not segments:
+            return []
+        mapping = document_splitter.page_map(await document_versions.previous_fingerprints(db, document), document.page_fingerprints)
+        if not mapping:
+            return []
+        stmt = select(FinanceInvoice).where(FinanceInvoice.document_id == document.id, FinanceInvoice.extraction_status == "completed")
+        by_range = {(i.page_start, i.page_end): i for i in (await db.execute(stmt)).scalars().all()}
+        kept = []
+        for page_range in segments:
+            previous_range = document_splitter.unchanged_range(mapping, page_range)
+            if previous_range in by_range:
+                kept.append((by_range.pop(previous_range), page_range))
+        return kept
+
+    def _has_local_pdf(self, document: Document) -> bool:
+        if not document.filename or not document.filename.lower().endswith(".pdf"):
+            return False
+        return blob_store.exists(document.content_hash)
+
+    async def _read_text_layer(self, document: Document) -> List[str]:
+        if not settings.LOCAL_EXTRACTION_ENABLED or not self._has_local_pdf(document):
+            return []
+        with blob_store.open_mmap(document.content_hash) as data:
+            if data is None:
+                return []
+            return await asyncio.to_thread(invoice_parser.read_text_layer, data)
+
+    def _extract_locally(self, document: Document, pages: List[str], vendors) -> Optional[InvoiceExtract]:
+        """
+        Returns the local parse if it is confident enough, None otherwise.
+        """
+        if not pages:
+            return None
+
+        extracted = invoice_parser.parse(pages, vendors)
+        if extracted is None:
+            logger.info(f"Local parser: no match for document {document.id}")
+            return None
+
+        if extracted.confidence < settings.LOCAL_EXTRACTION_MIN_CONFIDENCE:
+            logger.info(f"Local parser: low confidence ({extracted.confidence}) for document {document.id}, using AI")
+            return None
+
+        logger.info(f"Local parser: extracted document {document.id} (confidence {extracted.confidence}, {len(extracted.items)} items)")
+        return extracted
+
+    async def _plan_segments(self, document: Document, pages: List[str]) -> List[PageRange]:
+        if not self._has_local_pdf(document):
+            return []
+        page_count = len(pages)
+        if not page_count:
+            with blob_store.open_mmap(document.content_hash) as data:
+                if data is None:
+                    return []
+                page_count = await asyncio.to_thread(document_splitter.page_count, data)
+        return document_splitter.plan_segments(page_count, pages)
+
+    async def _extract_segments(self, document: Document, pages: List[str], segments: List[PageRange], vendors, api_key: Optional[str] = None) -> List[ExtractedSegment]:
+        """
+        Extracts every page range in parallel (bounded), then merges invoices that span segments.
+        """
+        semaphore = asyncio.Semaphore(settings.EXTRACTION_MAX_PARALLEL_SEGMENTS)
+        tmp_dir = tempfile.mkdtemp(prefix=f"doc{document.id}_")
+        logger.info(f"Document {document.id}: extracting {len(segments)} segments")
+        try:
+            results = await asyncio.gather(*[
+                self._extract_segment(document, pages, page_range, vendors, tmp_dir, semaphore, api_key)
+                for page_range in segments
+            ])
+        finally:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+        return self._merge_segments(results)
+
+    async def _extract_segment(self, document, pages, page_range: PageRange, vendors, tmp_dir: str, semaphore, api_key: Optional[str] = None) -> dict:
+        start, end = page_range
+        async with semaphore:
+            segment_pages = pages[start - 1:end] if pages else []
+            local = self._extract_locally(document, segment_pages, vendors)
+            if local:
+                return {"range": page_range, "extracts": [local], "from_model": False}
+
+            # Segment-level retries: a failing range does not fail the whole batch
+            last_error = None
+            for attempt in range(settings.EXTRACTION_SEGMENT_RETRIES + 1):
+                try:
+                    extracts = await self._extract_segment_with_model(document, page_range, tmp_dir, api_key)
+                    return {"range": page_range, "extracts": extracts, "from_model": True}
+                except Exception as e:
+                    last_error = e
+                    logger.warning(f"Document {document.id} pages {start}-{end}: attempt {attempt + 1} failed: {e}")
+                    if attempt < settings.EXTRACTION_SEGMENT_RETRIES:
+                        await asyncio.sleep(2 ** attempt)
+
+            return {"range": page_range, "extracts": [], "from_model": True, "error": str(last_error)}
+
+    async def _extract_segment_with_model(self, document: Document, page_range: PageRange, tmp_dir: str, api_key: Optional[str] = None) -> List[InvoiceExtract]:
+        start, end = page_range
+        with blob_store.open_mmap(document.content_hash) as data:
+            if data is None:
+                raise ValueError("Local copy was evicted from the blob store")
+            path = await asyncio.to_thread(document_splitter.write_segment, data, page_range, tmp_dir, f"doc{document.id}")
+        segment_file = await gemini_service.upload_file(
+            file_path=path,
+            mime_type="application/pdf",
+            display_name=f"{document.filename}#p{start}-{end}",
+            api_key=api_key
+        )
+        try:
+            for _ in range(30):
+                state = await gemini_service.get_file_state(segment_file.name, api_key=api_key)
+                if state != "PROCESSING":
+                    break
+                await asyncio.sleep(1)
+
+            response_text = await gemini_service.generate_answer(
+                query=EXTRACTION_PROMPT + SEGMENT_EXTRACTION_NOTE.format(start=start, end=end),
+                file_uris=[segment_file.uri],
+                role="accountant",
+                company="Unknown",
+                system_instruction=EXTRACTION_SYSTEM_INSTRUCTION,
+                api_key=api_key,
+                task="extraction",
+                tenant_id=document.tenant_id
+            )
+            data = self._parse_json(response_text)
+            if isinstance(data, dict):
+                data = data.get("invoices", [data])
+            return [self._to_extract(d) for d in data]
+        finally:
+            # Segment uploads are scratch copies
+            try:
+                await gemini_service.delete_file(segment_file.name, api_key=api_key)
+            except Exception:
+                pass
+
+    def _to_extract(self, data: dict) -> InvoiceExtract:
+        if data.get("invoice_number") == CONTINUATION_MARKER:
+            # Continuation pages carry items (and maybe the final total) but no header
+            return InvoiceExtract(
+                invoice_number=CONTINUATION_MARKER,
+                vendor_name=data.get("vendor_name") or "",
+                total_amount=data.get("total_amount") or 0,
+                items=[InvoiceItemExtract(**i) for i in data.get("items") or []]
+            )
+        return InvoiceExtract(**data)
+
+    def _merge_segments(self, results: List[dict]) -> List[ExtractedSegment]:
+        """
+        Folds segment results (in page order) into one entry per invoice.
+        A continuation, or the same invoice number right after, extends the previous invoice.
+        """
+        merged: List[ExtractedSegment] = []
+        for result in results:
+            start, end = result["range"]
+            if result.get("error"):
+                merged.append(ExtractedSegment(page_start=start, page_end=end, from_model=True, error=result["error"]))
+                continue
+
+            for extract in result["extracts"]:
+                previous = merged[-1] if merged and merged[-1].extract else None
+                continues = extract.invoice_number == CONTINUATION_MARKER or (
+                    previous is not None
+                    and extract.invoice_number == previous.extract.invoice_number
+                    and extract.vendor_name in ("", previous.extract.vendor_name)
+                )
+                if continues and previous is not None:
+                    previous.extract.items.extend(extract.items)
+                    if extract.total_amount:
+                        previous.extract.total_amount = extract.total_amount
+                    previous.page_end = max(previous.page_end or end, end)
+                    previous.from_model = previous.from_model or result["from_model"]
+                elif extract.invoice_number == CONTINUATION_MARKER:
+                    logger.warning(f"Dropping continuation on pages {start}-{end}: previous segment failed")
+                else:
+                    merged.append(ExtractedSegment(page_start=start, page_end=end, extract=extract, from_model=result["from_model"]))
+        return merged
+
+    def _parse_json(self, response_text: str):
+        cleaned_text = response_text.replace("```json", "").replace("```", "").strip()
+        # Handle potential leading/trailing garbage (e.g. "Here is the JSON: { ... }")
+        starts = [i for i in (cleaned_text.find("{"), cleaned_text.find("[")) if i != -1]
+        if starts:
+            first = min(starts)
+            closing = "]" if cleaned_text[first] == "[" else "}"
+            cleaned_text = cleaned_text[first:cleaned_text.rfind(closing)+1]
+
+        try:
+            return json.loads(cleaned_text)
+        except json.JSONDecodeError:
+            logger.error(f"JSON Parsing Failed. Raw: {response_text}")
+            # Fallback failure - requires prompt tuning if frequent
+            raise ValueError("AI response was not valid JSON")
+
+    def _batchable(self, document: Document) -> bool:
+        return (
+            settings.EXTRACTION_BATCH_ENABLED
+            and settings.EXTRACTION_BATCH_MAX_DOCUMENTS > 1
+            and document.file_size is not None
+            and document.file_size <= settings.EXTRACTION_BATCH_MAX_FILE_BYTES
+        )
+
+    async def _extract_batch_with_model(self, documents: List[Document], api_key: Optional[str] = None) -> Dict[int, InvoiceExtract]:
+        """
+        One call for several single-invoice documents (see ExtractionBatcher).
+        Returns the members that came back valid, by document id; the rest are left out.
+        """
+        listing = "\n".join(f"{n}. document_id={d.id} ({d.filename})" for n, d in enumerate(documents, start=1))
+        response_text = await gemini_service.generate_answer(
+            query=EXTRACTION_PROMPT + BATCH_EXTRACTION_NOTE.format(count=len(documents), documents=listing),
+            file_uris=[d.file_uri for d in documents],
+            role="accountant",
+            company="Unknown",
+            system_instruction=EXTRACTION_SYSTEM_INSTRUCTION,
+            api_key=api_key,
+            task="extraction",
+            tenant_id=documents[0].tenant_id
+        )
+        data = self._parse_json(response_text)
+        if isinstance(data, dict):
+            data = data.get("invoices", [data])
+        if not isinstance(data, list):
+            raise ValueError("AI response was not a JSON array")
+
+        by_id = {d.id: d for d in documents}
+        # Entries are matched by the id the model echoes, never by position: a reordered answer
+        # would attach one document's totals to another. Unmatched members are retried by the batcher.
+        results, unmatched = {}, 0
+        for entry in data:
+            if not isinstance(entry, dict):
+                unmatched += 1
+                continue
+            try:
+                document_id = int(entry.pop("document_id", None))
+            except (TypeError, ValueError):
+                unmatched += 1
+                continue
+            if document_id not in by_id or document_id in results:
+                unmatched += 1
+                continue
+            try:
+                results[document_id] = InvoiceExtract(**entry)
+            except Exception as e:
+                logger.warning(f"Batched extraction: document {document_id} failed validation: {e}")
+        if unmatched:
+            logger.warning(f"Batched extraction: {unmatched} entries without a valid document_id were dropped")
+        return results
+
+    async def _extract_with_model(self, document: Document, api_key: Optional[str] = None) -> InvoiceExtract:
+        response_text = await gemini_service.generate_answer(
+            query=EXTRACTION_PROMPT,
+            file_uris=[document.file_uri],
+            role="accountant",
+            company="Unknown",
+            system_instruction=EXTRACTION_SYSTEM_INSTRUCTION,
+            api_key=api_key,
+            task="extraction",
+            tenant_id=document.tenant_id
+        )
+
+        data_dict = self._parse_json(response_text)
+        logger.info(f"AI Extraction Success. Items count: {len(data_dict.get('items', []))}")
+        logger.debug(f"Document {document.id}: extracted {len(data_dict.get('items', []))} items")
+
+        # Use Pydantic for validation
+        return InvoiceExtract(**data_dict)
+
+    async def _save_extracts(self, db: AsyncSession, document: Document, results: List[ExtractedSegment], pages: List[str], api_key: Optional[str] = None, kept: List[Tuple[FinanceInvoice, PageRange]] = ()) -> List[FinanceInvoice]:
+        """
+        Merges segment results into the document's FinanceInvoice rows.
+        Rows are matched by invoice number, then by page range, so invoice IDs stay stable on re-extraction.
+        `kept` invoices (unchanged pages of a new version) are left as they are, at their new page range.
+        """
+        # Categories come from the tenant's learned map; unknown descriptions share one model call
+        items = [item for segment in results if segment.extract for item in segment.extract.items]
+        try:
+            await item_categorizer.categorize(db, document.tenant_id, items, api_key)
+        except Exception as e:
+            logger.warning(f"Item categorization failed for document {document.id}: {e}")
+
+        stmt = select(FinanceInvoice).where(FinanceInvoice.document_id == document.id)
+        result = await db.execute(stmt)
+        existing = list(result.scalars().all())
+
+        invoices, searchable = [], []
+        for invoice, (page_start, page_end) in kept:
+            existing.remove(invoice)
+            invoice.page_start, invoice.page_end = page_start, page_end
+            invoices.append(invoice)
+        for segment in results:
+            match = self._match_existing(existing, segment)
+            if match:
+                existing.remove(match)
+
+            if segment.extract is None:
+                # Failed range: keep the previous result if any, otherwise record the failure
+                if not match:
+                    match = FinanceInvoice(
+                        tenant_id=document.tenant_id,
+                        document_id=document.id,
+                        page_start=segment.page_start,
+                        page_end=segment.page_end,
+                        extraction_status="failed"
+                    )
+                    db.add(match)
+                invoices.append(match)
+                continue
+
+            invoice, vendor = await self._save_extract(
+                db, document, segment.extract, invoice=match, page_range=(segment.page_start, segment.page_end)
+            )
+            invoices.append(invoice)
+            searchable.append((invoice, segment.extract))
+
+            # Teach the local parser this vendor's layout from the trusted model output
+            if segment.from_model and pages:
+                segment_pages = pages[segment.page_start - 1:segment.page_end] if segment.page_start else pages
+                vendor.extraction_template = invoice_parser.learn_template(
+                    segment_pages, segment.extract, previous=vendor.extraction_template
+                )
+
+        # Invoices from a previous split that no longer exist
+        await vendor_risk.forget_invoices(db, [stale.id for stale in existing])
+        for stale in existing:
+            await db.delete(stale)
+
+        await search_index.index_invoices(db, document, searchable, kept=[invoice for invoice, _ in kept])
+
+        return sorted(invoices, key=lambda i: i.page_start or 0)
+
+    def _match_existing(self, existing: List[FinanceInvoice], segment: ExtractedSegment) -> Optional[FinanceInvoice]:
+        if segment.extract:
+            for invoice in existing:
+                if invoice.invoice_number == segment.extract.invoice_number:
+                    return invoice
+        for invoice in existing:
+            if (invoice.page_start or 1) == (segment.page_start or 1):
+                return invoice
+        return None
+
+    async def _save_extract(self, db: AsyncSession, document: Document, extracted_data: InvoiceExtract, invoice: Optional[FinanceInvoice] = None, page_range=(None, None)):
+        """
+        Upserts vendor, invoice header and line items. Does not commit.
+        Returns (invoice, vendor).
+        """
+        # A. Vendor (Upsert)
+        stmt = select(FinanceVendor).where(FinanceVendor.name == extracted_data.vendor_name, FinanceVendor.tenant_id == document.tenant_id)
+        result = await db.execute(stmt)
+        vendor = result.scalars().first()
+
+        if not vendor:
+            vendor = FinanceVendor(
+                name=extracted_data.vendor_name,
+                tax_id=extracted_data.vendor_tax_id,
+                tenant_id=document.tenant_id
+            )
+            db.add(vendor)
+            await db.flush()
+            await db.refresh(vendor)
+
+        # B. Invoice Header
+        inv_date = parse_invoice_date(extracted_data.invoice_date)
+
+        if invoice:
+             # Update existing. Its previous amount and open flags leave the vendor statistics;
+             # the flags are void for the new content and the incremental audit re-raises them.
+             await vendor_risk.forget_invoices(db, [invoice.id])
+             await db.execute(delete(FinanceAuditFlag).where(FinanceAuditFlag.invoice_id == invoice.id, FinanceAuditFlag.is_resolved == False))
+             invoice.total_amount = extracted_data.total_amount
+             invoice.invoice_number = extracted_data.invoice_number
+             invoice.invoice_date = inv_date
+             invoice.currency = extracted_data.currency
+             invoice.vendor_id = vendor.id
+             invoice.page_start, invoice.page_end = page_range
+             invoice.extraction_status = "completed"
+
+             # Explicitly delete old items
+             await db.execute(delete(FinanceInvoiceItem).where(FinanceInvoiceItem.tenant_id == document.tenant_id, FinanceInvoiceItem.invoice_id == invoice.id))
+        else:
+            invoice = FinanceInvoice(
+                tenant_id=document.tenant_id,
+                document_id=document.id,
+                vendor_id=vendor.id,
+                invoice_number=extracted_data.invoice_number,
+                invoice_date=inv_date,
+                total_amount=extracted_data.total_amount,
+                currency=extracted_data.currency,
+                page_start=page_range[0],
+                page_end=page_range[1],
+                extraction_status="completed"
+            )
+            db.add(invoice)
+            await db.flush() # Identify ID
+
+        await vendor_risk.add_invoice(db, vendor.id, invoice.total_amount)
+
+        # C. Line Items
+        for item in extracted_data.items:
+            # Explicit addition
+            db_item = FinanceInvoiceItem(
+                invoice_id=invoice.id,
+                tenant_id=document.tenant_id,
+                description=item.description,
+                quantity=item.quantity,
+                unit_price=item.unit_price,
+                total_price=item.total_price,
+                category=item.category
+            )
+            db.add(db_item)
+
+        return invoice, vendor
+
 finance_extractor = FinanceExtractorService()
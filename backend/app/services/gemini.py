@@ -1,13 +1,35 @@
-import google.generativeai as genai
-from google.generativeai import types
 from app.core.config import settings
-from typing import Optional, List
+from app.core.cache import cache
+from app.services.gemini_clients import gemini_clients, key_id
+from app.services.latency import call_with_deadline
+from app.services.model_router import model_router
+from app.services.single_flight import single_flight
+from typing import Optional, List, TYPE_CHECKING
+import asyncio
+import hashlib
 import logging
+import json
+import time
+
+if TYPE_CHECKING:
+    from google.generativeai import types
+
+# Returned instead of raising when generation fails
+FALLBACK_ANSWER = "Apologies, I could not process the request based on the current document context."
 
 class GeminiService:
+    """
+    Every call takes an optional `api_key` (tenant BYOK, see TenantService.get_api_key);
+    None means the system key. Calls run on the pooled client of that key, so tenants
+    never share global SDK state and different keys' quotas are used in parallel.
+    Remote files belong to the key that uploaded them: use the same key to read/delete.
+    Concurrent identical reads (file handles, listings, generations) share one upstream
+    call (see SingleFlight, GEMINI_SINGLE_FLIGHT_ENABLED).
+    """
+
     def __init__(self):
-        genai.configure(api_key=settings.GOOGLE_API_KEY)
-        self.model = genai.GenerativeModel('gemini-1.5-pro')
+        # Nothing is imported or configured here: the SDK costs more than the rest of the app
+        # to import, so clients are built on first use (see GeminiClientPool) to keep cold starts fast.
         self.logger = logging.getLogger("uvicorn")
 
     def create_file_search_store(self, tenant_slug: str, workspace_name: str) -> str:
@@ -33,33 +55,59 @@ class GeminiService:
         
         return "managed_by_gemini" # Placeholder if explicit store creation isn't required by the basic File API
 
-    async def upload_file(self, file_path: str, mime_type: str, display_name: str) -> types.File:
+    async def upload_file(self, file_path: str, mime_type: str, display_name: str, api_key: Optional[str] = None) -> "types.File":
         """
         Uploads a file to Gemini File API.
         """
         try:
-            # Use genai directly
-            file_ref = genai.upload_file(
-                path=file_path,
-                display_name=display_name,
-                mime_type=mime_type
-            )
+            with gemini_clients.lease(api_key) as client:
+                file_ref = await asyncio.to_thread(
+                    client.upload_file,
+                    path=file_path,
+                    display_name=display_name,
+                    mime_type=mime_type
+                )
             self.logger.info(f"Uploaded file {display_name} to Gemini: {file_ref.name}")
             return file_ref
         except Exception as e:
             self.logger.error(f"Failed to upload file to Gemini: {str(e)}")
             raise
 
-    async def get_file_state(self, file_name: str) -> str:
+    def _file_key(self, file_name: str, api_key: Optional[str]) -> str:
+        return f"gemini:file:{key_id(api_key or settings.GOOGLE_API_KEY)}:{file_name}"
+
+    async def _coalesced(self, kind: str, key, call):
+        if not settings.GEMINI_SINGLE_FLIGHT_ENABLED:
+            return await call()
+        return await single_flight.do(kind, key, call)
+
+    async def _get_file_handle(self, file_name: str, api_key: Optional[str] = None) -> dict:
+        """
+        {uri, mime_type, state} of a remote file. ACTIVE handles are shared through the cache,
+        so the get_file round trip is paid once per TTL across all workers, not once per prompt.
+        """
+        cache_key = self._file_key(file_name, api_key)
+        handle = await cache.get(cache_key)
+        if handle is None:
+            handle = await self._coalesced("get_file", cache_key, lambda: self._fetch_file_handle(cache_key, file_name, api_key))
+        return handle
+
+    async def _fetch_file_handle(self, cache_key: str, file_name: str, api_key: Optional[str]) -> dict:
+        with gemini_clients.lease(api_key) as client:
+            file_ref = await asyncio.to_thread(client.get_file, file_name)
+        handle = {"uri": file_ref.uri, "mime_type": file_ref.mime_type, "state": file_ref.state.name, "size_bytes": int(file_ref.size_bytes or 0)}
+        if handle["state"] == "ACTIVE":
+            await cache.set(cache_key, handle, ttl=settings.FILE_CACHE_TTL_SECONDS)
+        return handle
+
+    async def get_file_state(self, file_name: str, api_key: Optional[str] = None) -> str:
         """
         Checks the state of a file (PROCESSING, ACTIVE, FAILED).
         file_name is the ID (e.g. 'files/...')
         """
-        # Use genai directly
-        file_ref = genai.get_file(name=file_name)
-        return file_ref.state.name
+        return (await self._get_file_handle(file_name, api_key))["state"]
 
-    async def check_file_exists(self, display_name: str) -> Optional[types.File]:
+    async def check_file_exists(self, display_name: str, api_key: Optional[str] = None) -> Optional["types.File"]:
         """
         Checks if a file with the given display_name already exists in Gemini.
         Returns the File object if found, None otherwise.
@@ -67,7 +115,7 @@ class GeminiService:
         try:
             # Note: list_files returns a generator. We iterate to find a match.
             # Efficiency warning: If many files, this is slow. Gemini API doesn't support filter by name yet.
-            for f in genai.list_files():
+            for f in await self.list_files(api_key):
                 if f.display_name == display_name:
                     return f
             return None
@@ -75,13 +123,30 @@ class GeminiService:
             self.logger.error(f"Error checking file existence: {e}")
             return None
 
-    async def delete_file(self, file_name: str):
+    async def list_files(self, api_key: Optional[str] = None) -> List["types.File"]:
+        """
+        Lists all files stored in Gemini for this API key.
+        """
+        async def _list():
+            with gemini_clients.lease(api_key) as client:
+                return await asyncio.to_thread(client.list_files)
+        return await self._coalesced("list_files", key_id(api_key or settings.GOOGLE_API_KEY), _list)
+
+    async def delete_file(self, file_name: str, missing_ok: bool = False, api_key: Optional[str] = None):
         """
         Deletes a file from Gemini.
+        With missing_ok, an already-deleted (or expired) file counts as success.
         """
+        from google.api_core.exceptions import NotFound
+
+        await cache.delete(self._file_key(file_name, api_key))
         try:
-            genai.delete_file(file_name)
+            with gemini_clients.lease(api_key) as client:
+                await asyncio.to_thread(client.delete_file, file_name)
             self.logger.info(f"Deleted file from Gemini: {file_name}")
+        except NotFound:
+            if not missing_ok:
+                raise
         except Exception as e:
             self.logger.error(f"Error deleting file: {e}")
             raise
@@ -110,41 +175,82 @@ class GeminiService:
             "3. If the answer is in the document, CITE IT.\n"
         )
 
-    async def generate_answer(self, query: str, file_uris: List[str], role: str = "admin", company: str = "General", system_instruction: str = None) -> str:
+    async def generate_answer(self, query: str, file_uris: List[str], role: str = "admin", company: str = "General", system_instruction: str = None, history: Optional[str] = None, api_key: Optional[str] = None, task: str = "chat", tenant_id: Optional[int] = None) -> str:
         """
-        Generates an answer using Gemini 2.0 Flash with Role-Based Context.
+        Generates an answer with Role-Based Context on the model chosen by ModelRouter
+        for this `task` ("chat", "extraction", "categorize", "summary") and tenant.
+        `history` is an already-bounded conversation context (see ChatSessionService).
+        Identical concurrent calls (same key, tenant, task, prompt and files) share one answer.
         """
-        model_name = "gemini-2.0-flash"
-        
-        parts = []
-        for uri in file_uris:
+        fingerprint = hashlib.sha256(json.dumps(
+            [key_id(api_key or settings.GOOGLE_API_KEY), tenant_id, task, role, company, system_instruction, history, query, file_uris],
+            ensure_ascii=False, default=str,
+        ).encode("utf-8")).hexdigest()
+        return await self._coalesced("generate", fingerprint, lambda: self._generate_answer(
+            query, file_uris, role, company, system_instruction, history, api_key, task, tenant_id
+        ))
+
+    async def _generate_answer(self, query: str, file_uris: List[str], role: str, company: str, system_instruction: Optional[str], history: Optional[str], api_key: Optional[str], task: str, tenant_id: Optional[int]) -> str:
+        async def _file_part(uri: str):
             try:
                 file_name = uri
                 if "/files/" in uri:
                     file_name = "files/" + uri.split("/files/")[-1]
                 
-                file_obj = genai.get_file(file_name)
-                parts.append(file_obj)
+                return await self._get_file_handle(file_name, api_key)
             except Exception as e:
                 self.logger.warning(f"Could not retrieve file for prompt: {uri} - {e}")
+                return None
 
+        handles = [handle for handle in await asyncio.gather(*[_file_part(uri) for uri in file_uris]) if handle]
+        parts = [{"file_data": {"file_uri": h["uri"], "mime_type": h["mime_type"]}} for h in handles]
+
+        if history:
+            parts.append(f"Conversation so far:\n{history}\n\nCurrent question:")
         parts.append(query)
         
         if system_instruction is None:
             # Generate Dynamic Vertical Instruction
             system_instruction = self.generate_vertical_instructions(role, company)
 
+        route = model_router.choose(
+            task,
+            await model_router.policy(tenant_id),
+            prompt_chars=len(system_instruction) + sum(len(p) for p in parts if isinstance(p, str)),
+            attachment_bytes=sum(h.get("size_bytes", 0) for h in handles),
+            attachments=len(handles),
+            role=role,
+        )
+        usage = {}
+
+        async def _generate():
+            with gemini_clients.lease(api_key) as client:
+                chat_model = client.model(
+                    model_name=route.model,
+                    system_instruction=system_instruction
+                )
+                response = await chat_model.generate_content_async(parts)
+            text = response.text
+            if response.usage_metadata:
+                usage["input_tokens"] = response.usage_metadata.prompt_token_count or 0
+                usage["output_tokens"] = response.usage_metadata.candidates_token_count or 0
+            return text
+
+        started = time.perf_counter()
         try:
-             chat_model = genai.GenerativeModel(
-                 model_name=model_name,
-                 system_instruction=system_instruction
-             )
-             
-             response = chat_model.generate_content(parts)
-             return response.text
+            # Adaptive timeout (and optional hedge) from this route's observed latency: per task and
+            # tier, so short chat calls do not set the deadline of multi-file extraction on the same model
+            answer = await call_with_deadline(route.key, _generate, hedge=settings.GEMINI_HEDGING_ENABLED)
+            model_router.record(route, time.perf_counter() - started, **usage)
+            return answer
+        except asyncio.TimeoutError as e:
+            self.logger.error(f"Gemini generation timed out ({route.key}): {e}")
+            model_router.record(route, time.perf_counter() - started, ok=False)
+            return FALLBACK_ANSWER
         except Exception as e:
-            self.logger.error(f"Gemini generation failed: {str(e)}")
+            self.logger.error(f"Gemini generation failed ({route.key}): {str(e)}")
+            model_router.record(route, time.perf_counter() - started, ok=False)
             # Fallback for 404/Safety errors
-            return "Apologies, I could not process the request based on the current document context."
+            return FALLBACK_ANSWER
 
 gemini_service = GeminiService()
@@ -0,0 +1,155 @@
+import time
+import pathlib
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Iterator, List, Optional
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# GeminiClient relies on private SDK hooks: google.generativeai.client._ClientManager and the
+# GenerativeModel._client / _async_client attributes. requirements.txt pins the SDK to the
+# versions these were tested on; check_sdk() fails loudly if an upgrade removed them.
+SDK_VERSIONS = ">=0.7.0,<0.9"
+
+
+def key_id(api_key: Optional[str]) -> str:
+    """
+    Stable, non-secret identifier of an API key (for logs and cache keys).
+    """
+    return hashlib.sha256((api_key or "").encode("utf-8")).hexdigest()[:16]
+
+
+def check_sdk():
+    """
+    Raises RuntimeError if the installed SDK lacks the private hooks GeminiClient uses.
+    """
+    import google.generativeai as genai
+    from google.generativeai import client
+
+    if not hasattr(client, "_ClientManager"):
+        raise RuntimeError(
+            f"google-generativeai {getattr(genai, '__version__', '?')} has no client._ClientManager; "
+            f"per-key Gemini clients need google-generativeai{SDK_VERSIONS}"
+        )
+
+
+class GeminiClient:
+    """
+    SDK clients bound to one API key. Built on the SDK's own client manager but never
+    touches the process-global `genai.configure` state, so several keys can be used at once.
+    File methods are blocking - run them in a thread from async code.
+    """
+
+    def __init__(self, api_key: str):
+        from google.generativeai.client import _ClientManager
+
+        self.key_id = key_id(api_key)
+        self.last_used = time.monotonic()
+        self.in_flight = 0
+        self._manager = _ClientManager()
+        self._manager.configure(api_key=api_key)
+        self._lock = threading.Lock()
+
+    def _client(self, name: str):
+        with self._lock:
+            return self._manager.get_default_client(name)
+
+    def model(self, model_name: str, system_instruction: Optional[str] = None, **kwargs):
+        import google.generativeai as genai
+
+        model = genai.GenerativeModel(model_name=model_name, system_instruction=system_instruction, **kwargs)
+        model._client = self._client("generative")
+        model._async_client = self._client("generative_async")
+        return model
+
+    def upload_file(self, path: str, mime_type: str, display_name: str):
+        from google.generativeai.types import file_types
+
+        response = self._client("file").create_file(path=pathlib.Path(path), mime_type=mime_type, display_name=display_name)
+        return file_types.File(response)
+
+    def get_file(self, name: str):
+        from google.generativeai.types import file_types
+
+        return file_types.File(self._client("file").get_file(name=name))
+
+    def list_files(self) -> List:
+        from google.generativeai import protos
+        from google.generativeai.types import file_types
+
+        response = self._client("file").list_files(protos.ListFilesRequest(page_size=100))
+        return [file_types.File(proto) for proto in response]
+
+    def delete_file(self, name: str):
+        from google.generativeai import protos
+
+        self._client("file").delete_file(request=protos.DeleteFileRequest(name=name))
+
+
+class GeminiClientPool:
+    """
+    One reusable GeminiClient per API key (tenant BYOK keys + the system default).
+    Clients are created on first use and dropped after `idle_seconds` without requests;
+    at most `max_clients` are kept (least recently used idle clients go first).
+    The SDK is checked (check_sdk) before the first client is created, not at import, so
+    startup does not load it.
+    """
+
+    def __init__(self, idle_seconds: int, max_clients: int):
+        self.idle_seconds = idle_seconds
+        self.max_clients = max_clients
+        self._clients: OrderedDict = OrderedDict() # key_id -> GeminiClient
+        self._lock = threading.Lock()
+        self._sdk_checked = False
+
+    def get(self, api_key: Optional[str] = None) -> GeminiClient:
+        api_key = api_key or settings.GOOGLE_API_KEY
+        client_key = key_id(api_key)
+        with self._lock:
+            client = self._clients.get(client_key)
+            if client is None:
+                if not self._sdk_checked:
+                    check_sdk()
+                    self._sdk_checked = True
+                client = GeminiClient(api_key)
+                self._clients[client_key] = client
+                logger.info(f"Gemini client pool: created client for key {client_key}")
+            self._clients.move_to_end(client_key)
+            client.last_used = time.monotonic()
+            self._evict()
+        return client
+
+    @contextmanager
+    def lease(self, api_key: Optional[str] = None) -> Iterator[GeminiClient]:
+        """
+        Client for the key, protected from idle eviction while the block runs.
+        """
+        client = self.get(api_key)
+        with self._lock:
+            client.in_flight += 1
+        try:
+            yield client
+        finally:
+            with self._lock:
+                client.in_flight -= 1
+                client.last_used = time.monotonic()
+
+    def _evict(self):
+        now = time.monotonic()
+        for client_key, client in list(self._clients.items()):
+            if client.in_flight:
+                continue
+            if now - client.last_used > self.idle_seconds or len(self._clients) > self.max_clients:
+                del self._clients[client_key]
+                logger.info(f"Gemini client pool: evicted idle client for key {client_key}")
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"clients": len(self._clients), "in_flight": sum(c.in_flight for c in self._clients.values())}
+
+gemini_clients = GeminiClientPool(settings.GEMINI_CLIENT_IDLE_SECONDS, settings.GEMINI_CLIENT_POOL_MAX)
@@ -0,0 +1,348 @@
+import re
+import logging
+import unicodedata
+from datetime import datetime
+from itertools import permutations
+from typing import List, Optional, Tuple
+
+from app.core.arabic import DIGITS as _DIGITS
+from app.schemas.finance import InvoiceExtract, InvoiceItemExtract
+
+logger = logging.getLogger(__name__)
+
+_NUMBER_RE = re.compile(r"\d{1,3}(?:,\d{3})+(?:\.\d+)?|\d+(?:\.\d+)?")
+_DATE_RE = re.compile(r"\b(\d{4})[-/.](\d{1,2})[-/.](\d{1,2})\b|\b(\d{1,2})[-/.](\d{1,2})[-/.](\d{4})\b")
+_SA_VAT_RE = re.compile(r"\b3\d{13}3\b")
+_INVOICE_NO_RE = re.compile(r"[A-Za-z0-9][A-Za-z0-9\-/]*\d[A-Za-z0-9\-/]*")
+
+# Labels ordered by specificity (first match wins)
+INVOICE_NUMBER_LABELS = ["رقم الفاتورة", "فاتورة رقم", "Invoice Number", "Invoice No", "Invoice #"]
+INVOICE_DATE_LABELS = ["تاريخ الفاتورة", "تاريخ الإصدار", "Invoice Date", "التاريخ", "Date"]
+TOTAL_LABELS = [
+    "الإجمالي شامل الضريبة", "الاجمالي شامل الضريبة", "المبلغ الإجمالي", "المبلغ المستحق",
+    "Grand Total", "Total Amount", "Amount Due", "الإجمالي", "الاجمالي", "Total",
+]
+TAX_ID_LABELS = ["الرقم الضريبي", "رقم التسجيل الضريبي", "VAT Number", "VAT No", "Tax ID", "TRN"]
+
+_HEADER_LABELS = INVOICE_NUMBER_LABELS + INVOICE_DATE_LABELS + TAX_ID_LABELS
+
+# Lines containing these are summary rows, never line items
+_SUMMARY_MARKERS = TOTAL_LABELS + ["ضريبة", "الخصم", "Subtotal", "VAT", "Tax", "Discount"]
+
+# Used to detect whether the text layer came out in visual (reversed) order
+_RTL_PROBES = ["فاتورة", "الإجمالي", "الاجمالي", "الكمية", "السعر", "التاريخ", "ضريبة"]
+
+_CURRENCIES = [
+    ("SAR", ["SAR", "ر.س", "ريال"]),
+    ("AED", ["AED", "درهم"]),
+    ("USD", ["USD", "$", "دولار"]),
+    ("EUR", ["EUR", "€", "يورو"]),
+]
+
+VAT_RATE = 0.15
+
+
+def _to_float(token: str) -> float:
+    return float(token.replace(",", ""))
+
+
+def _numbers(line: str) -> List[float]:
+    return [_to_float(m) for m in _NUMBER_RE.findall(line)]
+
+
+def _has_arabic(line: str) -> bool:
+    return any("؀" <= ch <= "ۿ" for ch in line)
+
+
+def _reverse_visual(line: str) -> str:
+    """
+    Converts a visually-ordered RTL line back to logical order.
+    Digit runs are LTR inside RTL text, so they are flipped back after reversing.
+    """
+    reversed_line = line[::-1]
+    return re.sub(r"[\d.,/\-:]+", lambda m: m.group(0)[::-1], reversed_line)
+
+
+def _close(a: float, b: float) -> bool:
+    return abs(a - b) <= max(0.02, abs(b) * 0.005)
+
+
+class LocalInvoiceParser:
+    """
+    Rule/template based invoice extraction over the PDF text layer.
+    Produces an InvoiceExtract with a confidence score; callers fall back to the LLM when it is low.
+    """
+
+    MIN_TEXT_CHARS = 40
+
+    def read_text_layer(self, source) -> List[str]:
+        """
+        Returns the normalized text of every page, or [] if the PDF has no usable text layer (e.g. scans).
+        Blocking (CPU bound) - run in a thread from async code.
+        """
+        from pypdf import PdfReader
+
+        try:
+            reader = PdfReader(source)
+            raw_pages = [page.extract_text() or "" for page in reader.pages]
+        except Exception as e:
+            logger.warning(f"Text layer extraction failed: {e}")
+            return []
+
+        if sum(len(p.strip()) for p in raw_pages) < self.MIN_TEXT_CHARS:
+            return []
+
+        pages = [unicodedata.normalize("NFKC", p).translate(_DIGITS) for p in raw_pages]
+
+        # pypdf emits some RTL PDFs in visual order ("ةروتاف" instead of "فاتورة")
+        joined = "\n".join(pages)
+        forward = sum(joined.count(w) for w in _RTL_PROBES)
+        backward = sum(joined.count(w[::-1]) for w in _RTL_PROBES)
+        if backward > forward:
+            pages = [
+                "\n".join(_reverse_visual(l) if _has_arabic(l) else l for l in p.splitlines())
+                for p in pages
+            ]
+        return pages
+
+    # --- Field rules ---
+
+    def _lines(self, pages: List[str]) -> List[str]:
+        return [l.strip() for p in pages for l in p.splitlines() if l.strip()]
+
+    def _value_after(self, lines: List[str], labels: List[str]) -> Tuple[Optional[str], Optional[str]]:
+        """
+        Finds the first line containing one of the labels and returns (label, remainder of the line).
+        """
+        for label in labels:
+            for line in lines:
+                idx = line.find(label)
+                if idx == -1:
+                    continue
+                rest = (line[:idx] + " " + line[idx + len(label):]).strip(" :#-\t")
+                if rest:
+                    return label, rest
+        return None, None
+
+    def _find_invoice_number(self, lines, labels) -> Optional[str]:
+        _, rest = self._value_after(lines, labels)
+        if rest:
+            candidates = [c for c in _INVOICE_NO_RE.findall(rest) if not _DATE_RE.fullmatch(c)]
+            if candidates:
+                return max(candidates, key=len)
+        return None
+
+    def _parse_date(self, text: str) -> Optional[str]:
+        m = _DATE_RE.search(text)
+        if not m:
+            return None
+        if m.group(1):
+            y, mo, d = int(m.group(1)), int(m.group(2)), int(m.group(3))
+        else:
+            d, mo, y = int(m.group(4)), int(m.group(5)), int(m.group(6))
+        if y < 1600:
+            # Hijri date - conversion is left to the model
+            return None
+        try:
+            return datetime(y, mo, d).strftime("%Y-%m-%d")
+        except ValueError:
+            return None
+
+    def _find_date(self, lines, labels) -> Optional[str]:
+        _, rest = self._value_after(lines, labels)
+        if rest:
+            parsed = self._parse_date(rest)
+            if parsed:
+                return parsed
+        for line in lines:
+            parsed = self._parse_date(line)
+            if parsed:
+                return parsed
+        return None
+
+    def _find_total(self, lines, labels) -> Optional[float]:
+        _, rest = self._value_after(lines, labels)
+        if rest:
+            nums = _numbers(rest)
+            if nums:
+                return max(nums)
+        return None
+
+    def _find_tax_id(self, lines) -> Optional[str]:
+        for line in lines:
+            m = _SA_VAT_RE.search(line)
+            if m:
+                return m.group(0)
+        _, rest = self._value_after(lines, TAX_ID_LABELS)
+        if rest:
+            m = re.search(r"\d{8,}", rest)
+            if m:
+                return m.group(0)
+        return None
+
+    def _find_currency(self, text: str) -> str:
+        for code, markers in _CURRENCIES:
+            if any(marker in text for marker in markers):
+                return code
+        return "SAR"
+
+    def _parse_item(self, line: str) -> Optional[InvoiceItemExtract]:
+        """
+        A line item is any row holding (quantity, unit price, total) with qty * price == total.
+        Column order is not assumed, which makes RTL tables work either way round.
+        """
+        if any(marker in line for marker in _SUMMARY_MARKERS + _HEADER_LABELS) or _DATE_RE.search(line):
+            return None
+        nums = _numbers(line)
+        if len(nums) < 3:
+            return None
+
+        best = None
+        for q, u, t in permutations(nums, 3):
+            if q <= 0 or u <= 0 or t <= 0 or not _close(q * u, t):
+                continue
+            # Prefer the largest total; a quantity of 1 is usually a row index column
+            score = (t, q != 1, q == int(q))
+            if best is None or score > best[0]:
+                best = (score, q, u, t)
+        if not best:
+            return None
+
+        description = _NUMBER_RE.sub(" ", line)
+        description = re.sub(r"[|\t]+", " ", description)
+        description = re.sub(r"\s{2,}", " ", description).strip(" -:.")
+        if not description:
+            return None
+
+        _, q, u, t = best
+        return InvoiceItemExtract(description=description, quantity=q, unit_price=u, total_price=t)
+
+    def invoice_number_on_page(self, page: str) -> Optional[str]:
+        """
+        Invoice number printed in a page header, used to detect invoice boundaries in batches.
+        """
+        return self._find_invoice_number(self._lines([page]), INVOICE_NUMBER_LABELS)
+
+    # --- Vendor templates ---
+
+    def _match_vendor(self, text: str, vendors) -> Optional[object]:
+        """
+        Picks the known vendor whose tax id or learned markers appear in the text.
+        """
+        for vendor in vendors:
+            if vendor.tax_id and vendor.tax_id in text:
+                return vendor
+        for vendor in vendors:
+            markers = (vendor.extraction_template or {}).get("markers", [])
+            if vendor.name and vendor.name in text:
+                return vendor
+            if any(m and m in text for m in markers):
+                return vendor
+        return None
+
+    def learn_template(self, pages: List[str], extracted: InvoiceExtract, previous: Optional[dict] = None) -> dict:
+        """
+        Learns the label each field sits next to on this vendor's layout, from a trusted extraction.
+        """
+        template = dict(previous or {})
+        anchors = dict(template.get("anchors", {}))
+        lines = self._lines(pages)
+
+        def anchor_for(value: Optional[str]) -> Optional[str]:
+            if not value:
+                return None
+            for line in lines:
+                idx = line.find(value)
+                if idx == -1:
+                    continue
+                # The label is the contiguous text right before the value (or right after it)
+                before = _NUMBER_RE.split(line[:idx])[-1].strip(" :#-\t")
+                after = _NUMBER_RE.split(line[idx + len(value):])[0].strip(" :#-\t")
+                label = before or after
+                if 2 <= len(label) <= 40:
+                    return label
+            return None
+
+        total_str = f"{extracted.total_amount:,.2f}"
+        fields = {
+            "invoice_number": extracted.invoice_number,
+            "total_amount": next(
+                (s for s in (total_str, total_str.replace(",", ""), f"{extracted.total_amount:g}") if any(s in l for l in lines)),
+                None,
+            ),
+        }
+        for field, value in fields.items():
+            anchor = anchor_for(value)
+            if anchor:
+                anchors[field] = anchor
+
+        markers = set(template.get("markers", []))
+        if extracted.vendor_name and any(extracted.vendor_name in l for l in lines):
+            markers.add(extracted.vendor_name)
+
+        template["anchors"] = anchors
+        template["markers"] = sorted(markers)
+        template["vendor_name"] = extracted.vendor_name
+        template["samples"] = template.get("samples", 0) + 1
+        return template
+
+    # --- Entry point ---
+
+    def parse(self, pages: List[str], vendors=()) -> Optional[InvoiceExtract]:
+        """
+        Parses the text layer into an InvoiceExtract. `vendors` are the tenant's FinanceVendor rows
+        (name, tax_id, extraction_template) used for template matching.
+        """
+        if not pages:
+            return None
+
+        lines = self._lines(pages)
+        text = "\n".join(lines)
+
+        vendor = self._match_vendor(text, vendors)
+        template = (vendor.extraction_template or {}) if vendor else {}
+        anchors = template.get("anchors", {})
+
+        def with_anchor(field, labels):
+            return ([anchors[field]] if field in anchors else []) + labels
+
+        invoice_number = self._find_invoice_number(lines, with_anchor("invoice_number", INVOICE_NUMBER_LABELS))
+        invoice_date = self._find_date(lines, INVOICE_DATE_LABELS)
+        total_amount = self._find_total(lines, with_anchor("total_amount", TOTAL_LABELS))
+        tax_id = self._find_tax_id(lines)
+        items = [item for item in (self._parse_item(l) for l in lines) if item]
+
+        vendor_name = vendor.name if vendor else None
+        if not vendor_name:
+            # Heuristic: letterhead is the first textual line that is not a label
+            vendor_name = next(
+                (l for l in lines[:5] if not _numbers(l) and not any(lab in l for lab in _HEADER_LABELS + TOTAL_LABELS) and len(l) > 2),
+                None,
+            )
+
+        if not invoice_number or total_amount is None or not vendor_name:
+            return None
+
+        # Confidence: weighted field coverage + arithmetic cross-check of the item table.
+        # A guessed (non-template) vendor caps the score below the default threshold.
+        confidence = 0.2 + 0.2 + (0.1 if invoice_date else 0.0)
+        confidence += 0.2 if vendor else 0.0
+        if items:
+            items_sum = sum(i.total_price for i in items)
+            if _close(items_sum, total_amount) or _close(items_sum * (1 + VAT_RATE), total_amount):
+                confidence += 0.3
+            else:
+                confidence += 0.05
+
+        return InvoiceExtract(
+            invoice_number=invoice_number,
+            invoice_date=invoice_date,
+            vendor_name=vendor_name,
+            vendor_tax_id=tax_id or (vendor.tax_id if vendor else None),
+            total_amount=total_amount,
+            currency=self._find_currency(text),
+            items=items,
+            confidence=round(min(confidence, 1.0), 2),
+        )
+
+invoice_parser = LocalInvoiceParser()
@@ -0,0 +1,168 @@
+import re
+import json
+import time
+import logging
+from collections import Counter, OrderedDict
+from typing import Dict, List, Optional
+
+from sqlalchemy import select, func
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.arabic import normalize_arabic
+from app.core.config import settings
+from app.models.finance import FinanceInvoice, FinanceInvoiceItem
+from app.schemas.finance import InvoiceItemExtract
+from app.services.gemini import gemini_service, FALLBACK_ANSWER
+
+logger = logging.getLogger(__name__)
+
+CATEGORIZE_INSTRUCTION = "You classify invoice line items into short accounting categories. Output ONLY raw JSON."
+
+CATEGORIZE_PROMPT = """
+صنّف كل بند من بنود الفواتير التالية في فئة محاسبية قصيرة (كلمة أو كلمتان).
+استخدم إحدى الفئات المعروفة إذا كانت مناسبة، ولا تنشئ فئة جديدة إلا عند الضرورة.
+الفئات المعروفة: {categories}
+
+البنود:
+{items}
+
+أخرج JSON فقط بالشكل: {{"0": "الفئة", "1": "الفئة", ...}}
+"""
+
+# Used when a tenant has no categorized items yet
+DEFAULT_CATEGORIES = ["صيانة", "أثاث", "تسويق", "زهور", "مواد بناء", "خدمات", "برمجيات", "أجهزة", "مرافق", "نقل"]
+
+_NUMBERS_RE = re.compile(r"\d+(?:[.,]\d+)*")
+
+
+def description_key(description: Optional[str]) -> str:
+    """
+    Lookup key for an item description: normalized Arabic, with numbers (sizes, batch
+    and serial numbers, dates) folded so monthly variants of the same line share a key.
+    """
+    return _NUMBERS_RE.sub("#", normalize_arabic(description or ""))
+
+
+class ItemCategorizer:
+    """
+    Per-tenant memory of normalized item description -> category, learned from completed
+    FinanceInvoiceItem rows (majority category per description). Hits are assigned locally;
+    only unknown descriptions are sent to the model, all in one classification call.
+    Maps are reloaded after ITEM_CATEGORY_REFRESH_SECONDS so workers converge through the DB.
+    """
+
+    def __init__(self, max_tenants: int, refresh_seconds: int):
+        self.max_tenants = max_tenants
+        self.refresh_seconds = refresh_seconds
+        self._maps: OrderedDict = OrderedDict() # tenant_id -> (loaded_at, {key: category}, Counter(category))
+
+    async def _tenant_map(self, db: AsyncSession, tenant_id: int):
+        entry = self._maps.get(tenant_id)
+        if entry and time.monotonic() - entry[0] < self.refresh_seconds:
+            self._maps.move_to_end(tenant_id)
+            return entry
+
+        stmt = (
+            select(FinanceInvoiceItem.description, FinanceInvoiceItem.category, func.count())
+            .join(FinanceInvoice, FinanceInvoice.id == FinanceInvoiceItem.invoice_id)
+            .where(
+                FinanceInvoice.tenant_id == tenant_id,
+                FinanceInvoiceItem.tenant_id == tenant_id, # Partition pruning (see models/partitioning)
+                FinanceInvoice.extraction_status == "completed",
+                FinanceInvoiceItem.category.isnot(None),
+            )
+            .group_by(FinanceInvoiceItem.description, FinanceInvoiceItem.category)
+        )
+        votes: Dict[str, Counter] = {}
+        for description, category, count in (await db.execute(stmt)).all():
+            key = description_key(description)
+            if key and category:
+                votes.setdefault(key, Counter())[category] += count
+
+        categories = Counter()
+        mapping = {}
+        for key, counter in votes.items():
+            mapping[key] = counter.most_common(1)[0][0]
+            categories[mapping[key]] += sum(counter.values())
+
+        entry = (time.monotonic(), mapping, categories)
+        self._maps[tenant_id] = entry
+        self._maps.move_to_end(tenant_id)
+        while len(self._maps) > self.max_tenants:
+            self._maps.popitem(last=False)
+        logger.info(f"Item categories: loaded {len(mapping)} descriptions for tenant {tenant_id}")
+        return entry
+
+    async def categorize(self, db: AsyncSession, tenant_id: int, items: List[InvoiceItemExtract], api_key: Optional[str] = None) -> dict:
+        """
+        Sets `category` on every item in place. Returns hit/miss counts.
+        """
+        _, mapping, categories = await self._tenant_map(db, tenant_id)
+
+        misses: Dict[str, List[InvoiceItemExtract]] = OrderedDict()
+        for item in items:
+            key = description_key(item.description)
+            if key in mapping:
+                item.category = mapping[key]
+            elif key:
+                misses.setdefault(key, []).append(item)
+
+        hits = len(items) - sum(len(group) for group in misses.values())
+        if misses:
+            learned = await self._classify(tenant_id, list(misses.values()), categories, api_key)
+            for key, category in zip(misses.keys(), learned):
+                if not category:
+                    continue
+                mapping[key] = category
+                categories[category] += len(misses[key])
+                for item in misses[key]:
+                    item.category = category
+
+        logger.info(f"Item categories for tenant {tenant_id}: {hits} local hits, {len(misses)} classified by the model")
+        return {"hits": hits, "misses": len(misses)}
+
+    async def _classify(self, tenant_id: int, groups: List[List[InvoiceItemExtract]], categories: Counter, api_key: Optional[str]) -> List[Optional[str]]:
+        """
+        One model call for all unknown descriptions (split only above ITEM_CATEGORY_BATCH_MAX).
+        Returns one category (or None) per group; on failure existing categories are kept.
+        """
+        known = [c for c, _ in categories.most_common(50)] or DEFAULT_CATEGORIES
+        canonical = {normalize_arabic(c): c for c in known}
+        results: List[Optional[str]] = []
+
+        batch_max = settings.ITEM_CATEGORY_BATCH_MAX
+        for start in range(0, len(groups), batch_max):
+            batch = groups[start:start + batch_max]
+            prompt = CATEGORIZE_PROMPT.format(
+                categories="، ".join(known),
+                items="\n".join(f"{i}. {group[0].description}" for i, group in enumerate(batch)),
+            )
+            response_text = await gemini_service.generate_answer(
+                query=prompt,
+                file_uris=[],
+                role="accountant",
+                company="Unknown",
+                system_instruction=CATEGORIZE_INSTRUCTION,
+                api_key=api_key,
+                task="categorize",
+                tenant_id=tenant_id
+            )
+
+            answer = {}
+            if response_text != FALLBACK_ANSWER:
+                try:
+                    cleaned = response_text.replace("```json", "").replace("```", "").strip()
+                    answer = json.loads(cleaned[cleaned.find("{"):cleaned.rfind("}") + 1])
+                except ValueError:
+                    logger.error(f"Item categorization returned invalid JSON: {response_text}")
+
+            for i, group in enumerate(batch):
+                category = str(answer.get(str(i)) or "").strip()[:100]
+                if not category:
+                    results.append(group[0].category) # Keep whatever the extraction gave, if anything
+                    continue
+                # Snap spelling variants onto the known category
+                results.append(canonical.get(normalize_arabic(category), category))
+        return results
+
+item_categorizer = ItemCategorizer(settings.ITEM_CATEGORY_MAX_TENANTS, settings.ITEM_CATEGORY_REFRESH_SECONDS)
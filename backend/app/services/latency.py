@@ -0,0 +1,144 @@
+import time
+import asyncio
+import logging
+import threading
+from collections import deque
+from typing import Awaitable, Callable, Dict, Optional, TypeVar
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class LatencyTracker:
+    """
+    Sliding window of recent call latencies per key (route: task/tier/model), per worker.
+    Timeouts and hedge delays are read from its percentiles, so they follow the
+    upstream's actual behaviour instead of a fixed guess.
+    """
+
+    def __init__(self, window: int, min_samples: int):
+        self.window = window
+        self.min_samples = min_samples
+        self._samples: Dict[str, deque] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, key: str, seconds: float):
+        with self._lock:
+            self._samples.setdefault(key, deque(maxlen=self.window)).append(seconds)
+
+    def percentile(self, key: str, q: float) -> Optional[float]:
+        """
+        q in [0, 1]. None until the key has `min_samples` observations.
+        """
+        with self._lock:
+            samples = sorted(self._samples.get(key, ()))
+        if len(samples) < self.min_samples:
+            return None
+        return samples[min(len(samples) - 1, int(q * len(samples)))]
+
+    def timeout_for(self, key: str) -> float:
+        p99 = self.percentile(key, 0.99)
+        if p99 is None:
+            return settings.GEMINI_TIMEOUT_DEFAULT_SECONDS
+        return min(max(p99 * settings.GEMINI_TIMEOUT_P99_MULTIPLIER, settings.GEMINI_TIMEOUT_MIN_SECONDS), settings.GEMINI_TIMEOUT_MAX_SECONDS)
+
+    def stats(self, key: str) -> dict:
+        with self._lock:
+            count = len(self._samples.get(key, ()))
+        return {
+            "samples": count,
+            "p50": self.percentile(key, 0.50),
+            "p95": self.percentile(key, 0.95),
+            "p99": self.percentile(key, 0.99),
+            "timeout": self.timeout_for(key),
+        }
+
+
+class HedgeBudget:
+    """
+    Token bucket: every primary request earns `ratio` tokens (up to `burst`), every hedge
+    spends one. Extra upstream load stays below `ratio` of the traffic, even during an
+    outage when every request is slow.
+    """
+
+    def __init__(self, ratio: float, burst: float):
+        self.ratio = ratio
+        self.burst = burst
+        self._tokens = burst
+        self._lock = threading.Lock()
+
+    def earn(self):
+        with self._lock:
+            self._tokens = min(self.burst, self._tokens + self.ratio)
+
+    def take(self) -> bool:
+        with self._lock:
+            if self._tokens >= 1.0:
+                self._tokens -= 1.0
+                return True
+            return False
+
+
+latency_tracker = LatencyTracker(settings.GEMINI_LATENCY_WINDOW, settings.GEMINI_LATENCY_MIN_SAMPLES)
+hedge_budget = HedgeBudget(settings.GEMINI_HEDGE_BUDGET_RATIO, settings.GEMINI_HEDGE_BUDGET_BURST)
+
+
+async def call_with_deadline(key: str, call: Callable[[], Awaitable[T]], hedge: bool = False) -> T:
+    """
+    Runs `call()` under an adaptive timeout (p99 x multiplier for `key`). With `hedge`, a
+    duplicate is started once the primary has taken longer than the p95 (budget permitting);
+    the first successful result wins and the other call is cancelled.
+    Raises asyncio.TimeoutError when nothing succeeded in time, or the last call's error.
+    """
+    loop = asyncio.get_running_loop()
+    timeout = latency_tracker.timeout_for(key)
+    deadline = loop.time() + timeout
+    hedge_delay = latency_tracker.percentile(key, settings.GEMINI_HEDGE_PERCENTILE) if hedge else None
+    hedge_budget.earn()
+
+    started: Dict[asyncio.Task, float] = {}
+
+    def _start():
+        task = asyncio.ensure_future(call())
+        started[task] = loop.time()
+        return task
+
+    pending = {_start()}
+    error: Optional[BaseException] = None
+    try:
+        while pending:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            can_hedge = hedge_delay is not None and len(started) == 1 and hedge_delay < timeout
+            wait_for = min(remaining, max(0.0, hedge_delay - (loop.time() - min(started.values())))) if can_hedge else remaining
+            done, pending = await asyncio.wait(pending, timeout=wait_for, return_when=asyncio.FIRST_COMPLETED)
+
+            for task in done:
+                if task.exception() is None:
+                    latency_tracker.observe(key, loop.time() - started[task])
+                    if len(started) > 1:
+                        logger.info(f"Hedged call for {key}: {'hedge' if task is not next(iter(started)) else 'primary'} won")
+                    return task.result()
+                error = task.exception()
+
+            if not done and can_hedge:
+                if hedge_budget.take():
+                    logger.info(f"Hedging call for {key} after {hedge_delay:.2f}s")
+                    pending.add(_start())
+                else:
+                    hedge_delay = None # Budget spent: just wait for the primary
+            elif not pending and error is not None:
+                raise error
+    finally:
+        for task in pending:
+            task.cancel()
+
+    if error is not None and not pending:
+        raise error
+    # Timed out: count it at the timeout so the percentiles move up under sustained slowness
+    latency_tracker.observe(key, timeout)
+    raise asyncio.TimeoutError(f"{key} did not answer within {timeout:.1f}s")
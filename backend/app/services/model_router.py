@@ -0,0 +1,122 @@
+import time
+import logging
+import threading
+from typing import Dict, NamedTuple, Optional
+
+from sqlalchemy import select
+
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal
+from app.models.tenant import Tenant
+from app.schemas.routing import ModelRoutingPolicy
+from app.services.latency import LatencyTracker
+
+logger = logging.getLogger(__name__)
+
+TIERS = ("fast", "standard", "deep") # Cheapest first
+
+
+class Route(NamedTuple):
+    task: str
+    tier: str
+    model: str
+    reason: str
+
+    @property
+    def key(self) -> str:
+        return f"{self.task}/{self.tier}/{self.model}"
+
+
+class ModelRouter:
+    """
+    Picks the model tier of each generation call instead of sending everything to one model:
+    - summary / categorize: short prompts with a fixed output shape -> fast
+    - extraction: structured JSON from one document -> standard
+    - chat: fast without attachments and with a short prompt; deep for large attachments,
+      very long prompts, or multi-document questions from analyst roles; standard otherwise
+    Tenants can pin tasks, swap models and cap the tier (Tenant.ai_config["model_routing"]).
+    Latency, tokens and estimated cost are kept per route (per worker) for /routing/stats.
+    """
+
+    def __init__(self):
+        self._policies: Dict[int, tuple] = {} # tenant_id -> (policy, expires_at)
+        self._latency = LatencyTracker(settings.GEMINI_LATENCY_WINDOW, min_samples=1)
+        self._stats: Dict[str, dict] = {}
+        self._lock = threading.Lock()
+
+    async def policy(self, tenant_id: Optional[int]) -> ModelRoutingPolicy:
+        if tenant_id is None:
+            return ModelRoutingPolicy()
+        entry = self._policies.get(tenant_id)
+        if entry and entry[1] > time.monotonic():
+            return entry[0]
+
+        try:
+            async with AsyncSessionLocal() as db:
+                ai_config = (await db.execute(select(Tenant.ai_config).where(Tenant.id == tenant_id))).scalar()
+            policy = ModelRoutingPolicy(**((ai_config or {}).get("model_routing") or {}))
+        except Exception as e:
+            logger.error(f"Routing policy for tenant {tenant_id} could not be loaded, using defaults: {e}")
+            policy = ModelRoutingPolicy()
+        self._policies[tenant_id] = (policy, time.monotonic() + settings.MODEL_ROUTING_POLICY_TTL_SECONDS)
+        return policy
+
+    def invalidate(self, tenant_id: int):
+        self._policies.pop(tenant_id, None)
+
+    def choose(self, task: str, policy: ModelRoutingPolicy, prompt_chars: int = 0, attachment_bytes: int = 0, attachments: int = 0, role: Optional[str] = None) -> Route:
+        if task in policy.tasks:
+            tier, reason = policy.tasks[task], "tenant pinned"
+        elif not settings.GEMINI_ROUTING_ENABLED:
+            tier, reason = "standard", "routing disabled"
+        elif task in ("summary", "categorize"):
+            tier, reason = "fast", task
+        elif task == "extraction":
+            tier, reason = "standard", task
+        elif attachment_bytes >= settings.GEMINI_ROUTE_DEEP_MIN_ATTACHMENT_BYTES:
+            tier, reason = "deep", "large attachments"
+        elif prompt_chars >= settings.GEMINI_ROUTE_DEEP_MIN_PROMPT_CHARS:
+            tier, reason = "deep", "long prompt"
+        elif attachments > 1 and role in (policy.deep_roles if policy.deep_roles is not None else settings.GEMINI_ROUTE_DEEP_ROLES):
+            tier, reason = "deep", f"multi-document {role}"
+        elif attachments == 0 and prompt_chars <= settings.GEMINI_ROUTE_FAST_MAX_PROMPT_CHARS:
+            tier, reason = "fast", "short prompt"
+        else:
+            tier, reason = "standard", "default"
+
+        if policy.max_tier and TIERS.index(tier) > TIERS.index(policy.max_tier):
+            tier, reason = policy.max_tier, f"{reason}, capped"
+
+        model = policy.models.get(tier) or {
+            "fast": settings.GEMINI_FAST_MODEL,
+            "standard": settings.GEMINI_STANDARD_MODEL,
+            "deep": settings.GEMINI_DEEP_MODEL,
+        }[tier]
+        return Route(task, tier, model, reason)
+
+    def record(self, route: Route, seconds: float, ok: bool = True, input_tokens: int = 0, output_tokens: int = 0):
+        price_in, price_out = settings.GEMINI_MODEL_PRICES.get(route.model, (0.0, 0.0))
+        with self._lock:
+            stats = self._stats.setdefault(route.key, {
+                "task": route.task, "tier": route.tier, "model": route.model,
+                "calls": 0, "failures": 0, "input_tokens": 0, "output_tokens": 0, "cost_usd": 0.0,
+            })
+            stats["calls"] += 1
+            stats["failures"] += 0 if ok else 1
+            stats["input_tokens"] += input_tokens
+            stats["output_tokens"] += output_tokens
+            stats["cost_usd"] += (input_tokens * price_in + output_tokens * price_out) / 1_000_000
+        if ok:
+            self._latency.observe(route.key, seconds)
+
+    def stats(self) -> list:
+        with self._lock:
+            routes = [dict(s) for s in self._stats.values()]
+        for stats in routes:
+            key = f"{stats['task']}/{stats['tier']}/{stats['model']}"
+            stats["p50_seconds"] = self._latency.percentile(key, 0.50)
+            stats["p95_seconds"] = self._latency.percentile(key, 0.95)
+            stats["cost_usd"] = round(stats["cost_usd"], 6)
+        return sorted(routes, key=lambda s: s["cost_usd"], reverse=True)
+
+model_router = ModelRouter()
@@ -0,0 +1,259 @@
+import hmac
+import json
+import time
+import socket
+import asyncio
+import hashlib
+import logging
+import ipaddress
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, Optional, Sequence, Tuple
+from urllib.parse import urlsplit
+
+from sqlalchemy import select, delete, insert, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.cache import cache
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal
+from app.models.finance import FinanceInvoice
+from app.models.outbox import OutboxEvent, OutboxConsumer
+
+logger = logging.getLogger(__name__)
+
+# (topic, entity_id, payload)
+Event = Tuple[str, Optional[int], Optional[dict]]
+
+# Positions are handed out in id order to committed, not yet sequenced events. Runs under the
+# dispatcher lock; the unique index on position rejects a concurrent sequencer on another host.
+SEQUENCE = """
+    UPDATE outbox_events SET position = s.base + s.rn
+    FROM (
+        SELECT id,
+               (SELECT COALESCE(MAX(position), 0) FROM outbox_events) AS base,
+               ROW_NUMBER() OVER (ORDER BY id) AS rn
+        FROM outbox_events
+        WHERE position IS NULL
+        ORDER BY id
+        LIMIT :batch
+    ) AS s
+    WHERE outbox_events.id = s.id
+"""
+
+
+def invoice_event(topic: str, invoice: FinanceInvoice) -> Event:
+    return (topic, invoice.id, {
+        "document_id": invoice.document_id,
+        "invoice_number": invoice.invoice_number,
+        "invoice_date": invoice.invoice_date.date().isoformat() if invoice.invoice_date else None,
+        "total_amount": invoice.total_amount,
+        "currency": invoice.currency,
+        "vendor_id": invoice.vendor_id,
+        "page_start": invoice.page_start,
+        "page_end": invoice.page_end,
+        "extraction_status": invoice.extraction_status,
+        "audit_status": invoice.audit_status,
+    })
+
+
+def public_address(address: str) -> bool:
+    """
+    False for loopback, private, link-local (cloud metadata), CGNAT and reserved addresses.
+    """
+    try:
+        ip = ipaddress.ip_address(address.strip("[]").split("%")[0])
+    except ValueError:
+        return False
+    return (getattr(ip, "ipv4_mapped", None) or ip).is_global
+
+
+async def webhook_target_error(url: str) -> Optional[str]:
+    """
+    Why `url` may not receive tenant data, None if it may. Webhooks must be HTTPS and resolve
+    only to public addresses, so a tenant cannot point the dispatcher at internal services.
+    Checked on subscribe and again before every delivery (DNS answers can change).
+    """
+    parts = urlsplit(url)
+    if parts.scheme != "https" or not parts.hostname:
+        return "Webhook URL must be https://"
+    try:
+        infos = await asyncio.get_running_loop().getaddrinfo(parts.hostname, parts.port or 443, type=socket.SOCK_STREAM)
+    except OSError as e:
+        return f"Cannot resolve {parts.hostname}: {e}"
+    blocked = sorted({info[4][0] for info in infos if not public_address(info[4][0])})
+    if blocked:
+        return f"{parts.hostname} resolves to a non-public address ({', '.join(blocked)})"
+    return None
+
+
+class Outbox:
+    """
+    Change events for downstream consumers (ERP sync), written with `record` inside the
+    transaction that makes the change, so an event exists if and only if the change committed.
+    Consumers read the per-tenant feed by cursor (`read`) or get it pushed (OutboxDispatcher);
+    both are at-least-once: a consumer may see an event again and must apply it idempotently
+    (events carry entity ids and the entity's state, not deltas).
+    Callers own the transaction (nothing is committed here).
+    """
+
+    async def record(self, db: AsyncSession, tenant_id: int, topic: str, entity_id: Optional[int] = None, payload: Optional[dict] = None):
+        await self.record_many(db, tenant_id, [(topic, entity_id, payload)])
+
+    async def record_many(self, db: AsyncSession, tenant_id: int, events: Iterable[Event]):
+        rows = [{"tenant_id": tenant_id, "topic": topic, "entity_id": entity_id, "payload": payload} for topic, entity_id, payload in events]
+        for start in range(0, len(rows), settings.OUTBOX_SEQUENCE_BATCH):
+            await db.execute(insert(OutboxEvent), rows[start:start + settings.OUTBOX_SEQUENCE_BATCH])
+
+    async def read(self, db: AsyncSession, tenant_id: int, after: int = 0, limit: int = 100, topics: Optional[Sequence[str]] = None) -> dict:
+        """
+        Sequenced events of the tenant after the `after` cursor, oldest first.
+        Pass the returned next_cursor as `after` to continue.
+        """
+        limit = max(1, min(limit, settings.OUTBOX_FEED_MAX_EVENTS))
+        stmt = select(OutboxEvent).where(
+            OutboxEvent.tenant_id == tenant_id,
+            OutboxEvent.position > after,
+        )
+        if topics:
+            stmt = stmt.where(OutboxEvent.topic.in_(list(topics)))
+        rows = (await db.execute(stmt.order_by(OutboxEvent.position).limit(limit + 1))).scalars().all()
+        events = [
+            {"position": e.position, "topic": e.topic, "entity_id": e.entity_id, "payload": e.payload, "created_at": e.created_at}
+            for e in rows[:limit]
+        ]
+        return {
+            "events": events,
+            "next_cursor": events[-1]["position"] if events else after,
+            "has_more": len(rows) > limit,
+        }
+
+
+class OutboxDispatcher:
+    """
+    Background loop (one worker at a time, shared lock):
+    - sequences newly committed events (assigns feed positions)
+    - pushes each webhook consumer's backlog in batches, advancing its cursor only after a
+      2xx response (at-least-once; failing consumers back off exponentially)
+    - prunes sequenced events past the retention period
+    """
+
+    def __init__(self):
+        self._wakeup = asyncio.Event()
+        self._retry_at: Dict[int, float] = {} # consumer id -> monotonic time of the next attempt
+        self._pruned_at = 0.0
+
+    def wake(self):
+        """
+        Asks the dispatcher to run now instead of waiting for the next interval.
+        """
+        self._wakeup.set()
+
+    async def run_forever(self):
+        while True:
+            try:
+                # Every worker runs a dispatcher; the shared lock lets only one of them sequence / deliver
+                async with cache.lock("outbox", timeout=max(60.0, settings.OUTBOX_DELIVERY_TIMEOUT_SECONDS * 10), blocking=False) as acquired:
+                    if acquired:
+                        await self.sequence()
+                        await self.deliver()
+                        if time.monotonic() - self._pruned_at > 3600:
+                            await self.prune()
+                            self._pruned_at = time.monotonic()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Outbox pass failed: {e}")
+
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=settings.OUTBOX_INTERVAL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+    async def sequence(self) -> int:
+        sequenced = 0
+        while True:
+            async with AsyncSessionLocal() as db:
+                result = await db.execute(text(SEQUENCE), {"batch": settings.OUTBOX_SEQUENCE_BATCH})
+                await db.commit()
+            sequenced += result.rowcount
+            if result.rowcount < settings.OUTBOX_SEQUENCE_BATCH:
+                return sequenced
+
+    async def deliver(self) -> int:
+        async with AsyncSessionLocal() as db:
+            consumers = (await db.execute(select(OutboxConsumer))).scalars().all()
+        now = time.monotonic()
+        consumers = [c for c in consumers if self._retry_at.get(c.id, 0.0) <= now]
+        if not consumers:
+            return 0
+
+        import httpx
+
+        delivered = 0
+        async with httpx.AsyncClient(timeout=settings.OUTBOX_DELIVERY_TIMEOUT_SECONDS) as client:
+            for consumer in consumers:
+                delivered += await self._deliver_to(client, consumer)
+        return delivered
+
+    async def _deliver_to(self, client, consumer: OutboxConsumer, max_batches: int = 10) -> int:
+        delivered = 0
+        for _ in range(max_batches):
+            async with AsyncSessionLocal() as db:
+                batch = await outbox.read(db, consumer.tenant_id, consumer.cursor, settings.OUTBOX_DELIVERY_BATCH)
+                if not batch["events"]:
+                    return delivered
+
+                body = json.dumps({"tenant_id": consumer.tenant_id, **batch}, ensure_ascii=False, default=str).encode("utf-8")
+                headers = {"Content-Type": "application/json", "X-Outbox-Cursor": str(batch["next_cursor"])}
+                if consumer.secret:
+                    signature = hmac.new(consumer.secret.encode("utf-8"), body, hashlib.sha256).hexdigest()
+                    headers["X-Outbox-Signature"] = f"sha256={signature}"
+
+                error = await webhook_target_error(consumer.url)
+                if error is None:
+                    try:
+                        # Redirects are not followed (httpx default): they could lead to an internal host
+                        response = await client.post(consumer.url, content=body, headers=headers)
+                        if response.status_code >= 300:
+                            error = f"HTTP {response.status_code}"
+                    except Exception as e:
+                        error = str(e) or type(e).__name__
+
+                row = await db.get(OutboxConsumer, consumer.id)
+                if row is None: # Unsubscribed meanwhile
+                    return delivered
+                if error:
+                    row.failures += 1
+                    row.last_error = error[:1000]
+                    await db.commit()
+                    backoff = min(2 ** row.failures, settings.OUTBOX_RETRY_MAX_SECONDS)
+                    self._retry_at[consumer.id] = time.monotonic() + backoff
+                    logger.warning(f"Outbox: delivery to consumer {consumer.id} failed ({error}), retrying in {backoff}s")
+                    return delivered
+
+                row.cursor = consumer.cursor = batch["next_cursor"]
+                row.failures, row.last_error = 0, None
+                row.delivered_at = datetime.now(timezone.utc)
+                await db.commit()
+                self._retry_at.pop(consumer.id, None)
+                delivered += len(batch["events"])
+                if not batch["has_more"]:
+                    return delivered
+        return delivered
+
+    async def prune(self) -> int:
+        cutoff = datetime.now(timezone.utc) - timedelta(days=settings.OUTBOX_RETENTION_DAYS)
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(delete(OutboxEvent).where(
+                OutboxEvent.position.isnot(None),
+                OutboxEvent.created_at < cutoff,
+            ))
+            await db.commit()
+        if result.rowcount:
+            logger.info(f"Outbox: pruned {result.rowcount} events")
+        return result.rowcount
+
+
+outbox = Outbox()
+outbox_dispatcher = OutboxDispatcher()
@@ -4,16 +4,27 @@ from fastapi import UploadFile, HTTPException
 from app.models.document import Document
 from app.models.tenant import Tenant, User
 from app.models.finance import FinanceInvoice, FinanceInvoiceItem, FinanceAuditFlag
-from sqlalchemy import select, delete, text
+from sqlalchemy import select, update, func
 from sqlalchemy.orm import selectinload
-from app.services.gemini import gemini_service
-import shutil
-import os
-import uuid
+from app.services.gemini import gemini_service, FALLBACK_ANSWER
+from app.core.cache import cache
+from app.core.config import settings
+from app.services.remote_gc import remote_gc
+from app.services.blob_store import blob_store
+from app.services.tenant_service import tenant_service
+from app.services.vendor_risk import vendor_risk
+from app.services.response_snapshots import bump_invoices
+from app.services.finance_analytics import finance_analytics
+from app.services.document_splitter import document_splitter
+from app.services.document_versions import document_versions
+from app.services.outbox import outbox, outbox_dispatcher
+from app.core.events import event_bus
+import asyncio
+import hashlib
+import json
+import mimetypes
 
-# Temp storage for uploaded files before sending to Gemini
-UPLOAD_DIR = "backend/temp_uploads"
-os.makedirs(UPLOAD_DIR, exist_ok=True)
+EVICTED_DETAIL = "Local copy not available (evicted); please upload the file again."
 
 class RAGService:
     async def upload_document(self, db: AsyncSession, file: UploadFile, tenant_id: int, force: bool = False):
@@ -21,10 +32,16 @@ class RAGService:
         Vertical SaaS Upload:
         - Linked to Tenant (not Workspace).
         - Default Access: General (for now, can be parameterized).
+        - Forced re-upload of an existing file: becomes the next version of that Document
+          (see DocumentVersionService); identical content is a no-op.
         """
+        # Tenant's own Gemini key (BYOK), None = system key
+        api_key = await tenant_service.get_api_key(db, tenant_id)
+
         # 0. Check for Duplicates (Gemini Level)
         # We check by filename for simplicity in this MVP
-        existing_file = await gemini_service.check_file_exists(file.filename)
+        existing_file = await gemini_service.check_file_exists(file.filename, api_key=api_key)
+        lineage = None
         
         if existing_file:
             if not force:
@@ -35,77 +52,146 @@ class RAGService:
                     headers={"X-Duplicate-Of": existing_file.name}
                 )
             else:
-                # Force Overwrite: Delete old file from Gemini & DB
+                # Force Overwrite: the newest matching Document gets a new version; other
+                # duplicates are soft-deleted (remote file and finance rows purged later by the remote GC)
                 print(f"DEBUG: Force Overwrite triggered for {existing_file.name}")
                 try:
-                    await gemini_service.delete_file(existing_file.name)
-                    print(f"DEBUG: Gemini file deleted")
-                except Exception as e:
-                    print(f"DEBUG: Gemini delete failed (ignoring): {e}")
+                    matching = (
+                        Document.tenant_id == tenant_id,
+                        Document.deleted_at.is_(None),
+                        (Document.file_uri == existing_file.uri) | (Document.filename == file.filename),
+                    )
+                    stmt = select(Document).where(*matching).order_by(Document.id.desc()).limit(1)
+                    lineage = (await db.execute(stmt)).scalars().first()
+                    overwritten = matching if lineage is None else (*matching, Document.id != lineage.id)
+                    stmt = select(Document.id).where(*overwritten)
+                    overwritten_ids = (await db.execute(stmt)).scalars().all()
 
-                try:
-                    # Clean up DB (Raw SQL "Nuclear Option")
-                    # Bypass ORM session cache to ensure deletion propagates to DB immediately
-                    stmt = select(Document).where(Document.file_uri == existing_file.uri)
-                    result = await db.execute(stmt)
-                    old_doc = result.scalars().first()
-                    
-                    if old_doc:
-                        doc_id = old_doc.id
-                        
-                        # Use text() for raw SQL to guarantee execution order and visibility
-                        await db.execute(text("DELETE FROM finance_invoice_items WHERE invoice_id IN (SELECT id FROM finance_invoices WHERE document_id = :did)"), {"did": doc_id})
-                        await db.execute(text("DELETE FROM finance_audit_flags WHERE invoice_id IN (SELECT id FROM finance_invoices WHERE document_id = :did)"), {"did": doc_id})
-                        await db.execute(text("DELETE FROM finance_invoices WHERE document_id = :did"), {"did": doc_id})
-                        await db.execute(text("DELETE FROM documents WHERE id = :did"), {"did": doc_id})
-                        
-                        await db.commit()
+                    # Their invoices stop counting towards vendor risk right away
+                    stmt = select(FinanceInvoice.id).join(Document, Document.id == FinanceInvoice.document_id).where(*overwritten)
+                    overwritten_invoice_ids = list((await db.execute(stmt)).scalars().all())
+                    await vendor_risk.forget_invoices(db, overwritten_invoice_ids)
+
+                    stmt = update(Document).where(*overwritten).values(deleted_at=func.now(), status="deleted")
+                    await db.execute(stmt)
+                    await outbox.record_many(db, tenant_id, [
+                        *(("document.deleted", document_id, None) for document_id in overwritten_ids),
+                        *(("invoice.deleted", invoice_id, None) for invoice_id in overwritten_invoice_ids),
+                    ])
+                    await db.commit()
+                    await bump_invoices(tenant_id, bulk=True)
+                    await finance_analytics.export_invoices(tenant_id, overwritten_invoice_ids) # Tombstones
+                    for document_id in overwritten_ids:
+                        await event_bus.publish(tenant_id, {"type": "document", "id": document_id, "status": "deleted"})
+                    remote_gc.wake()
                 except Exception as e:
-                    print(f"DEBUG: DB Delete failed: {e}")
+                    print(f"DEBUG: DB soft delete failed: {e}")
                     await db.rollback()
                     raise HTTPException(status_code=500, detail=f"Overwrite failed during DB cleanup: {str(e)}")
-        
-        # 1. Save locally
-        file_ext = os.path.splitext(file.filename)[1]
-        unique_filename = f"{uuid.uuid4()}{file_ext}"
-        local_path = os.path.join(UPLOAD_DIR, unique_filename)
-        
-        with open(local_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
+
+        # 1. Save locally (content-addressed: identical files are stored once)
+        content_hash, file_size = await asyncio.to_thread(blob_store.put, file.file)
+        if lineage is not None and lineage.content_hash == content_hash:
+            return lineage
+
+        # Per-page fingerprints: the next version re-extracts / re-indexes changed pages only
+        page_fingerprints = None
+        if (file.filename or "").lower().endswith(".pdf"):
+            with blob_store.open_mmap(content_hash) as data:
+                if data is not None:
+                    page_fingerprints = await asyncio.to_thread(document_splitter.page_fingerprints, data) or None
 
         # 2. Determine mime type
         mime_type = file.content_type or "application/pdf"
         
         try:
-            # 3. Check for Custom API Key (BYOK)
-            # In a real implementation we would query Tenant.gemini_api_key here
-            # gemini_service.configure_for_tenant(...) 
-            
-            # Upload to Gemini
-            gemini_file = await gemini_service.upload_file(
-                file_path=local_path, 
-                mime_type=mime_type, 
-                display_name=file.filename
-            )
+            # 3. Upload to Gemini with the tenant's key, straight from the blob
+            # (pinned so it cannot be evicted mid-upload)
+            with blob_store.pinned(content_hash) as blob_path:
+                if blob_path is None: # Evicted by another worker since it was stored
+                    raise HTTPException(status_code=409, detail=EVICTED_DETAIL)
+                gemini_file = await gemini_service.upload_file(
+                    file_path=blob_path, 
+                    mime_type=mime_type, 
+                    display_name=file.filename,
+                    api_key=api_key
+                )
             
-            # 4. Create DB Entry
-            new_doc = Document(
-                filename=file.filename,
-                tenant_id=tenant_id,
-                file_uri=gemini_file.uri,
-                status="indexing", # simple string now
-                access_level="general" # Default
-            )
-            db.add(new_doc)
+            # 4. Create DB Entry (or the next version of the existing one)
+            if lineage is not None:
+                old_uri = lineage.file_uri
+                new_doc = await document_versions.new_version(
+                    db, lineage, file.filename, gemini_file.uri, content_hash, file_size, page_fingerprints
+                )
+            else:
+                old_uri = None
+                new_doc = Document(
+                    filename=file.filename,
+                    tenant_id=tenant_id,
+                    file_uri=gemini_file.uri,
+                    content_hash=content_hash, # Local copy for text-layer extraction / re-upload
+                    file_size=file_size,
+                    page_fingerprints=page_fingerprints,
+                    status="indexing", # simple string now
+                    access_level="general" # Default
+                )
+                db.add(new_doc)
+            await db.flush()
+            await outbox.record(db, tenant_id, "document.versioned" if lineage is not None else "document.uploaded", new_doc.id, {
+                "filename": new_doc.filename, "version": new_doc.version, "content_hash": content_hash,
+            })
             await db.commit()
             await db.refresh(new_doc)
-            
-            return new_doc
+            outbox_dispatcher.wake()
+        except HTTPException:
+            raise
         except Exception as e:
             await db.rollback()
             raise HTTPException(status_code=500, detail=f"Upload failed: {str(e)}")
 
-    async def chat_with_tenant(self, db: AsyncSession, tenant_id: int, user: User, query: str):
+        if old_uri and old_uri != new_doc.file_uri:
+            # The previous version stays queryable from the DB and its local blob, not the remote copy
+            remote_gc.release(old_uri, api_key)
+        return new_doc
+
+    async def reupload_document(self, db: AsyncSession, document: Document):
+        """
+        Re-sends a document to Gemini from the local blob store (e.g. after the remote file
+        expired and reconcile marked it "missing"), without asking the user to upload again.
+        """
+        evicted = HTTPException(status_code=409, detail=EVICTED_DETAIL)
+        if not blob_store.exists(document.content_hash):
+            raise evicted
+
+        mime_type = mimetypes.guess_type(document.filename or "")[0] or "application/pdf"
+        api_key = await tenant_service.get_api_key(db, document.tenant_id)
+        old_uri = document.file_uri
+        try:
+            with blob_store.pinned(document.content_hash) as blob_path:
+                if blob_path is None: # Evicted by another worker since the check above
+                    raise evicted
+                gemini_file = await gemini_service.upload_file(
+                    file_path=blob_path,
+                    mime_type=mime_type,
+                    display_name=document.filename,
+                    api_key=api_key
+                )
+            document.file_uri = gemini_file.uri
+            document.status = "indexing"
+            db.add(document)
+            await db.commit()
+            await db.refresh(document)
+        except HTTPException:
+            raise
+        except Exception as e:
+            await db.rollback()
+            raise HTTPException(status_code=500, detail=f"Re-upload failed: {str(e)}")
+
+        if old_uri and old_uri != document.file_uri:
+            remote_gc.release(old_uri, api_key)
+        return document
+
+    async def chat_with_tenant(self, db: AsyncSession, tenant_id: int, user: User, query: str, history: str = None):
         """
         Retrieves docs accessible to User's Role and queries Gemini.
         """
@@ -113,6 +199,7 @@ class RAGService:
         # Logic: Get 'general' docs + docs matching user.role
         stmt = select(Document).where(
             Document.tenant_id == tenant_id,
+            Document.deleted_at.is_(None),
             # (Document.access_level == "general") | (Document.access_level == user.role)
             # For MVP, let's just use all tenant docs
         )
@@ -130,13 +217,27 @@ class RAGService:
         if user.tenant and user.tenant.company_name:
              company_name = user.tenant.company_name
 
-        # 3. Call Gemini with Vertical Context
+        # 3. Shared answer cache: same question over the same documents/context from any worker.
+        # Document changes alter file_uris, so stale answers are never served for new content.
+        key_source = json.dumps([tenant_id, user.role, company_name, sorted(file_uris), history or "", query], ensure_ascii=False)
+        cache_key = "answer:" + hashlib.sha256(key_source.encode("utf-8")).hexdigest()
+        cached = await cache.get(cache_key)
+        if cached is not None:
+            return cached
+
+        # 4. Call Gemini with Vertical Context
         answer = await gemini_service.generate_answer(
             query=query, 
             file_uris=file_uris,
             role=user.role,       # Pass User Role (Engineer, Hr, etc)
-            company=company_name  # Pass Company Name
+            company=company_name, # Pass Company Name
+            history=history,      # Bounded session context (summary + recent turns)
+            api_key=await tenant_service.get_api_key(db, tenant_id),
+            tenant_id=tenant_id
         )
+
+        if answer != FALLBACK_ANSWER:
+            await cache.set(cache_key, answer, ttl=settings.ANSWER_CACHE_TTL_SECONDS)
         
         return answer
 
@@ -0,0 +1,210 @@
+import asyncio
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional, Tuple
+
+from sqlalchemy import select, delete, update, tuple_
+
+from app.core.cache import cache
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal
+from app.models.document import Document, DocumentVersion
+from app.services.gemini import gemini_service
+from app.services.blob_store import blob_store
+from app.services.tenant_service import tenant_service
+
+logger = logging.getLogger(__name__)
+
+
+def remote_file_name(file_uri: str) -> str:
+    # URI format assumption: https://.../files/xxxx
+    if file_uri and "/files/" in file_uri:
+        return "files/" + file_uri.split("/files/")[-1]
+    return file_uri
+
+
+class RemoteGarbageCollector:
+    """
+    Deletes Gemini files of soft-deleted documents in the background, then hard-deletes
+    the rows (finance rows follow via ON DELETE CASCADE). Periodically reconciles the DB
+    with the remote file listing to catch orphans left by crashes or failed deletes.
+    """
+
+    def __init__(self):
+        self._wakeup = asyncio.Event()
+        self._passes = 0
+        self._released: List[Tuple[str, Optional[str]]] = [] # (file uri, api key) no longer referenced
+
+    def wake(self):
+        """
+        Asks the collector to run now instead of waiting for the next interval.
+        """
+        self._wakeup.set()
+
+    def release(self, file_uri: str, api_key: Optional[str] = None):
+        """
+        Queues the remote file of a replaced upload (previous version, re-upload) for deletion on
+        the next pass, so uploads do not wait for it. In-process only: files lost in a crash are
+        unreferenced and reconcile deletes them after the grace period.
+        """
+        self._released.append((file_uri, api_key))
+        self.wake()
+
+    async def run_forever(self):
+        while True:
+            try:
+                # Deletes are idempotent: every worker drains its own queue, lock or not
+                await self.collect_released()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Remote GC: released files failed: {e}")
+
+            try:
+                # Every worker runs a collector; the shared lock lets only one of them work per pass
+                async with cache.lock("remote_gc", timeout=settings.REMOTE_GC_INTERVAL_SECONDS * 5, blocking=False) as acquired:
+                    if acquired:
+                        await self.collect_deleted()
+                        self._passes += 1
+                        if (self._passes - 1) % settings.REMOTE_GC_RECONCILE_EVERY == 0:
+                            await self.reconcile()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Remote GC pass failed: {e}")
+
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=settings.REMOTE_GC_INTERVAL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+    async def collect_released(self) -> int:
+        released, self._released = self._released, []
+        if not released:
+            return 0
+        gone = await self._delete_remote(released)
+        pending = {(remote_file_name(uri), api_key) for uri, api_key in released}
+        if len(gone) < len(pending):
+            logger.warning(f"Remote GC: {len(pending) - len(gone)} released files left for reconcile")
+        return len(gone)
+
+    async def collect_deleted(self) -> int:
+        """
+        Processes soft-deleted documents in batches. Returns how many were purged.
+        """
+        purged = 0
+        while True:
+            async with AsyncSessionLocal() as db:
+                stmt = select(Document).where(Document.deleted_at.isnot(None)).order_by(Document.deleted_at).limit(settings.REMOTE_GC_BATCH_SIZE)
+                result = await db.execute(stmt)
+                docs = result.scalars().all()
+                if not docs:
+                    return purged
+
+                # Remote files must be deleted with the key that uploaded them (tenant BYOK or system)
+                api_keys = await tenant_service.get_api_keys(db)
+                deleted_remote = await self._delete_remote([(d.file_uri, api_keys.get(d.tenant_id)) for d in docs if d.file_uri])
+                done_ids = [
+                    d.id for d in docs
+                    if not d.file_uri or (remote_file_name(d.file_uri), api_keys.get(d.tenant_id)) in deleted_remote
+                ]
+                if not done_ids:
+                    # Every remote delete failed (e.g. upstream outage) - retry next pass
+                    return purged
+
+                content_hashes = [d.content_hash for d in docs if d.id in done_ids and d.content_hash]
+                stmt = select(DocumentVersion.content_hash).where(DocumentVersion.document_id.in_(done_ids), DocumentVersion.content_hash.isnot(None))
+                content_hashes.extend((await db.execute(stmt)).scalars().all()) # Earlier versions go with the document
+
+                await db.execute(delete(Document).where(Document.id.in_(done_ids)))
+                await db.commit()
+                purged += len(done_ids)
+
+                await self._remove_unreferenced_blobs(db, content_hashes)
+                logger.info(f"Remote GC: purged {len(done_ids)} documents")
+
+                if len(done_ids) < len(docs):
+                    return purged
+
+    async def _delete_remote(self, files: List[Tuple[str, Optional[str]]]) -> set:
+        """
+        Deletes remote files, given as (uri or name, api key), with bounded concurrency.
+        Returns the (name, api key) pairs that are gone.
+        """
+        semaphore = asyncio.Semaphore(settings.REMOTE_GC_CONCURRENCY)
+        gone = set()
+
+        async def _one(name: str, api_key: Optional[str]):
+            async with semaphore:
+                try:
+                    await gemini_service.delete_file(name, missing_ok=True, api_key=api_key)
+                    gone.add((name, api_key))
+                except Exception as e:
+                    logger.warning(f"Remote GC: could not delete {name}: {e}")
+
+        await asyncio.gather(*[_one(name, api_key) for name, api_key in {(remote_file_name(uri), key) for uri, key in files}])
+        return gone
+
+    async def _remove_unreferenced_blobs(self, db, content_hashes: List[str]):
+        # Blobs are shared by identical uploads; free them only when no document (or version) is left
+        for content_hash in set(content_hashes):
+            stmt = select(Document.id).where(Document.content_hash == content_hash).limit(1)
+            if (await db.execute(stmt)).first():
+                continue
+            stmt = select(DocumentVersion.id).where(DocumentVersion.content_hash == content_hash).limit(1)
+            if (await db.execute(stmt)).first():
+                continue
+            blob_store.remove(content_hash)
+
+    async def reconcile(self):
+        """
+        - Remote files no document references (after a grace period) are deleted.
+        - Live documents whose remote file no longer exists (expired/deleted) are marked "missing".
+        """
+        async with AsyncSessionLocal() as db:
+            api_keys = await tenant_service.get_api_keys(db)
+            result = await db.execute(select(Document.id, Document.tenant_id, Document.file_uri, Document.deleted_at, Document.status))
+            rows = result.all()
+
+        # Each key (system + every BYOK key) has its own file namespace
+        rows_by_key = {None: []}
+        for key in api_keys.values():
+            rows_by_key.setdefault(key, [])
+        for r in rows:
+            rows_by_key[api_keys.get(r.tenant_id)].append(r)
+
+        orphans, missing = [], []
+        cutoff = datetime.now(timezone.utc) - timedelta(seconds=settings.REMOTE_GC_ORPHAN_GRACE_SECONDS)
+        for api_key, key_rows in rows_by_key.items():
+            try:
+                remote_files = await gemini_service.list_files(api_key=api_key)
+            except Exception as e:
+                logger.warning(f"Remote GC reconcile: could not list files: {e}")
+                continue
+            remote_names = {f.name for f in remote_files}
+
+            referenced = {remote_file_name(r.file_uri) for r in key_rows if r.file_uri}
+            orphans.extend(
+                (f.name, api_key) for f in remote_files
+                if f.name not in referenced and f.create_time and f.create_time < cutoff
+            )
+            missing.extend(
+                (r.id, r.file_uri) for r in key_rows
+                if r.file_uri and r.deleted_at is None and r.status != "missing"
+                and remote_file_name(r.file_uri) not in remote_names
+            )
+
+        if missing:
+            # Matched on the URI seen in the snapshot: a document re-uploaded while the remote
+            # listing ran has a new, existing file and must not be marked missing
+            async with AsyncSessionLocal() as db:
+                await db.execute(update(Document).where(tuple_(Document.id, Document.file_uri).in_(missing)).values(status="missing"))
+                await db.commit()
+
+        for start in range(0, len(orphans), settings.REMOTE_GC_BATCH_SIZE):
+            await self._delete_remote(orphans[start:start + settings.REMOTE_GC_BATCH_SIZE])
+
+        logger.info(f"Remote GC reconcile: {len(orphans)} orphan remote files, {len(missing)} documents missing remotely")
+
+remote_gc = RemoteGarbageCollector()
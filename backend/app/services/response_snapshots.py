@@ -0,0 +1,89 @@
+import time
+import logging
+from collections import OrderedDict
+from typing import Iterable, Optional
+
+from app.core.cache import cache
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+def _epoch() -> int:
+    # Counters (re)start from the clock, never from 1: after an eviction or a cache restart
+    # a new version can never equal an ETag that clients still hold
+    return time.time_ns() // 1000
+
+
+class ResponseSnapshots:
+    """
+    Serialized (JSON bytes) API responses keyed by version counters.
+    - Counters live in the shared cache (CACHE_BACKEND), so every worker sees a bump.
+    - Rendered bytes are kept per worker in an LRU bounded by `max_bytes`.
+    Writers call `bump()` after their commit; readers take the version *before* querying,
+    so a snapshot is never older than the version it is stored under.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._bodies: OrderedDict = OrderedDict() # (name, version) -> bytes
+        self._size = 0
+
+    async def version(self, name: str) -> int:
+        key = "ver:" + name
+        value = await cache.get(key)
+        if value is None:
+            value = _epoch()
+            await cache.set(key, value)
+        return int(value)
+
+    async def bump(self, *names: str):
+        for name in names:
+            key = "ver:" + name
+            try:
+                if await cache.incr(key) == 1: # Counter was missing (evicted / new cache)
+                    await cache.set(key, _epoch())
+            except Exception as e:
+                # A lost bump would serve stale data; dropping the counter forces a new epoch
+                logger.error(f"Snapshot version bump failed for {name}: {e}")
+                await cache.delete(key)
+
+    def get(self, name: str, version: str) -> Optional[bytes]:
+        body = self._bodies.get((name, version))
+        if body is not None:
+            self._bodies.move_to_end((name, version))
+        return body
+
+    def put(self, name: str, version: str, body: bytes):
+        if len(body) > self.max_bytes // 4:
+            return # One huge tenant must not flush everyone else
+        previous = self._bodies.pop((name, version), None)
+        if previous is not None:
+            self._size -= len(previous)
+        self._bodies[(name, version)] = body
+        self._size += len(body)
+        while self._size > self.max_bytes:
+            _, evicted = self._bodies.popitem(last=False)
+            self._size -= len(evicted)
+
+response_snapshots = ResponseSnapshots(settings.SNAPSHOT_CACHE_MAX_BYTES)
+
+
+# --- Finance invoices ---
+# list:{tenant}     any change to the tenant's invoice grid
+# bulk:{tenant}     tenant-wide changes (full audit, overwritten documents) - part of every detail ETag
+# invoice:{id}      one invoice (extraction, audit, flag resolution)
+
+async def bump_invoices(tenant_id: int, invoice_ids: Iterable[int] = (), bulk: bool = False):
+    names = [f"invoices:list:{tenant_id}"]
+    if bulk:
+        names.append(f"invoices:bulk:{tenant_id}")
+    names.extend(f"invoice:{invoice_id}" for invoice_id in set(invoice_ids))
+    await response_snapshots.bump(*names)
+
+async def invoice_list_version(tenant_id: int) -> str:
+    return str(await response_snapshots.version(f"invoices:list:{tenant_id}"))
+
+async def invoice_version(tenant_id: int, invoice_id: int) -> str:
+    bulk = await response_snapshots.version(f"invoices:bulk:{tenant_id}")
+    return f"{bulk}.{await response_snapshots.version(f'invoice:{invoice_id}')}"
@@ -0,0 +1,213 @@
+import os
+import time
+import asyncio
+import logging
+from typing import List, Optional, Sequence, Tuple
+
+from sqlalchemy import select, delete, insert, update, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.arabic import normalize_arabic
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal, engine
+from app.models.document import Document
+from app.models.finance import FinanceInvoice
+from app.models.search import SearchEntry
+from app.schemas.finance import InvoiceExtract
+from app.services.blob_store import blob_store
+from app.services.invoice_parser import invoice_parser
+from app.services.document_splitter import document_splitter
+from app.services.document_versions import document_versions
+
+logger = logging.getLogger(__name__)
+
+MAX_QUERY_TERMS = 10
+TRIGRAM = 3 # SQLite FTS5 trigram index: shorter terms cannot be matched
+TEXT_EXTENSIONS = {".txt", ".md", ".csv"}
+
+SQLITE_SEARCH = """
+    SELECT e.id, e.source, e.document_id, e.invoice_id, e.page, e.title,
+           snippet(search_entries_fts, 0, '<mark>', '</mark>', '…', :words) AS snippet,
+           bm25(search_entries_fts) AS rank
+    FROM search_entries_fts
+    JOIN search_entries e ON e.id = search_entries_fts.rowid
+    JOIN documents d ON d.id = e.document_id
+    WHERE search_entries_fts MATCH :query AND e.tenant_id = :tenant_id AND d.deleted_at IS NULL
+    ORDER BY rank
+    LIMIT :limit OFFSET :offset
+"""
+
+# Headlines are computed for the returned page only, not for every match
+POSTGRES_SEARCH = """
+    SELECT hit.id, hit.source, hit.document_id, hit.invoice_id, hit.page, hit.title,
+           ts_headline(CAST(:config AS regconfig), hit.content, to_tsquery(CAST(:config AS regconfig), :query), :options) AS snippet,
+           hit.rank
+    FROM (
+        SELECT e.id, e.source, e.document_id, e.invoice_id, e.page, e.title, e.content,
+               ts_rank(e.content_tsv, q) AS rank
+        FROM search_entries e
+        JOIN documents d ON d.id = e.document_id,
+             to_tsquery(CAST(:config AS regconfig), :query) q
+        WHERE e.content_tsv @@ q AND e.tenant_id = :tenant_id AND d.deleted_at IS NULL
+        ORDER BY rank DESC
+        LIMIT :limit OFFSET :offset
+    ) hit
+    ORDER BY hit.rank DESC
+"""
+
+
+class SearchIndex:
+    """
+    Native full-text search over documents (filename + text layer, one entry per page) and
+    extracted invoices (number, vendor, item descriptions). Entries hold normalize_arabic() text,
+    so hamza / taa marbuta / diacritic variants match; the index itself is maintained by the
+    database (generated tsvector on Postgres, FTS5 triggers on SQLite).
+    Entries are replaced per document on upload / extraction and vanish with the document (cascade).
+    """
+
+    # --- Indexing ---
+
+    async def index_document(self, document_id: int):
+        """
+        Indexes the filename and page text of a document. Uses its own session (background task).
+        For a new version, entries of unchanged pages (same fingerprint) are kept / renumbered
+        and only changed pages are re-indexed.
+        """
+        async with AsyncSessionLocal() as db:
+            try:
+                stmt = select(Document).where(Document.id == document_id, Document.deleted_at.is_(None))
+                document = (await db.execute(stmt)).scalars().first()
+                if not document:
+                    return
+
+                pages = await self._read_pages(document)
+                current = document.page_fingerprints if document.page_fingerprints and len(document.page_fingerprints) == len(pages) else None
+                unchanged = document_splitter.page_map(await document_versions.previous_fingerprints(db, document), current)
+
+                # Existing page entries by the previous version's page number
+                stmt = select(SearchEntry.id, SearchEntry.page).where(SearchEntry.document_id == document.id, SearchEntry.source == "page")
+                kept = {row.page: row.id for row in (await db.execute(stmt)).all()} if unchanged else {}
+
+                rows = [self._entry(document, "document", document.filename)]
+                reused = []
+                for number, page_text in enumerate(pages, start=1):
+                    if not page_text.strip():
+                        continue
+                    entry_id = kept.pop(unchanged.get(number), None)
+                    if entry_id is None:
+                        rows.append(self._entry(document, "page", page_text, page=number))
+                    else:
+                        reused.append({"entry_id": entry_id, "page": number, "moved": unchanged[number] != number})
+
+                await db.execute(delete(SearchEntry).where(
+                    SearchEntry.document_id == document.id,
+                    SearchEntry.source.in_(["document", "page"]),
+                    SearchEntry.id.notin_([r["entry_id"] for r in reused]),
+                ))
+                for r in (r for r in reused if r["moved"]):
+                    await db.execute(update(SearchEntry).where(SearchEntry.id == r["entry_id"]).values(page=r["page"]))
+                await db.execute(insert(SearchEntry), rows)
+                await db.commit()
+                logger.info(f"Search: indexed document {document.id} ({len(pages)} pages, {len(reused)} unchanged)")
+            except Exception as e:
+                logger.error(f"Search indexing failed for document {document_id}: {e}")
+                await db.rollback()
+
+    async def index_invoices(self, db: AsyncSession, document: Document, extracted: List[Tuple[FinanceInvoice, InvoiceExtract]], kept: Sequence[FinanceInvoice] = ()):
+        """
+        Replaces the document's invoice entries, except those of `kept` invoices (unchanged pages of
+        a new version), which only follow their new first page.
+        Does not commit (runs inside the extraction transaction).
+        """
+        await db.execute(delete(SearchEntry).where(
+            SearchEntry.document_id == document.id,
+            SearchEntry.source == "invoice",
+            SearchEntry.invoice_id.notin_([invoice.id for invoice in kept]),
+        ))
+        for invoice in kept:
+            await db.execute(update(SearchEntry).where(SearchEntry.invoice_id == invoice.id).values(page=invoice.page_start))
+        rows = []
+        for invoice, extract in extracted:
+            parts = [extract.invoice_number, extract.vendor_name, extract.vendor_tax_id]
+            for item in extract.items:
+                parts.extend([item.description, item.category])
+            title = " - ".join(p for p in (extract.invoice_number, extract.vendor_name) if p) or document.filename
+            rows.append(dict(
+                self._entry(document, "invoice", " ".join(p for p in parts if p), page=invoice.page_start, title=title),
+                invoice_id=invoice.id,
+            ))
+        if rows:
+            await db.execute(insert(SearchEntry), rows)
+
+    def _entry(self, document: Document, source: str, raw: Optional[str], page: Optional[int] = None, title: Optional[str] = None) -> dict:
+        return {
+            "tenant_id": document.tenant_id,
+            "document_id": document.id,
+            "invoice_id": None,
+            "source": source,
+            "page": page,
+            "title": title or document.filename,
+            "content": normalize_arabic(raw or ""),
+        }
+
+    async def _read_pages(self, document: Document) -> List[str]:
+        extension = os.path.splitext(document.filename or "")[1].lower()
+        if extension != ".pdf" and extension not in TEXT_EXTENSIONS:
+            return []
+        with blob_store.open_mmap(document.content_hash) as data:
+            if data is None:
+                return []
+            if extension == ".pdf":
+                return await asyncio.to_thread(invoice_parser.read_text_layer, data)
+            return [bytes(data).decode("utf-8", errors="replace")]
+
+    # --- Querying ---
+
+    async def search(self, db: AsyncSession, tenant_id: int, query: str, limit: int = 20, offset: int = 0) -> dict:
+        """
+        All terms must match: as substrings on SQLite (terms under 3 characters are ignored),
+        as stemmed words on Postgres with the last one also a prefix (search-as-you-type).
+        Returns ranked hits with <mark>-highlighted snippets.
+        """
+        started = time.perf_counter()
+        terms = normalize_arabic(query).split()[:MAX_QUERY_TERMS]
+        limit = max(1, min(limit, settings.SEARCH_MAX_RESULTS))
+        offset = max(0, offset)
+        if engine.dialect.name == "sqlite":
+            terms = [t for t in terms if len(t) >= TRIGRAM]
+        if not terms:
+            return {"query": query, "results": [], "next_offset": None, "took_ms": 0.0}
+
+        # Terms are \w-only after normalization, so they are safe inside both query syntaxes
+        params = {"tenant_id": tenant_id, "limit": limit + 1, "offset": offset}
+        if engine.dialect.name == "sqlite":
+            statement = SQLITE_SEARCH
+            params["query"] = " ".join(f'"{t}"' for t in terms)
+            params["words"] = min(64, settings.SEARCH_SNIPPET_WORDS * 5) # snippet() counts trigram tokens, ~ characters
+        else:
+            statement = POSTGRES_SEARCH
+            params["query"] = " & ".join(terms) + ":*"
+            params["config"] = settings.SEARCH_TS_CONFIG
+            params["options"] = f"StartSel=<mark>, StopSel=</mark>, MaxWords={settings.SEARCH_SNIPPET_WORDS}, MinWords=4, MaxFragments=2"
+
+        rows = (await db.execute(text(statement), params)).mappings().all()
+        results = [
+            {
+                "type": row["source"],
+                "document_id": row["document_id"],
+                "invoice_id": row["invoice_id"],
+                "page": row["page"],
+                "title": row["title"],
+                "snippet": row["snippet"],
+                "score": round(abs(float(row["rank"])), 4),
+            }
+            for row in rows[:limit]
+        ]
+        return {
+            "query": query,
+            "results": results,
+            "next_offset": offset + limit if len(rows) > limit else None,
+            "took_ms": round((time.perf_counter() - started) * 1000, 2),
+        }
+
+search_index = SearchIndex()
@@ -0,0 +1,53 @@
+import asyncio
+from collections import defaultdict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Tuple
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent identical calls: while a call for (kind, key) is in flight, later
+    callers await the same task and share its result (or exception) instead of sending their
+    own upstream request. Nothing is cached: once the call finishes, the next caller starts
+    a new one. A caller that is cancelled does not cancel the shared call.
+    Per process, like the rest of the in-memory metrics.
+    """
+
+    def __init__(self):
+        self._in_flight: Dict[Tuple[str, Hashable], asyncio.Task] = {}
+        self._calls = defaultdict(int) # kind -> upstream calls started
+        self._coalesced = defaultdict(int) # kind -> callers served by another caller's call
+
+    async def do(self, kind: str, key: Hashable, call: Callable[[], Awaitable[Any]]) -> Any:
+        flight_key = (kind, key)
+        task = self._in_flight.get(flight_key)
+        if task is None:
+            task = asyncio.create_task(call())
+            self._in_flight[flight_key] = task
+            task.add_done_callback(lambda done: self._forget(flight_key, done))
+            self._calls[kind] += 1
+        else:
+            self._coalesced[kind] += 1
+        return await asyncio.shield(task)
+
+    def _forget(self, flight_key, task: asyncio.Task):
+        if self._in_flight.get(flight_key) is task:
+            del self._in_flight[flight_key]
+        if not task.cancelled():
+            task.exception() # Retrieved here, so a call nobody awaits anymore does not log "never retrieved"
+
+    def stats(self) -> Dict[str, dict]:
+        in_flight = defaultdict(int)
+        for kind, _ in self._in_flight:
+            in_flight[kind] += 1
+        return {
+            kind: {
+                "calls": self._calls[kind],
+                "coalesced": self._coalesced[kind],
+                "coalesced_ratio": round(self._coalesced[kind] / (self._calls[kind] + self._coalesced[kind]), 4),
+                "in_flight": in_flight[kind],
+            }
+            for kind in sorted(set(self._calls) | set(self._coalesced))
+        }
+
+
+single_flight = SingleFlight()
@@ -0,0 +1,81 @@
+import time
+import logging
+from typing import Optional
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.cache import cache
+from app.core.config import settings
+from app.models.tenant import Tenant
+
+logger = logging.getLogger(__name__)
+
+
+class TenantService:
+    """
+    Resolves tenants by company name (the X-Tenant-ID header) once per TTL
+    instead of once per request; the mapping lives in the shared cache so all workers reuse it.
+    """
+
+    def __init__(self):
+        self._api_keys = {} # tenant_id -> (api_key, expires_at); in-process only, secrets stay out of the shared cache
+
+    def _key(self, company_name: str) -> str:
+        return f"tenant:id:{company_name}"
+
+    async def resolve_id(self, db: AsyncSession, company_name: str, create: bool = False) -> Optional[int]:
+        """
+        Returns the tenant id, or None if unknown. With `create`, unknown tenants are
+        lazily seeded (demo behaviour, avoids "Tenant not found").
+        """
+        key = self._key(company_name)
+        tenant_id = await cache.get(key)
+        if tenant_id is not None:
+            return tenant_id
+
+        stmt = select(Tenant.id).where(Tenant.company_name == company_name).order_by(Tenant.id).limit(1)
+        tenant_id = (await db.execute(stmt)).scalar()
+
+        if tenant_id is None and create:
+            tenant = Tenant(
+                company_name=company_name,
+                subscription_status=True,
+                subscribed_modules=["finance", "engineer"]
+            )
+            db.add(tenant)
+            await db.commit()
+            await db.refresh(tenant)
+            tenant_id = tenant.id
+
+        if tenant_id is not None:
+            await cache.set(key, tenant_id, ttl=settings.TENANT_CACHE_TTL_SECONDS)
+        return tenant_id
+
+    async def invalidate(self, company_name: str):
+        await cache.delete(self._key(company_name))
+
+    async def get_api_key(self, db: AsyncSession, tenant_id: Optional[int]) -> Optional[str]:
+        """
+        The tenant's own Gemini key (BYOK), or None for the system default.
+        """
+        if tenant_id is None:
+            return None
+        entry = self._api_keys.get(tenant_id)
+        if entry and entry[1] > time.monotonic():
+            return entry[0]
+
+        stmt = select(Tenant.gemini_api_key).where(Tenant.id == tenant_id)
+        api_key = (await db.execute(stmt)).scalar() or None
+        self._api_keys[tenant_id] = (api_key, time.monotonic() + settings.TENANT_KEY_CACHE_TTL_SECONDS)
+        return api_key
+
+    async def get_api_keys(self, db: AsyncSession) -> dict:
+        """
+        tenant_id -> BYOK key for every tenant that has one (used by background jobs).
+        """
+        stmt = select(Tenant.id, Tenant.gemini_api_key).where(Tenant.gemini_api_key.isnot(None))
+        rows = (await db.execute(stmt)).all()
+        return {row.id: row.gemini_api_key for row in rows if row.gemini_api_key}
+
+tenant_service = TenantService()
@@ -0,0 +1,177 @@
+import logging
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import select, update, case, cast, func, Integer
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.document import Document
+from app.models.finance import FinanceVendor, FinanceInvoice, FinanceAuditFlag
+
+logger = logging.getLogger(__name__)
+
+# Open-flag weight per severity in the trust penalty
+SEVERITY_WEIGHTS = {"high": 3.0, "medium": 1.5, "low": 0.5}
+SEVERITY_COLUMNS = {"high": "open_flags_high", "medium": "open_flags_medium", "low": "open_flags_low"}
+
+# Pseudo-invoices added to the denominator, so one flag on a brand new vendor
+# does not weigh like a pattern across hundreds of invoices
+TRUST_PRIOR_INVOICES = 5
+
+
+def trust_score_expression():
+    """
+    trust = 100 - 100 * weighted open flags / (invoices + prior), clamped to [0, 100].
+    Evaluated in SQL over the vendor's own counters (O(1), no history scan).
+    """
+    weighted = sum(
+        getattr(FinanceVendor, column) * SEVERITY_WEIGHTS[severity]
+        for severity, column in SEVERITY_COLUMNS.items()
+    )
+    penalty = 100.0 * weighted / (FinanceVendor.invoice_count + TRUST_PRIOR_INVOICES)
+    return cast(case((penalty >= 100, 0), else_=100 - penalty), Integer)
+
+
+class VendorRiskService:
+    """
+    Maintains running per-vendor statistics with single-row atomic UPDATEs:
+    - invoice_count, amount_mean, amount_m2 (Welford; variance = m2 / count)
+    - open flag counts by severity
+    and re-derives trust_score from them. Nothing here reads invoice history,
+    except `rebuild`, which is the backfill/repair path.
+    Only invoices of live (not soft-deleted) documents count: overwritten documents are
+    forgotten when they are soft-deleted. Callers own the transaction (nothing is committed here).
+    """
+
+    async def add_invoice(self, db: AsyncSession, vendor_id: Optional[int], amount: Optional[float]):
+        if vendor_id is None or amount is None:
+            return
+        x = float(amount)
+        n, mean, m2 = FinanceVendor.invoice_count, FinanceVendor.amount_mean, FinanceVendor.amount_m2
+        new_mean = mean + (x - mean) / (n + 1)
+        await db.execute(
+            update(FinanceVendor).where(FinanceVendor.id == vendor_id).values(
+                invoice_count=n + 1,
+                amount_mean=new_mean,
+                amount_m2=m2 + (x - mean) * (x - new_mean),
+            ).execution_options(synchronize_session=False)
+        )
+        await self.refresh_trust(db, [vendor_id])
+
+    async def remove_invoice(self, db: AsyncSession, vendor_id: Optional[int], amount: Optional[float]):
+        if vendor_id is None or amount is None:
+            return
+        x = float(amount)
+        n, mean, m2 = FinanceVendor.invoice_count, FinanceVendor.amount_mean, FinanceVendor.amount_m2
+        new_mean = (mean * n - x) / (n - 1)
+        new_m2 = m2 - (x - mean) * (x - new_mean)
+        await db.execute(
+            update(FinanceVendor).where(FinanceVendor.id == vendor_id, FinanceVendor.invoice_count > 0).values(
+                invoice_count=n - 1,
+                amount_mean=case((n <= 1, 0.0), else_=new_mean),
+                amount_m2=case((n <= 1, 0.0), (new_m2 < 0, 0.0), else_=new_m2),
+            ).execution_options(synchronize_session=False)
+        )
+        await self.refresh_trust(db, [vendor_id])
+
+    async def apply_flag_deltas(self, db: AsyncSession, deltas: Dict[Tuple[int, str], int]):
+        """
+        deltas: (vendor_id, severity) -> +raised / -resolved open flags.
+        """
+        touched = set()
+        for (vendor_id, severity), delta in deltas.items():
+            column = SEVERITY_COLUMNS.get(severity)
+            if vendor_id is None or not column or not delta:
+                continue
+            current = getattr(FinanceVendor, column)
+            await db.execute(
+                update(FinanceVendor).where(FinanceVendor.id == vendor_id).values(
+                    {column: case((current + delta < 0, 0), else_=current + delta)}
+                ).execution_options(synchronize_session=False)
+            )
+            touched.add(vendor_id)
+        await self.refresh_trust(db, touched)
+
+    async def open_flag_counts(self, db: AsyncSession, invoice_ids, issue_types: Optional[Iterable[str]] = None) -> Counter:
+        """
+        (vendor_id, severity) -> open flags on the given live invoices (id list or subquery).
+        """
+        stmt = (
+            select(FinanceInvoice.vendor_id, FinanceAuditFlag.severity, func.count())
+            .join(FinanceInvoice, FinanceInvoice.id == FinanceAuditFlag.invoice_id)
+            .join(Document, Document.id == FinanceInvoice.document_id)
+            .where(
+                FinanceAuditFlag.invoice_id.in_(invoice_ids),
+                FinanceAuditFlag.is_resolved == False,
+                Document.deleted_at.is_(None),
+            )
+            .group_by(FinanceInvoice.vendor_id, FinanceAuditFlag.severity)
+        )
+        if issue_types is not None:
+            stmt = stmt.where(FinanceAuditFlag.issue_type.in_(list(issue_types)))
+        return Counter({(vendor_id, severity): count for vendor_id, severity, count in (await db.execute(stmt)).all()})
+
+    async def forget_invoices(self, db: AsyncSession, invoice_ids: List[int]):
+        """
+        Takes invoices out of their vendors' statistics (stale re-extraction results, overwritten
+        documents). Call before the rows are deleted / soft-deleted.
+        O(number of invoices), independent of vendor history.
+        """
+        if not invoice_ids:
+            return
+        flags = await self.open_flag_counts(db, invoice_ids)
+        await self.apply_flag_deltas(db, {key: -count for key, count in flags.items()})
+
+        stmt = select(FinanceInvoice.vendor_id, FinanceInvoice.total_amount).where(
+            FinanceInvoice.id.in_(invoice_ids),
+            FinanceInvoice.extraction_status == "completed",
+        )
+        for vendor_id, amount in (await db.execute(stmt)).all():
+            await self.remove_invoice(db, vendor_id, amount)
+
+    async def refresh_trust(self, db: AsyncSession, vendor_ids: Iterable[int]):
+        vendor_ids = [v for v in set(vendor_ids) if v is not None]
+        if not vendor_ids:
+            return
+        await db.execute(
+            update(FinanceVendor).where(FinanceVendor.id.in_(vendor_ids))
+            .values(trust_score=trust_score_expression())
+            .execution_options(synchronize_session=False)
+        )
+
+    async def rebuild(self, db: AsyncSession, tenant_id: int):
+        """
+        Recomputes every vendor of the tenant from history (full audit runs / repair).
+        """
+        live_invoices = (
+            select(FinanceInvoice.id)
+            .join(Document, Document.id == FinanceInvoice.document_id)
+            .where(FinanceInvoice.tenant_id == tenant_id, Document.deleted_at.is_(None))
+        )
+        stmt = select(
+            FinanceInvoice.vendor_id, func.count(), func.sum(FinanceInvoice.total_amount),
+            func.sum(FinanceInvoice.total_amount * FinanceInvoice.total_amount),
+        ).where(
+            FinanceInvoice.id.in_(live_invoices),
+            FinanceInvoice.extraction_status == "completed",
+            FinanceInvoice.total_amount.isnot(None),
+        ).group_by(FinanceInvoice.vendor_id)
+        amounts = {row[0]: row[1:] for row in (await db.execute(stmt)).all()}
+        flags = await self.open_flag_counts(db, live_invoices)
+
+        vendor_ids = (await db.execute(select(FinanceVendor.id).where(FinanceVendor.tenant_id == tenant_id))).scalars().all()
+        for vendor_id in vendor_ids:
+            count, total, total_sq = amounts.get(vendor_id, (0, 0.0, 0.0))
+            mean = total / count if count else 0.0
+            await db.execute(
+                update(FinanceVendor).where(FinanceVendor.id == vendor_id).values(
+                    invoice_count=count,
+                    amount_mean=mean,
+                    amount_m2=max(total_sq - count * mean * mean, 0.0) if count else 0.0,
+                    **{column: flags.get((vendor_id, severity), 0) for severity, column in SEVERITY_COLUMNS.items()},
+                ).execution_options(synchronize_session=False)
+            )
+        await self.refresh_trust(db, vendor_ids)
+        logger.info(f"Vendor risk: rebuilt statistics for {len(vendor_ids)} vendors of tenant {tenant_id}")
+
+vendor_risk = VendorRiskService()
@@ -0,0 +1,105 @@
+"""
+Benchmark for the vectorized audit engine.
+
+    python bench_audit.py --items 1000000
+    python bench_audit.py --database-url postgresql+asyncpg://... --items 1000000 --items-per-invoice 10
+
+Loads synthetic invoices (with injected anomalies) into a scratch database (SQLite temp file
+by default), then times a full tenant audit and an incremental audit of a single invoice.
+"""
+import os
+import time
+import random
+import asyncio
+import argparse
+import tempfile
+from datetime import datetime, timedelta
+
+parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+parser.add_argument("--database-url", default=None)
+parser.add_argument("--items", type=int, default=1_000_000, help="Total line items")
+parser.add_argument("--items-per-invoice", type=int, default=10)
+parser.add_argument("--vendors", type=int, default=200)
+args = parser.parse_args()
+
+if args.database_url:
+    os.environ["DATABASE_URL"] = args.database_url
+else:
+    os.environ["DATABASE_URL"] = "sqlite+aiosqlite:///" + os.path.join(tempfile.mkdtemp(), "bench_audit.db")
+
+from sqlalchemy import insert, delete, select
+from app.core.database import engine, Base
+from app.models import Tenant, Document, FinanceVendor, FinanceInvoice, FinanceInvoiceItem, FinanceAuditFlag
+from app.services.audit_engine import audit_engine
+
+FIRST_ID = 20_000_000
+
+
+async def load(tenant_id: int, document_id: int, vendor_ids: list, invoices: int):
+    rng = random.Random(7)
+    base_date = datetime(2024, 1, 1)
+    per = args.items_per_invoice
+    async with engine.begin() as conn:
+        for chunk_start in range(FIRST_ID, FIRST_ID + invoices, 5000):
+            chunk = range(chunk_start, min(chunk_start + 5000, FIRST_ID + invoices))
+            invoice_rows, item_rows = [], []
+            for i in chunk:
+                price = round(rng.uniform(10, 500), 2)
+                total = round(price * per * 1.15, 2)
+                roll = rng.random()
+                if roll < 0.01:
+                    total += 250 # total_mismatch
+                elif roll < 0.02:
+                    total = 50_000.0 # round_amount + amount_outlier
+                invoice_rows.append({
+                    "id": i, "tenant_id": tenant_id, "document_id": document_id,
+                    "vendor_id": vendor_ids[i % len(vendor_ids)],
+                    "invoice_number": f"INV-{i - len(vendor_ids) if roll < 0.005 else i}", # a few duplicates (same vendor)
+                    "invoice_date": base_date + timedelta(days=i % 365),
+                    "total_amount": total, "currency": "SAR", "extraction_status": "completed",
+                })
+                item_rows.extend(
+                    {"invoice_id": i, "tenant_id": tenant_id, "description": "بند", "quantity": 1.0, "unit_price": price, "total_price": price}
+                    for _ in range(per)
+                )
+            await conn.execute(insert(FinanceInvoice), invoice_rows)
+            await conn.execute(insert(FinanceInvoiceItem), item_rows)
+
+
+async def main():
+    invoices = args.items // args.items_per_invoice
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+        tenant_id = (await conn.execute(insert(Tenant).values(company_name="Audit Bench").returning(Tenant.id))).scalar()
+        document_id = (await conn.execute(insert(Document).values(tenant_id=tenant_id, filename="bench.pdf").returning(Document.id))).scalar()
+        vendor_ids = []
+        for v in range(args.vendors):
+            vendor_ids.append((await conn.execute(
+                insert(FinanceVendor).values(tenant_id=tenant_id, name=f"مورد {v}", tax_id=None if v % 10 == 0 else f"3{v:013d}3").returning(FinanceVendor.id)
+            )).scalar())
+
+    started = time.perf_counter()
+    await load(tenant_id, document_id, vendor_ids, invoices)
+    print(f"loaded {invoices} invoices / {invoices * args.items_per_invoice} items in {time.perf_counter() - started:.1f}s")
+
+    result = await audit_engine.run(tenant_id)
+    print(f"full audit:        {result['invoices']:>9} invoices {result['seconds']:>7.2f}s  flags {result['flags']}")
+
+    result = await audit_engine.run(tenant_id, [FIRST_ID + invoices // 2])
+    print(f"incremental audit: {result['invoices']:>9} invoice  {result['seconds']:>7.2f}s  flags {result['flags']}")
+
+    if args.database_url:
+        # Leave shared databases as we found them
+        async with engine.begin() as conn:
+            invoice_ids = select(FinanceInvoice.id).where(FinanceInvoice.tenant_id == tenant_id)
+            await conn.execute(delete(FinanceAuditFlag).where(FinanceAuditFlag.invoice_id.in_(invoice_ids)))
+            await conn.execute(delete(FinanceInvoiceItem).where(FinanceInvoiceItem.invoice_id.in_(invoice_ids)))
+            await conn.execute(delete(FinanceInvoice).where(FinanceInvoice.tenant_id == tenant_id))
+            await conn.execute(delete(FinanceVendor).where(FinanceVendor.tenant_id == tenant_id))
+            await conn.execute(delete(Document).where(Document.id == document_id))
+            await conn.execute(delete(Tenant).where(Tenant.id == tenant_id))
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
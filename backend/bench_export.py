@@ -0,0 +1,142 @@
+"""
+Throughput / memory benchmark for the streaming invoice export.
+
+    python bench_export.py --invoices 20000 --items 10
+    python bench_export.py --database-url postgresql+asyncpg://... --formats csv parquet
+
+Loads synthetic rows into a scratch database (SQLite temp file by default), then runs
+each export format on half and on the full dataset and reports rows/s (untraced run)
+and peak Python heap (separate tracemalloc run, which is much slower). Rows are
+counted in each output and the run fails if they differ from what was loaded. A flat peak
+across both sizes means the export does not materialize the result.
+"""
+import os
+import time
+import asyncio
+import argparse
+import tempfile
+import tracemalloc
+from datetime import datetime, timedelta
+
+parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+parser.add_argument("--database-url", default=None)
+parser.add_argument("--invoices", type=int, default=20000)
+parser.add_argument("--items", type=int, default=10, help="Line items per invoice")
+parser.add_argument("--formats", nargs="+", default=["csv", "xlsx", "parquet"])
+args = parser.parse_args()
+
+if args.database_url:
+    os.environ["DATABASE_URL"] = args.database_url
+else:
+    os.environ["DATABASE_URL"] = "sqlite+aiosqlite:///" + os.path.join(tempfile.mkdtemp(), "bench_export.db")
+
+from sqlalchemy import insert, delete
+from app.core.database import engine, Base
+from app.models import Tenant, Document, FinanceVendor, FinanceInvoice, FinanceInvoiceItem
+from app.services.finance_export import finance_export_service
+
+
+async def load(tenant_id: int, vendor_id: int, document_id: int, start_id: int, count: int):
+    base_date = datetime(2024, 1, 1)
+    async with engine.begin() as conn:
+        for chunk_start in range(start_id, start_id + count, 5000):
+            chunk = range(chunk_start, min(chunk_start + 5000, start_id + count))
+            await conn.execute(insert(FinanceInvoice), [
+                {
+                    "id": i, "tenant_id": tenant_id, "vendor_id": vendor_id, "document_id": document_id,
+                    "invoice_number": f"INV-{i:08d}", "invoice_date": base_date + timedelta(hours=i % 8000),
+                    "total_amount": 115.0 * args.items, "currency": "SAR", "extraction_status": "completed",
+                }
+                for i in chunk
+            ])
+            await conn.execute(insert(FinanceInvoiceItem), [
+                {
+                    "invoice_id": i, "tenant_id": tenant_id, "description": f"بلاط رخام مقاس 60×60 - دفعة {i}",
+                    "quantity": 1.0, "unit_price": 100.0, "total_price": 100.0, "category": "مواد بناء",
+                }
+                for i in chunk for _ in range(args.items)
+            ])
+
+
+async def export_once(fmt: str, tenant_id: int, count_rows: bool = False) -> tuple:
+    """
+    Returns (output bytes, data rows written); rows are only counted when asked (not timed).
+    """
+    size, rows = 0, None
+    if fmt == "csv":
+        newlines = 0
+        async for chunk in finance_export_service.stream_csv(tenant_id):
+            size += len(chunk)
+            if count_rows:
+                newlines += chunk.count(b"\n") # Bench descriptions have no embedded newlines
+        rows = newlines - 1 if count_rows else None # Header
+    else:
+        writer = finance_export_service.write_xlsx if fmt == "xlsx" else finance_export_service.write_parquet
+        path = await writer(tenant_id)
+        size = os.path.getsize(path)
+        if count_rows:
+            rows = await asyncio.to_thread(count_file_rows, fmt, path)
+        os.remove(path)
+    return size, rows
+
+
+def count_file_rows(fmt: str, path: str) -> int:
+    if fmt == "parquet":
+        import pyarrow.parquet as pq
+        return pq.ParquetFile(path).metadata.num_rows
+
+    from openpyxl import load_workbook
+    workbook = load_workbook(path, read_only=True)
+    try:
+        return sum(1 for _ in workbook["invoices"].iter_rows(values_only=True)) - 1 # Header
+    finally:
+        workbook.close()
+
+
+async def run_format(fmt: str, tenant_id: int, expected_rows: int) -> tuple:
+    started = time.perf_counter()
+    size, _ = await export_once(fmt, tenant_id)
+    elapsed = time.perf_counter() - started
+
+    _, rows = await export_once(fmt, tenant_id, count_rows=True)
+    if rows != expected_rows:
+        raise SystemExit(f"{fmt} export wrote {rows} data rows, expected {expected_rows}: numbers would be meaningless")
+
+    tracemalloc.start()
+    await export_once(fmt, tenant_id)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return rows, elapsed, peak, size
+
+
+async def main():
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+        tenant_id = (await conn.execute(insert(Tenant).values(company_name="Bench Corp").returning(Tenant.id))).scalar()
+        vendor_id = (await conn.execute(insert(FinanceVendor).values(tenant_id=tenant_id, name="مورد الاختبار").returning(FinanceVendor.id))).scalar()
+        # Exports only include invoices of live documents
+        document_id = (await conn.execute(insert(Document).values(tenant_id=tenant_id, filename="bench.pdf").returning(Document.id))).scalar()
+
+    half = args.invoices // 2
+    print(f"{'format':<8} {'rows':>10} {'seconds':>9} {'rows/s':>10} {'peak MiB':>9} {'output MiB':>10}")
+    loaded = 0
+    for target in (half, args.invoices):
+        await load(tenant_id, vendor_id, document_id, 10_000_000 + loaded, target - loaded)
+        loaded = target
+        for fmt in args.formats:
+            rows, elapsed, peak, size = await run_format(fmt, tenant_id, expected_rows=loaded * max(args.items, 1))
+            print(f"{fmt:<8} {rows:>10} {elapsed:>9.2f} {rows / elapsed:>10.0f} {peak / 2**20:>9.1f} {size / 2**20:>10.1f}")
+
+    if args.database_url:
+        # Leave shared databases as we found them
+        async with engine.begin() as conn:
+            await conn.execute(delete(FinanceInvoiceItem).where(FinanceInvoiceItem.invoice_id >= 10_000_000))
+            await conn.execute(delete(FinanceInvoice).where(FinanceInvoice.tenant_id == tenant_id))
+            await conn.execute(delete(FinanceVendor).where(FinanceVendor.id == vendor_id))
+            await conn.execute(delete(Document).where(Document.id == document_id))
+            await conn.execute(delete(Tenant).where(Tenant.id == tenant_id))
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,165 @@
+"""
+Benchmark: finance_invoice_items as one table vs hash-partitioned by tenant (Postgres only).
+
+    python bench_partitioning.py --database-url postgresql+asyncpg://.../scratch --items 100000000
+    python bench_partitioning.py --database-url postgresql+asyncpg://.../scratch --items 10000000 --tenants 100 --partitions 8
+
+Needs an EMPTY scratch database: the schema is created, the items table is rebuilt in place and
+everything is dropped at the end. Data is generated inside Postgres (generate_series), so the
+100M-item load is bound by the server, not by the driver.
+
+For each layout it reports table/index sizes, VACUUM time, how many item relations a
+tenant-filtered plan touches, and the tenant-scoped reads of the app (audit load, item category
+map, export) over a sample of tenants (cold first pass, then warm).
+"""
+import os
+import json
+import time
+import asyncio
+import argparse
+import statistics
+
+parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+parser.add_argument("--database-url", required=True, help="postgresql+asyncpg://... of an empty scratch database")
+parser.add_argument("--items", type=int, default=100_000_000, help="Total line items")
+parser.add_argument("--items-per-invoice", type=int, default=10)
+parser.add_argument("--tenants", type=int, default=200)
+parser.add_argument("--partitions", type=int, default=16)
+parser.add_argument("--sample-tenants", type=int, default=5)
+parser.add_argument("--chunk", type=int, default=500_000, help="Invoices generated per statement")
+args = parser.parse_args()
+
+os.environ["DATABASE_URL"] = args.database_url
+
+from sqlalchemy import text, func, select
+from app.core.database import engine, Base, AsyncSessionLocal
+from app.models import Tenant
+from app.models.partitioning import partition_items
+from app.services.audit_engine import audit_engine
+from app.services.item_categorizer import item_categorizer
+from app.services.finance_export import finance_export_service
+
+
+async def load():
+    t, invoices, per = args.tenants, args.items // args.items_per_invoice, args.items_per_invoice
+    async with engine.begin() as conn:
+        await conn.execute(text(f"INSERT INTO tenants (id, company_name, subscription_status) SELECT g, 'bench-' || g, true FROM generate_series(1, {t}) g"))
+        await conn.execute(text(f"INSERT INTO documents (id, tenant_id, filename, status) SELECT g, g, 'bench-' || g || '.pdf', 'active' FROM generate_series(1, {t}) g"))
+        # Vendor v belongs to tenant 1 + (v - 1) % t, so invoice i (tenant 1 + i % t) uses vendor 1 + i % (10t)
+        await conn.execute(text(f"INSERT INTO finance_vendors (id, tenant_id, name, trust_score) SELECT g, 1 + (g - 1) % {t}, 'vendor-' || g, 100 FROM generate_series(1, {t * 10}) g"))
+
+    for lo in range(1, invoices + 1, args.chunk):
+        hi = min(lo + args.chunk - 1, invoices)
+        async with engine.begin() as conn:
+            await conn.execute(text(f"""
+                INSERT INTO finance_invoices (id, tenant_id, document_id, vendor_id, invoice_number, invoice_date, total_amount, currency, extraction_status, audit_status, payment_status)
+                SELECT i, 1 + i % {t}, 1 + i % {t}, 1 + i % {t * 10}, 'INV-' || i, date '2024-01-01' + (i % 730), {per} * 115.0, 'SAR', 'completed', 'clean', 'Unpaid'
+                FROM generate_series({lo}, {hi}) i
+            """))
+            await conn.execute(text(f"""
+                INSERT INTO finance_invoice_items (invoice_id, tenant_id, description, quantity, unit_price, total_price, category)
+                SELECT i, 1 + i % {t}, 'item ' || (i * 7 + k) % 5000, 1, 100, 100, 'cat-' || k % 20
+                FROM generate_series({lo}, {hi}) i, generate_series(1, {per}) k
+            """))
+        print(f"  {hi * per:>12,} items", end="\r", flush=True)
+    print()
+
+
+async def sizes() -> dict:
+    async with engine.connect() as conn:
+        rows = (await conn.execute(text(
+            "SELECT pg_total_relation_size(relid) AS total, pg_indexes_size(relid) AS indexes "
+            "FROM pg_partition_tree('finance_invoice_items') WHERE isleaf"
+        ))).all()
+        plan = (await conn.execute(text("EXPLAIN (FORMAT JSON) SELECT count(*) FROM finance_invoice_items WHERE tenant_id = 1"))).scalar()
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+    relations = set()
+
+    def _walk(node):
+        if "Relation Name" in node:
+            relations.add(node["Relation Name"])
+        for child in node.get("Plans", []):
+            _walk(child)
+    _walk(plan[0]["Plan"])
+    return {
+        "leaves": len(rows),
+        "total_mb": sum(r.total for r in rows) / 1024**2,
+        "largest_index_mb": max(r.indexes for r in rows) / 1024**2,
+        "relations_per_tenant_query": len(relations),
+    }
+
+
+async def vacuum_seconds() -> float:
+    async with engine.connect() as conn:
+        conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+        started = time.perf_counter()
+        await conn.execute(text("VACUUM (ANALYZE) finance_invoice_items"))
+        return time.perf_counter() - started
+
+
+async def tenant_reads(tenant_ids) -> dict:
+    timings = {"audit_load": [], "category_map": [], "export": []}
+    for tenant_id in tenant_ids:
+        async with AsyncSessionLocal() as db:
+            started = time.perf_counter()
+            await audit_engine._load(db, tenant_id, audit_engine._invoice_scope(tenant_id))
+            timings["audit_load"].append(time.perf_counter() - started)
+
+            item_categorizer._maps.clear()
+            started = time.perf_counter()
+            await item_categorizer._tenant_map(db, tenant_id)
+            timings["category_map"].append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        async for _ in finance_export_service.iter_batches(tenant_id):
+            pass
+        timings["export"].append(time.perf_counter() - started)
+    return {name: statistics.median(values) for name, values in timings.items()}
+
+
+async def measure(label: str) -> dict:
+    result = {"vacuum_s": await vacuum_seconds(), **await sizes()}
+    sample = [1 + (i * args.tenants) // args.sample_tenants for i in range(args.sample_tenants)]
+    cold = await tenant_reads(sample)
+    warm = await tenant_reads(sample)
+    result.update({f"{name}_cold_s": value for name, value in cold.items()})
+    result.update({f"{name}_warm_s": value for name, value in warm.items()})
+    print(f"{label}: " + ", ".join(f"{k}={v:.3f}" if isinstance(v, float) else f"{k}={v}" for k, v in result.items()))
+    return result
+
+
+async def main():
+    async with engine.begin() as conn:
+        if conn.dialect.name != "postgresql":
+            raise SystemExit("Partitioning is Postgres-only")
+        await conn.run_sync(Base.metadata.create_all)
+    async with AsyncSessionLocal() as db:
+        if (await db.execute(select(func.count()).select_from(Tenant))).scalar():
+            raise SystemExit("Database is not empty; use a scratch database")
+
+    try:
+        started = time.perf_counter()
+        await load()
+        print(f"loaded {args.items:,} items for {args.tenants} tenants in {time.perf_counter() - started:.1f}s")
+
+        plain = await measure("plain      ")
+
+        started = time.perf_counter()
+        async with engine.begin() as conn:
+            await conn.run_sync(partition_items, args.partitions)
+        print(f"partitioned into {args.partitions} in {time.perf_counter() - started:.1f}s (the migration's cost)")
+
+        partitioned = await measure("partitioned")
+
+        print(f"\n{'metric':<28}{'plain':>12}{'partitioned':>14}")
+        for key in plain:
+            print(f"{key:<28}{plain[key]:>12.3f}{partitioned[key]:>14.3f}")
+    finally:
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.drop_all)
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,120 @@
+"""
+Cold-start benchmark: import time of the app and time until /health first answers.
+
+    python bench_startup.py
+    python bench_startup.py --runs 5 --max-import-seconds 1.5 --max-healthy-seconds 4
+
+Runs in fresh interpreters (nothing warm in sys.modules):
+1. `python -X importtime -c "import main"` - reports the total and the slowest modules, and
+   fails if heavy SDKs that are meant to load lazily (google.generativeai, pypdf, pyarrow,
+   openpyxl) were imported at startup.
+2. `uvicorn main:app` with DB_AUTO_CREATE_SCHEMA=false (migration-only mode) - polls /health
+   and reports the time from process start to the first 200.
+Exits non-zero when a budget is exceeded, so it can gate CI alongside the other checks.
+"""
+import os
+import sys
+import time
+import socket
+import argparse
+import tempfile
+import subprocess
+import urllib.request
+
+LAZY_MODULES = ["google.generativeai", "pypdf", "pyarrow", "openpyxl", "numpy", "duckdb"]
+
+parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+parser.add_argument("--runs", type=int, default=3, help="Best of N for each measurement")
+parser.add_argument("--top", type=int, default=10, help="Slowest modules to list")
+parser.add_argument("--max-import-seconds", type=float, default=None)
+parser.add_argument("--max-healthy-seconds", type=float, default=None)
+args = parser.parse_args()
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def child_env() -> dict:
+    env = dict(os.environ)
+    env.setdefault("DATABASE_URL", "sqlite+aiosqlite:///" + os.path.join(tempfile.mkdtemp(), "bench_startup.db"))
+    env["DB_AUTO_CREATE_SCHEMA"] = "false"
+    env["REMOTE_GC_ENABLED"] = "false"
+    env["DOCUMENT_WATCH_ENABLED"] = "false"
+    env["ANALYTICS_COMPACT_ENABLED"] = "false"
+    env["OUTBOX_ENABLED"] = "false"
+    return env
+
+
+def measure_import() -> tuple:
+    check = f"import sys, main; print(','.join(m for m in {LAZY_MODULES!r} if m in sys.modules))"
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", check],
+        cwd=HERE, env=child_env(), capture_output=True, text=True, check=True,
+    )
+
+    modules = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        if cumulative.strip().isdigit():
+            modules.append((int(cumulative), name.rstrip()))
+
+    total = next((us for us, name in modules if name.strip() == "main"), 0) / 1e6
+    loaded_lazy = [m for m in proc.stdout.strip().split(",") if m]
+    return total, sorted(modules, reverse=True), loaded_lazy
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def measure_healthy(timeout: float = 30.0) -> float:
+    port = free_port()
+    started = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=HERE, env=child_env(),
+    )
+    try:
+        while time.perf_counter() - started < timeout:
+            if proc.poll() is not None:
+                raise RuntimeError(f"Server exited with code {proc.returncode}")
+            try:
+                with urllib.request.urlopen(f"http://127.0.0.1:{port}/health", timeout=1) as response:
+                    if response.status == 200:
+                        return time.perf_counter() - started
+            except OSError:
+                time.sleep(0.02)
+        raise RuntimeError(f"/health not ready after {timeout}s")
+    finally:
+        proc.terminate()
+        proc.wait()
+
+
+def main() -> int:
+    failures = []
+
+    import_runs = [measure_import() for _ in range(args.runs)]
+    import_seconds, modules, loaded_lazy = min(import_runs, key=lambda r: r[0])
+    print(f"import main: {import_seconds:.3f}s (best of {args.runs})")
+    for us, name in modules[1:args.top + 1]:
+        print(f"  {us / 1e6:>7.3f}s {name}")
+    if loaded_lazy:
+        failures.append(f"imported at startup (should be lazy): {', '.join(loaded_lazy)}")
+    if args.max_import_seconds and import_seconds > args.max_import_seconds:
+        failures.append(f"import took {import_seconds:.3f}s > {args.max_import_seconds}s")
+
+    healthy_seconds = min(measure_healthy() for _ in range(args.runs))
+    print(f"first healthy /health: {healthy_seconds:.3f}s (best of {args.runs})")
+    if args.max_healthy_seconds and healthy_seconds > args.max_healthy_seconds:
+        failures.append(f"/health took {healthy_seconds:.3f}s > {args.max_healthy_seconds}s")
+
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,384 @@
+"""
+Synthetic large-scale data for scale testing (tenants, users, vendors, documents, invoices,
+line items, audit flags).
+
+    python generate_synthetic_data.py --database-url postgresql+asyncpg://.../scale --tenants 2000 --invoices 5000000
+    python generate_synthetic_data.py --database-url sqlite+aiosqlite:///./scale.db --tenants 50 --invoices 20000
+
+Unlike seed.py (one demo tenant), the shape is meant to look like production:
+- tenant sizes are Zipf-distributed (a few very large tenants, a long tail of small ones),
+  and so is vendor usage inside a tenant
+- amounts are log-normal, invoice totals carry 15% VAT over their items, some batch documents
+  hold several invoices (page ranges), a few documents are soft-deleted, a few extractions failed
+- descriptions, vendor and company names are Arabic, with the spelling variations the
+  categorizer and vendor matching see in practice
+- audit flags use the audit engine's issue types and severities; part of them are resolved
+
+Rows are appended after the current max ids, so an existing database is extended, not reset
+(the schema must exist: alembic upgrade head). On Postgres rows are loaded with COPY
+(asyncpg copy_records_to_table) and the id sequences are moved past the new ids; other
+databases use executemany INSERTs. Vendor running statistics and trust scores are computed
+while generating, so no vendor_risk rebuild is needed afterwards.
+"""
+import os
+import json
+import math
+import time
+import random
+import asyncio
+import argparse
+from datetime import datetime, timedelta, timezone
+
+parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+parser.add_argument("--database-url", required=True)
+parser.add_argument("--tenants", type=int, default=1000)
+parser.add_argument("--invoices", type=int, default=1_000_000, help="Total invoices over all tenants")
+parser.add_argument("--items-per-invoice", type=float, default=8.0, help="Mean line items per invoice")
+parser.add_argument("--users-per-tenant", type=int, default=5)
+parser.add_argument("--max-vendors-per-tenant", type=int, default=2000)
+parser.add_argument("--tenant-skew", type=float, default=1.1, help="Zipf exponent of tenant sizes (0 = uniform)")
+parser.add_argument("--vendor-skew", type=float, default=1.2, help="Zipf exponent of vendor usage within a tenant")
+parser.add_argument("--batch-document-rate", type=float, default=0.1, help="Share of invoices inside multi-invoice documents")
+parser.add_argument("--flag-rate", type=float, default=0.08, help="Share of invoices with audit flags")
+parser.add_argument("--years", type=int, default=3, help="Invoice dates span the last N years")
+parser.add_argument("--seed", type=int, default=42)
+parser.add_argument("--batch", type=int, default=50_000, help="Rows buffered per table before a flush")
+args = parser.parse_args()
+
+os.environ["DATABASE_URL"] = args.database_url
+
+from sqlalchemy import select, update, func, text
+from app.core.database import engine
+from app.models import Tenant, User, UserRole, Document, FinanceVendor, FinanceInvoice, FinanceInvoiceItem, FinanceAuditFlag
+from app.services.audit_engine import AUDIT_RULES, VAT_RATE
+from app.services.vendor_risk import SEVERITY_COLUMNS, trust_score_expression
+
+# Flush order follows the foreign keys
+MODELS = [Tenant, User, FinanceVendor, Document, FinanceInvoice, FinanceInvoiceItem, FinanceAuditFlag]
+COLUMNS = {
+    Tenant: ["id", "company_name", "ai_config", "subscription_status", "subscribed_modules", "created_at"],
+    User: ["id", "email", "hashed_password", "full_name", "tenant_id", "role", "is_active"],
+    FinanceVendor: [
+        "id", "tenant_id", "name", "tax_id", "trust_score", "invoice_count", "amount_mean", "amount_m2",
+        "open_flags_high", "open_flags_medium", "open_flags_low",
+    ],
+    Document: ["id", "tenant_id", "filename", "file_uri", "content_hash", "file_size", "access_level", "upload_date", "status", "deleted_at"],
+    FinanceInvoice: [
+        "id", "tenant_id", "document_id", "page_start", "page_end", "vendor_id", "invoice_number", "invoice_date",
+        "due_date", "total_amount", "currency", "payment_status", "extraction_status", "audit_status",
+    ],
+    FinanceInvoiceItem: ["id", "invoice_id", "tenant_id", "description", "quantity", "unit_price", "total_price", "category"],
+    FinanceAuditFlag: ["id", "invoice_id", "issue_type", "severity", "description", "is_resolved"],
+}
+JSON_COLUMNS = {"ai_config", "subscribed_modules"}
+
+# (description, category, unit, log-mean unit price in SAR)
+MATERIALS = [
+    ("اسمنت بورتلاندي", "مواد بناء", "كيس", 3.0),
+    ("حديد تسليح 16 مم", "مواد بناء", "طن", 8.0),
+    ("حديد تسليح 12 مم", "مواد بناء", "طن", 8.0),
+    ("بلوك خرساني 20 سم", "مواد بناء", "حبة", 1.3),
+    ("رمل ناعم", "مواد بناء", "م3", 4.0),
+    ("خرسانة جاهزة 350", "مواد بناء", "م3", 5.6),
+    ("بلاط بورسلان 60×60", "تشطيبات", "م2", 3.7),
+    ("رخام كرارا", "تشطيبات", "م2", 5.3),
+    ("دهان داخلي مطفي", "تشطيبات", "جالون", 4.3),
+    ("ألواح جبس بورد", "تشطيبات", "لوح", 3.4),
+    ("كابل نحاس 4 مم", "كهرباء", "لفة", 5.5),
+    ("قاطع كهربائي 32 أمبير", "كهرباء", "حبة", 3.9),
+    ("إنارة LED سقفية", "كهرباء", "حبة", 4.1),
+    ("أنابيب PVC 4 إنش", "سباكة", "متر", 3.0),
+    ("خلاط مغسلة", "سباكة", "حبة", 5.0),
+    ("سخان مياه 80 لتر", "سباكة", "حبة", 6.5),
+    ("عزل مائي بيتوميني", "عزل", "لفة", 4.9),
+    ("عزل حراري فوم", "عزل", "م2", 3.2),
+    ("استئجار رافعة شوكية", "معدات", "يوم", 6.7),
+    ("استئجار مولد كهربائي", "معدات", "يوم", 6.2),
+    ("نقل مواد بشاحنة", "نقل", "رحلة", 6.0),
+    ("أجور عمالة يومية", "خدمات", "يوم", 5.0),
+    ("صيانة مكيفات", "خدمات", "زيارة", 5.7),
+    ("قرطاسية ومستلزمات مكتبية", "مصاريف إدارية", "طلب", 5.0),
+    ("اشتراك إنترنت", "مصاريف إدارية", "شهر", 6.0),
+]
+DESCRIPTION_FORMS = ["{name}", "{name}", "{name}", "توريد {name}", "{name} - {unit}", "{name} ({unit})", "{name} دفعة {n}"]
+
+VENDOR_PREFIXES = ["مؤسسة", "شركة", "مصنع", "مكتب", "مجموعة"]
+VENDOR_NAMES = [
+    "الرواد", "النخبة", "الأمل", "البناء الحديث", "الخليج", "الفجر", "السلام", "المستقبل", "الجزيرة",
+    "العمران", "الإتقان", "النور", "الوفاء", "الشرق", "الأصالة", "الريادة", "القمة", "التميز",
+]
+VENDOR_SUFFIXES = ["للتجارة", "للمقاولات", "للمواد الإنشائية", "للتوريدات", "للكهرباء", "للصناعة", "للخدمات", "المحدودة"]
+COMPANY_SUFFIXES = ["للمقاولات العامة", "للتطوير العقاري", "القابضة", "للإنشاءات", "للاستشارات الهندسية"]
+FIRST_NAMES = ["محمد", "أحمد", "عبدالله", "خالد", "فهد", "سارة", "نورة", "ريم", "عمر", "ليلى", "يوسف", "هند"]
+LAST_NAMES = ["العتيبي", "القحطاني", "الشمري", "الحربي", "الزهراني", "الغامدي", "الدوسري", "المطيري"]
+ROLES = [UserRole.ACCOUNTANT, UserRole.ENGINEER, UserRole.ENGINEER, UserRole.LAWYER, UserRole.HR]
+
+# Relative frequency of the audit engine's issue types among flagged invoices
+FLAG_WEIGHTS = {
+    "missing_tax_id": 30, "weekend_date": 25, "round_amount": 15, "amount_outlier": 12,
+    "line_mismatch": 8, "total_mismatch": 6, "duplicate": 4,
+}
+FLAG_DESCRIPTIONS = {
+    "total_mismatch": "مجموع البنود لا يطابق إجمالي الفاتورة",
+    "duplicate": "فاتورة مكررة بنفس الرقم والمورد",
+    "line_mismatch": "الكمية × سعر الوحدة لا تساوي إجمالي البند",
+    "missing_tax_id": "الرقم الضريبي للمورد غير موجود",
+    "amount_outlier": "المبلغ أعلى بكثير من متوسط هذا المورد",
+    "round_amount": "مبلغ إجمالي مقرّب بشكل غير معتاد",
+    "weekend_date": "تاريخ الفاتورة في عطلة نهاية الأسبوع",
+}
+
+
+def zipf_weights(n: int, skew: float):
+    return [1.0 / (rank ** skew) for rank in range(1, n + 1)]
+
+
+def split_zipf(rng: random.Random, total: int, parts: int, skew: float):
+    """
+    Splits `total` over `parts` buckets with Zipf shares (each bucket gets at least one if possible).
+    """
+    weights = zipf_weights(parts, skew)
+    scale = max(total - parts, 0) / sum(weights)
+    counts = [(1 if total >= parts else 0) + int(w * scale) for w in weights]
+    for i in rng.sample(range(parts), min(parts, total - sum(counts))):
+        counts[i] += 1
+    return counts
+
+
+class Loader:
+    """
+    Buffers rows per table and flushes them in foreign-key order:
+    COPY on Postgres, executemany INSERTs elsewhere.
+    """
+
+    def __init__(self, batch: int):
+        self.batch = batch
+        self.rows = {model: [] for model in MODELS}
+        self.totals = {model: 0 for model in MODELS}
+        self.next_ids = {}
+        self.postgres = False
+
+    async def start(self):
+        async with engine.connect() as conn:
+            self.postgres = conn.dialect.name == "postgresql"
+            for model in MODELS:
+                current = (await conn.execute(select(func.max(model.id)))).scalar() or 0
+                self.next_ids[model] = current + 1
+
+    def new_id(self, model) -> int:
+        value = self.next_ids[model]
+        self.next_ids[model] = value + 1
+        return value
+
+    async def add(self, model, row: tuple):
+        self.rows[model].append(row)
+        if len(self.rows[model]) >= self.batch:
+            await self.flush()
+
+    async def flush(self):
+        async with engine.begin() as conn:
+            for model in MODELS:
+                rows = self.rows[model]
+                if not rows:
+                    continue
+                columns = COLUMNS[model]
+                if self.postgres:
+                    json_at = [i for i, c in enumerate(columns) if c in JSON_COLUMNS]
+                    if json_at:
+                        rows = [tuple(json.dumps(v) if i in json_at else v for i, v in enumerate(r)) for r in rows]
+                    raw = (await conn.get_raw_connection()).driver_connection
+                    await raw.copy_records_to_table(model.__tablename__, records=rows, columns=columns)
+                else:
+                    await conn.execute(model.__table__.insert(), [dict(zip(columns, r)) for r in rows])
+                self.totals[model] += len(self.rows[model])
+                self.rows[model] = []
+        print("  " + ", ".join(f"{m.__tablename__}={n:,}" for m, n in self.totals.items()), end="\r", flush=True)
+
+    async def finish(self, vendor_ids: range):
+        await self.flush()
+        print()
+        async with engine.begin() as conn:
+            if vendor_ids:
+                await conn.execute(
+                    update(FinanceVendor)
+                    .where(FinanceVendor.id >= vendor_ids.start, FinanceVendor.id < vendor_ids.stop)
+                    .values(trust_score=trust_score_expression())
+                )
+            if self.postgres:
+                for model in MODELS:
+                    table = model.__tablename__
+                    await conn.execute(text(
+                        f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), (SELECT COALESCE(MAX(id), 1) FROM {table}))"
+                    ))
+        if self.postgres:
+            async with engine.connect() as conn:
+                conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+                for model in MODELS:
+                    await conn.execute(text(f"ANALYZE {model.__tablename__}"))
+
+
+class Generator:
+    def __init__(self, loader: Loader, rng: random.Random):
+        self.loader = loader
+        self.rng = rng
+        self.now = datetime.now(timezone.utc).replace(microsecond=0)
+        self.first_day = self.now - timedelta(days=365 * args.years)
+        self.flag_types = list(FLAG_WEIGHTS)
+        self.flag_cum = []
+        running = 0
+        for issue_type in self.flag_types:
+            running += FLAG_WEIGHTS[issue_type]
+            self.flag_cum.append(running)
+
+    def _vendor_name(self, index: int) -> str:
+        rng = self.rng
+        name = f"{rng.choice(VENDOR_PREFIXES)} {rng.choice(VENDOR_NAMES)} {rng.choice(VENDOR_SUFFIXES)}"
+        return name if index < 40 else f"{name} {index}"
+
+    def _tax_id(self):
+        if self.rng.random() < 0.08:
+            return None
+        return "3" + "".join(str(self.rng.randrange(10)) for _ in range(13)) + "3"
+
+    def _description(self, material) -> str:
+        name, _, unit, _ = material
+        return self.rng.choice(DESCRIPTION_FORMS).format(name=name, unit=unit, n=self.rng.randint(1, 12))
+
+    def _items(self, tenant_id: int, invoice_id: int, material_cum):
+        rng = self.rng
+        count = 1 + min(int(rng.expovariate(1 / max(args.items_per_invoice - 1, 0.01))), 60)
+        rows, subtotal = [], 0.0
+        for _ in range(count):
+            material = MATERIALS[rng.choices(range(len(MATERIALS)), cum_weights=material_cum)[0]]
+            quantity = float(max(1, round(rng.lognormvariate(2.0, 1.1))))
+            unit_price = round(rng.lognormvariate(material[3], 0.35), 2)
+            total = round(quantity * unit_price, 2)
+            category = material[1] if rng.random() > 0.1 else None # Not yet categorized
+            rows.append((self.loader.new_id(FinanceInvoiceItem), invoice_id, tenant_id, self._description(material), quantity, unit_price, total, category))
+            subtotal += total
+        return rows, round(subtotal * (1 + VAT_RATE), 2)
+
+    def _flags(self, invoice_id: int):
+        rng = self.rng
+        types = {self.flag_types[rng.choices(range(len(self.flag_types)), cum_weights=self.flag_cum)[0]] for _ in range(rng.choice([1, 1, 1, 2]))}
+        return [
+            (self.loader.new_id(FinanceAuditFlag), invoice_id, t, AUDIT_RULES[t], FLAG_DESCRIPTIONS[t], rng.random() < 0.25)
+            for t in types
+        ]
+
+    async def tenant(self, invoices: int):
+        rng, loader = self.rng, self.loader
+        tenant_id = loader.new_id(Tenant)
+        company = f"{rng.choice(VENDOR_PREFIXES)} {rng.choice(VENDOR_NAMES)} {rng.choice(COMPANY_SUFFIXES)} {tenant_id}"
+        modules = sorted({"accountant", *rng.sample(["engineer", "lawyer", "hr"], rng.randint(0, 3))})
+        await loader.add(Tenant, (tenant_id, company, {"tone": "professional", "language": "ar"}, rng.random() > 0.03, modules, self.first_day))
+
+        for n in range(args.users_per_tenant):
+            user_id = loader.new_id(User)
+            role = UserRole.ADMIN if n == 0 else ROLES[n % len(ROLES)]
+            full_name = f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}"
+            await loader.add(User, (user_id, f"user{user_id}@tenant{tenant_id}.example", "hashed_secret_password", full_name, tenant_id, role.value, True))
+
+        # Vendors: count grows with tenant size, usage is Zipf inside the tenant
+        vendor_count = max(3, min(args.max_vendors_per_tenant, int(2 * math.sqrt(invoices))))
+        vendor_ids = [loader.new_id(FinanceVendor) for _ in range(vendor_count)]
+        vendor_cum, running = [], 0.0
+        for w in zipf_weights(vendor_count, args.vendor_skew):
+            running += w
+            vendor_cum.append(running)
+        # Each tenant buys a different mix of materials
+        material_weights = [rng.paretovariate(1.5) for _ in MATERIALS]
+        material_cum, running = [], 0.0
+        for w in material_weights:
+            running += w
+            material_cum.append(running)
+        stats = {vendor_id: {"n": 0, "mean": 0.0, "m2": 0.0, "high": 0, "medium": 0, "low": 0} for vendor_id in vendor_ids}
+
+        documents, invoice_rows, item_rows, flag_rows = [], [], [], []
+        remaining = invoices
+        while remaining > 0:
+            size = 1
+            if rng.random() < args.batch_document_rate:
+                size = min(remaining, rng.randint(2, 8))
+            remaining -= size
+            document_id = loader.new_id(Document)
+            uploaded = self.first_day + timedelta(seconds=rng.randrange(int((self.now - self.first_day).total_seconds())))
+            deleted = rng.random() < 0.02
+            pages = 0
+            for _ in range(size):
+                invoice_id = loader.new_id(FinanceInvoice)
+                vendor_id = vendor_ids[rng.choices(range(vendor_count), cum_weights=vendor_cum)[0]]
+                invoice_date = (uploaded - timedelta(days=rng.randint(0, 45))).replace(tzinfo=None, hour=0, minute=0, second=0)
+                page_start, pages = pages + 1, pages + rng.choice([1, 1, 1, 2, 3])
+                page_range = (page_start, pages) if size > 1 else (None, None)
+
+                if rng.random() < 0.01:
+                    invoice_rows.append((invoice_id, tenant_id, document_id, *page_range, None, None, None, None, None, "SAR", "Unpaid", "failed", "clean"))
+                    continue
+                items, total = self._items(tenant_id, invoice_id, material_cum)
+                if rng.random() < 0.03:
+                    total = float(round(total, -3)) or total
+                flags = self._flags(invoice_id) if rng.random() < args.flag_rate else []
+                open_flags = [f for f in flags if not f[5]]
+                paid = "Paid" if invoice_date < (self.now - timedelta(days=60)).replace(tzinfo=None) and rng.random() < 0.85 else "Unpaid"
+                invoice_rows.append((
+                    invoice_id, tenant_id, document_id, *page_range, vendor_id, f"INV-{rng.randint(1000, 999999)}",
+                    invoice_date, invoice_date + timedelta(days=rng.choice([15, 30, 30, 60, 90])), total, "SAR", paid,
+                    "completed", "flagged" if open_flags else "clean",
+                ))
+                item_rows.extend(items)
+                flag_rows.extend(flags)
+
+                if not deleted: # vendor_risk counts live documents only
+                    s = stats[vendor_id]
+                    s["n"] += 1
+                    delta = total - s["mean"]
+                    s["mean"] += delta / s["n"]
+                    s["m2"] += delta * (total - s["mean"])
+                    for f in open_flags:
+                        s[f[3]] += 1
+
+            documents.append((
+                document_id, tenant_id, f"فاتورة_{document_id}.pdf" if size == 1 else f"دفعة_فواتير_{document_id}.pdf",
+                f"files/{document_id:012x}", f"{rng.getrandbits(256):064x}", max(pages, 1) * rng.randint(60_000, 400_000),
+                "accountant", uploaded, "deleted" if deleted else "active", uploaded + timedelta(days=rng.randint(1, 30)) if deleted else None,
+            ))
+
+        for vendor_index, vendor_id in enumerate(vendor_ids):
+            s = stats[vendor_id]
+            await loader.add(FinanceVendor, (
+                vendor_id, tenant_id, self._vendor_name(vendor_index), self._tax_id(), 100,
+                s["n"], s["mean"], s["m2"], s["high"], s["medium"], s["low"],
+            ))
+        for model, rows in ((Document, documents), (FinanceInvoice, invoice_rows), (FinanceInvoiceItem, item_rows), (FinanceAuditFlag, flag_rows)):
+            for row in rows:
+                await loader.add(model, row)
+
+
+async def main():
+    assert set(SEVERITY_COLUMNS) == set(AUDIT_RULES.values())
+    rng = random.Random(args.seed)
+    loader = Loader(args.batch)
+    await loader.start()
+    generator = Generator(loader, rng)
+    first_vendor = loader.next_ids[FinanceVendor]
+
+    started = time.perf_counter()
+    sizes = split_zipf(rng, args.invoices, args.tenants, args.tenant_skew)
+    print(f"tenant sizes: largest {sizes[0]:,}, median {sorted(sizes)[len(sizes) // 2]:,}, smallest {sizes[-1]:,} invoices")
+    try:
+        for invoices in sizes:
+            await generator.tenant(invoices)
+        await loader.finish(range(first_vendor, loader.next_ids[FinanceVendor]))
+    finally:
+        await engine.dispose()
+
+    elapsed = time.perf_counter() - started
+    items = loader.totals[FinanceInvoiceItem]
+    print(f"loaded in {elapsed:.1f}s ({'COPY' if loader.postgres else 'executemany'}, {items / max(elapsed, 1e-9):,.0f} items/s)")
+    for model, total in loader.totals.items():
+        print(f"  {model.__tablename__:<24}{total:>14,}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -1,19 +1,46 @@
+import asyncio
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
 from app.core.middleware import TenantMiddleware
 from app.api.api import api_router
+from app.core.config import settings
 from app.core.database import Base, engine
 # Import models to ensure they are registered with Base
-from app.models import tenant, document, finance
+from app.models import tenant, document, finance, chat, outbox
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    # Create tables on startup
-    async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
+    # Create tables on startup (disabled in migration-only mode: schema is owned by Alembic)
+    if settings.DB_AUTO_CREATE_SCHEMA:
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+
+    # Background workers
+    from app.services.remote_gc import remote_gc
+    from app.services.document_watcher import document_watcher
+    from app.services.finance_analytics import finance_analytics
+    from app.services.outbox import outbox_dispatcher
+    tasks = []
+    if settings.REMOTE_GC_ENABLED:
+        tasks.append(asyncio.create_task(remote_gc.run_forever()))
+    if settings.DOCUMENT_WATCH_ENABLED:
+        tasks.append(asyncio.create_task(document_watcher.run_forever()))
+    if settings.ANALYTICS_ENABLED and settings.ANALYTICS_COMPACT_ENABLED:
+        tasks.append(asyncio.create_task(finance_analytics.run_forever()))
+    if settings.OUTBOX_ENABLED:
+        tasks.append(asyncio.create_task(outbox_dispatcher.run_forever()))
+
     yield
 
+    for task in tasks:
+        task.cancel()
+
+    from app.core.cache import cache
+    from app.core.events import event_bus
+    await event_bus.close()
+    await cache.close()
+
 app = FastAPI(
     title="CorporateMemory API",
     description="Enterprise B2B SaaS Logic & RAG Platform (Arabic/RTL)",
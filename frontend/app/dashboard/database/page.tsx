@@ -7,7 +7,7 @@ import { Input } from "@/components/ui/input"
 import { Label } from "@/components/ui/label"
 import { Upload, FileText, Music, Video } from "lucide-react"
 import { Progress } from "@/components/ui/progress"
-import { uploadFile } from "@/lib/api"
+import { uploadFile, subscribeEvents } from "@/lib/api"
 
 export default function DatabasePage() {
     const [file, setFile] = useState<File | null>(null)
@@ -92,7 +92,7 @@ export default function DatabasePage() {
 function DocList() {
     const [docs, setDocs] = useState<any[]>([])
 
-    // Simple polling
+    // Pushed status changes instead of polling: reload on (re)connect, patch on events
     useEffect(() => {
         const fetchDocs = async () => {
             try {
@@ -103,9 +103,23 @@ function DocList() {
             }
         }
 
-        fetchDocs()
-        const interval = setInterval(fetchDocs, 5000)
-        return () => clearInterval(interval)
+        const unsubscribe = subscribeEvents((type, event) => {
+            if (type === "ready") {
+                fetchDocs()
+            } else if (type === "document") {
+                setDocs(current => {
+                    if (event.status === "deleted") {
+                        return current.filter(d => d.id !== event.id)
+                    }
+                    if (!current.some(d => d.id === event.id)) {
+                        fetchDocs()
+                        return current
+                    }
+                    return current.map(d => d.id === event.id ? { ...d, status: event.status } : d)
+                })
+            }
+        })
+        return unsubscribe
     }, [])
 
     if (docs.length === 0) {
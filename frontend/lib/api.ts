@@ -51,6 +51,16 @@ export async function chatWithWorkspace(query: string, user_email: string = "eng
     return res.json();
 }
 
+// Server-sent events: document status / extraction progress for the tenant.
+// The browser reconnects on its own; "ready" is sent on every (re)connect so lists can re-sync.
+export function subscribeEvents(onEvent: (type: string, data: any) => void): () => void {
+    const source = new EventSource(`${API_URL}/app/events?tenant=${encodeURIComponent(TENANT_ID)}`);
+    for (const type of ["ready", "document", "extraction", "invoice"]) {
+        source.addEventListener(type, (e) => onEvent(type, JSON.parse((e as MessageEvent).data)));
+    }
+    return () => source.close();
+}
+
 export async function getDocuments() {
     const res = await fetch(`${API_URL}/app/document`, {
         method: "GET",